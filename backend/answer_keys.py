@@ -0,0 +1,69 @@
+"""
+In-process answer keys for recently generated quizzes
+
+Filled when a quiz is generated so grading on submit is a memory lookup
+instead of re-reading all quiz_questions rows from Supabase.
+"""
+import os
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cache import TTLCache
+from categories import canonical_category
+
+
+# A typical quiz is finished well within this window
+ANSWER_KEY_TTL = int(os.getenv('ANSWER_KEY_TTL', 2 * 3600))
+ANSWER_KEY_CACHE_SIZE = int(os.getenv('ANSWER_KEY_CACHE_SIZE', 2000))
+
+# (question id, correct answer, category, question text, options, explanation)
+AnswerKey = Tuple[str, int, str, str, List[str], str]
+
+
+class AnswerKeyCache:
+    """quiz_id -> compact tuple of answer-key entries"""
+
+    def __init__(self, maxsize: int = ANSWER_KEY_CACHE_SIZE, ttl: int = ANSWER_KEY_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def remember(self, quiz_id: str, questions: List[Dict]):
+        """Store the key for a quiz from its question rows (in display order)"""
+        self._cache.set(quiz_id, tuple(self._entry(q) for q in questions))
+
+    def load(self, quiz_id: str, loader: Callable[[str], List[Dict]]) -> Tuple[AnswerKey, ...]:
+        """Answer key for a quiz, falling back to `loader(quiz_id)` (database rows) on a miss"""
+        key = self._cache.get(quiz_id)
+        if key is not None:
+            return key
+
+        rows = loader(quiz_id)
+        key = tuple(self._entry(q) for q in rows)
+        if key:
+            self._cache.set(quiz_id, key)
+        return key
+
+    def peek(self, quiz_id: str) -> Optional[Tuple[AnswerKey, ...]]:
+        """Cached answer key, without falling back to the database"""
+        return self._cache.get(quiz_id)
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+    @staticmethod
+    def _entry(q: Dict) -> AnswerKey:
+        options = q['options']
+        if isinstance(options, str):
+            options = json.loads(options)
+        return (
+            str(q['id']),
+            q['correct_answer'],
+            # Quizzes stored before ingest-time canonicalization may carry raw labels
+            canonical_category(q['category']) or q['category'],
+            q['question'],
+            options,
+            q.get('explanation') or ''
+        )
+
+
+# Create a global instance
+answer_keys = AnswerKeyCache()
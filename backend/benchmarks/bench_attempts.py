@@ -0,0 +1,97 @@
+"""
+Benchmark: attempt-history latency as a user's history grows
+
+Compares the old User.get_attempts access pattern (fixed-limit results
+query + one quiz_sessions lookup per result, "load more" by raising the
+limit) with the embedded select + keyset cursor used now. The new path
+should stay flat for any page depth.
+
+Needs a Supabase project with the schema from README.md and a service key.
+It seeds a throwaway user with synthetic history and deletes it afterwards
+(cascade), so only run it against a development project:
+    python benchmarks/bench_attempts.py --yes
+"""
+import os
+import sys
+import time
+import uuid
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from db import db
+
+
+HISTORY_SIZES = [10, 100, 1000, 5000]
+PAGE_SIZE = 10
+REPEATS = 5
+INSERT_CHUNK = 500
+
+
+def timed_ms(fn):
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def legacy_page(user_id, depth):
+    """Old pattern: results with limit = everything shown so far, then one session query each"""
+    results = db.get_user_results(user_id, limit=depth + PAGE_SIZE)
+    for result in results[-PAGE_SIZE:] if depth else results:
+        db.get_quiz_session(result['quiz_id'])
+
+
+def seed_history(user_id, target, seeded):
+    """Grow the user's history from `seeded` to `target` results, one session per result"""
+    start = datetime.utcnow() - timedelta(days=365)
+    for offset in range(seeded, target, INSERT_CHUNK):
+        count = min(INSERT_CHUNK, target - offset)
+        sessions = [{'id': str(uuid.uuid4()), 'user_id': user_id, 'difficulty': 'moderate',
+                     'language': 'python', 'supports_oop': True} for _ in range(count)]
+        db.client.table('quiz_sessions').insert(sessions).execute()
+        db.client.table('results').insert([{
+            'user_id': user_id,
+            'quiz_id': s['id'],
+            'total_score': (offset + i) % 31,
+            'recommended_domain': 'programming',
+            'completed_at': (start + timedelta(minutes=offset + i)).isoformat()
+        } for i, s in enumerate(sessions)]).execute()
+
+
+def main():
+    if '--yes' not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+
+    clerk_id = f"bench_{uuid.uuid4().hex[:12]}"
+    user = db.create_user(clerk_id=clerk_id, name='Attempts Benchmark', email=f"{clerk_id}@example.com")
+    if not user:
+        sys.exit("Could not create benchmark user")
+
+    print(f"{'history':>8} {'page':>6} {'legacy ms':>10} {'round trips':>12} {'keyset ms':>10} {'round trips':>12}")
+    try:
+        seeded = 0
+        for size in HISTORY_SIZES:
+            seed_history(user['id'], size, seeded)
+            seeded = size
+
+            # Cursor for the deepest full page
+            cursor, depth = None, 0
+            while depth + PAGE_SIZE < size:
+                _, cursor = db.get_user_attempts(user['id'], limit=PAGE_SIZE, cursor=cursor)
+                depth += PAGE_SIZE
+
+            for label, page_depth, page_cursor in (('first', 0, None), ('last', depth, cursor)):
+                legacy = timed_ms(lambda: legacy_page(user['id'], page_depth))
+                keyset = timed_ms(lambda: db.get_user_attempts(user['id'], limit=PAGE_SIZE, cursor=page_cursor))
+                print(f"{size:>8} {label:>6} {legacy:>10.1f} {PAGE_SIZE + 1:>12} {keyset:>10.1f} {1:>12}")
+    finally:
+        db.delete_user(clerk_id)
+
+
+if __name__ == '__main__':
+    main()
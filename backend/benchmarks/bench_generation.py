@@ -0,0 +1,75 @@
+"""
+Benchmark: single 30-question call vs per-category shards
+
+Generates the same number of quizzes both ways against the real Gemini
+API and reports median / p95 latency and how many questions had to come
+from the offline fallback set. Spends quota (7 calls per round), so it
+needs GEMINI_API_KEY and an explicit go-ahead:
+    python benchmarks/bench_generation.py --yes [rounds]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main as app
+from question_shards import ShardedGenerator
+
+
+DIFFICULTY = 'moderate'
+LANGUAGE = 'python'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def single_call():
+    """Old path: one call, fallback fills or replaces the quiz when it comes back short"""
+    try:
+        valid = app.request_questions_from_gemini(DIFFICULTY, LANGUAGE, True)
+    except Exception as e:
+        print(f"   single call failed: {e}")
+        return 30
+    if len(valid) >= 25:
+        return 30 - min(len(valid), 30)
+    return 30
+
+
+def sharded_call(generator):
+    before = generator.stats()['fallback_questions']
+    if generator.generate(DIFFICULTY, LANGUAGE, True) is None:
+        # No spare burst for six calls at once: the app would use the single call
+        return single_call()
+    return generator.stats()['fallback_questions'] - before
+
+
+def main():
+    if '--yes' not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    numbers = [arg for arg in sys.argv[1:] if arg.isdigit()]
+    rounds = int(numbers[0]) if numbers else 5
+
+    generator = ShardedGenerator(app.request_shard_from_gemini, app.generate_quality_fallback, app.reserve_shard_slots)
+    results = {'single': ([], 0), 'sharded': ([], 0)}
+
+    for _ in range(rounds):
+        for label, run in (('single', single_call), ('sharded', lambda: sharded_call(generator))):
+            started = time.perf_counter()
+            fallback = run()
+            samples, fallback_total = results[label]
+            samples.append(time.perf_counter() - started)
+            results[label] = (samples, fallback_total + fallback)
+
+    print(f"\n{'path':>8} {'rounds':>7} {'p50 s':>7} {'p95 s':>7} {'fallback questions':>19}")
+    for label, (samples, fallback_total) in results.items():
+        print(f"{label:>8} {len(samples):>7} {statistics.median(samples):>7.2f} "
+              f"{percentile(samples, 95):>7.2f} {fallback_total:>12} / {30 * len(samples)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark: tolerant single-pass JSON parsing vs the old truncation-repair loop
+
+Builds a corpus shaped like real gemini-2.0-flash-lite quiz responses
+(fenced, pretty-printed or compact, truncated at the token limit, with
+garbled objects in the middle) and compares recovered question counts and
+parse time.
+
+Run from the backend directory:
+    python benchmarks/bench_json_parser.py
+"""
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from json_stream import parse_json_objects
+
+
+CATEGORIES = ['os', 'dbms', 'networks', 'aptitude', 'verbal', 'python']
+ROUNDS = 20
+
+
+def legacy_parse(text):
+    """The repair logic previously used in generate_all_questions_optimized"""
+    text = text.replace('```json', '').replace('```', '').strip()
+
+    if not text.endswith(']'):
+        last_close_brace = text.rfind('}')
+        if last_close_brace > 0:
+            text = text[:last_close_brace+1] + ']'
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        for i in range(len(text)-1, max(0, len(text)-500), -1):
+            try:
+                test_text = text[:i]
+                if test_text.endswith('}'):
+                    test_text += ']'
+                elif test_text.endswith(','):
+                    test_text = test_text[:-1] + ']'
+                return json.loads(test_text)
+            except:
+                continue
+        return []
+
+
+def make_questions(rng):
+    questions = []
+    for cat in CATEGORIES:
+        for n in range(5):
+            questions.append({
+                'question': f"Which statement about {cat} topic {n} (e.g. \"case {rng.randint(1, 99)}\") is correct?",
+                'options': [f"Option {c} for {cat}" for c in 'ABCD'],
+                'correct_answer': rng.randint(0, 3),
+                'category': cat
+            })
+    return questions
+
+
+def build_corpus(seed=7):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(ROUNDS):
+        qs = make_questions(rng)
+        pretty = json.dumps(qs, indent=2)
+        compact = json.dumps(qs)
+
+        corpus.append(('valid', pretty))
+        corpus.append(('fenced + trailing prose', f"```json\n{pretty}\n```\nLet me know if you need more!"))
+        corpus.append(('truncated at token limit', pretty[:rng.randint(len(pretty) // 2, len(pretty) - 10)]))
+
+        # Unterminated string in one object
+        victim = rng.randint(3, 25)
+        garbled = json.dumps(qs[:victim], indent=2)[:-2] + ',\n  {\n    "question": "Broken text,\n' + \
+            json.dumps(qs[victim:], indent=2)[1:]
+        corpus.append(('garbled object (pretty)', garbled))
+
+        # Missing closing brace in the middle, compact output
+        parts = [json.dumps(q) for q in qs]
+        victim = rng.randint(3, 25)
+        parts[victim] = parts[victim][:-1]
+        corpus.append(('missing brace (compact)', '[' + ', '.join(parts) + ']'))
+
+        # Missing quote in the middle plus truncation
+        parts = [json.dumps(q) for q in qs]
+        victim = rng.randint(3, 15)
+        parts[victim] = parts[victim].replace('", "options"', ', "options"', 1)
+        text = '[' + ', '.join(parts) + ']'
+        corpus.append(('missing quote + truncated', text[:len(text) * 3 // 4]))
+    return corpus
+
+
+def count_questions(data):
+    return sum(1 for q in data if isinstance(q, dict) and 'question' in q) if isinstance(data, list) else 0
+
+
+def run():
+    corpus = build_corpus()
+    by_case = {}
+
+    for name, text in corpus:
+        started = time.perf_counter()
+        legacy = count_questions(legacy_parse(text))
+        legacy_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        objects, _ = parse_json_objects(text)
+        new = count_questions(objects)
+        new_time = time.perf_counter() - started
+
+        case = by_case.setdefault(name, {'n': 0, 'legacy_q': 0, 'new_q': 0, 'legacy_t': 0.0, 'new_t': 0.0})
+        case['n'] += 1
+        case['legacy_q'] += legacy
+        case['new_q'] += new
+        case['legacy_t'] += legacy_time
+        case['new_t'] += new_time
+
+    print(f"{'case':<28}{'legacy q':>10}{'new q':>8}{'legacy ms':>12}{'new ms':>9}{'speedup':>9}")
+    print('-' * 76)
+    for name, c in by_case.items():
+        n = c['n']
+        speedup = c['legacy_t'] / c['new_t'] if c['new_t'] else 0
+        print(f"{name:<28}{c['legacy_q'] / n:>10.1f}{c['new_q'] / n:>8.1f}"
+              f"{c['legacy_t'] / n * 1000:>12.3f}{c['new_t'] / n * 1000:>9.3f}{speedup:>8.1f}x")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,111 @@
+"""
+Benchmark: vectorized weight-matrix scoring vs the old per-question if-chain
+
+Simulates 1M quiz submissions (30 questions, 5 per category) and compares
+the legacy scoring loop, per-submission ScoringEngine.score and the batch
+path (correct-count matrix @ weight matrix). The legacy loop is timed on a
+sample and extrapolated; all paths are checked to agree on that sample.
+
+Run from the backend directory:
+    python benchmarks/bench_scoring.py [submissions]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scoring import ScoringEngine
+
+
+CATEGORIES = ['os', 'dbms', 'networks', 'aptitude', 'verbal', 'programming']
+QUESTIONS_PER_CATEGORY = 5
+SUBMISSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+SAMPLE = 20_000
+
+
+def legacy_score(categories, correct):
+    """The scoring loop previously inlined in evaluate_quiz_with_gemini"""
+    scores = {'programming': 0, 'analytics': 0, 'testing': 0, 'technical': 0}
+    for category, is_correct in zip(categories, correct):
+        if is_correct:
+            if category in ['programming', 'python programming', 'python', 'python_programming']:
+                scores['programming'] += 3.5
+                scores['technical'] += 1
+            elif category in ['aptitude', 'verbal']:
+                scores['analytics'] += 3
+                scores['testing'] += 1.5
+            elif category in ['os', 'dbms', 'networks', 'network', 'computer networks', 'computer_networks']:
+                scores['technical'] += 2.5
+                scores['testing'] += 2
+                scores['programming'] += 1
+    max_score = max(scores.values())
+    domain = [k for k, v in scores.items() if v == max_score][0] if max_score > 0 else 'programming'
+    return scores, domain
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    engine = ScoringEngine.from_file()
+    rng = np.random.default_rng(42)
+
+    # Per-question correctness for every submission, questions grouped by category
+    skill = rng.uniform(0.2, 0.95, size=(SUBMISSIONS, 1))
+    correct = rng.random((SUBMISSIONS, len(CATEGORIES) * QUESTIONS_PER_CATEGORY)) < skill
+    question_categories = [cat for cat in CATEGORIES for _ in range(QUESTIONS_PER_CATEGORY)]
+    print(f"Simulated {SUBMISSIONS:,} submissions x {correct.shape[1]} questions\n")
+
+    sample = min(SAMPLE, SUBMISSIONS)
+    sample_rows = correct[:sample].tolist()
+
+    legacy, legacy_time = timed(lambda: [legacy_score(question_categories, row) for row in sample_rows])
+    legacy_total = legacy_time * SUBMISSIONS / sample
+
+    def single():
+        results = []
+        for row in sample_rows:
+            category_correct = {}
+            for category, ok in zip(question_categories, row):
+                category_correct[category] = category_correct.get(category, 0) + ok
+            scores = engine.score(category_correct)
+            results.append((scores, engine.recommend(scores)))
+        return results
+
+    single_results, single_time = timed(single)
+    single_total = single_time * SUBMISSIONS / sample
+
+    def batch():
+        columns = [engine.category_index(cat) for cat in CATEGORIES]
+        counts = np.zeros((SUBMISSIONS, len(engine.categories)), dtype=np.int32)
+        counts[:, columns] = correct.reshape(SUBMISSIONS, len(CATEGORIES), QUESTIONS_PER_CATEGORY).sum(axis=2)
+        scores = engine.score_batch(counts)
+        return scores, engine.recommend_batch(scores)
+
+    (batch_scores, batch_domains), batch_time = timed(batch)
+
+    # All three paths must agree
+    for i, (scores, domain) in enumerate(legacy):
+        expected = [scores[d] for d in engine.domains]
+        assert np.allclose(batch_scores[i], expected), (i, scores, batch_scores[i])
+        assert batch_domains[i] == domain == single_results[i][1], (i, domain, batch_domains[i])
+    print(f"✓ Batch, single and legacy scores agree on {sample:,} submissions\n")
+
+    print(f"{'method':<28} {'seconds':>10} {'per 1k':>10}")
+    for name, seconds, note in (
+        ('legacy if-chain', legacy_total, ' (extrapolated)'),
+        ('ScoringEngine.score', single_total, ' (extrapolated)'),
+        ('ScoringEngine batch', batch_time, '')
+    ):
+        print(f"{name:<28} {seconds:>10.3f} {seconds / SUBMISSIONS * 1000 * 1000:>9.3f}ms{note}")
+    print(f"\nBatch speedup over legacy: {legacy_total / batch_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark: how shard requests are scheduled against the Gemini rate limit
+
+Simulates live quizzes arriving at a steady rate against a real TokenBucket
+(GEMINI_RPM / GEMINI_BURST, time compressed) with modelled Gemini latencies
+and failure rates, and compares:
+    single      one 30-question call per quiz
+    per-shard   six shards that each queue for their own slot (the old scheduling)
+    unit        six shards reserved as one unit from spare burst, else one call
+
+Reports p50 / p95 quiz latency, the share of questions taken from the
+fallback set and Gemini calls per quiz. No API key or network needed:
+    python benchmarks/bench_shard_scheduling.py [quizzes per minute ...]
+"""
+import os
+import sys
+import time
+import random
+import statistics
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from categories import QUIZ_CATEGORIES
+from question_shards import ShardedGenerator
+from rate_limiter import TokenBucket, RateLimitExceeded, GEMINI_RPM, GEMINI_BURST, GEMINI_POOL_RPM, RATE_LIMIT_MAX_WAIT
+
+
+# Simulated seconds per real second; 60 simulated seconds take 1.2s
+SCALE = 0.02
+MINUTES = 10
+# Modelled Gemini behaviour (simulated seconds): a 30-question call writes ~6x the output of a shard
+SINGLE_LATENCY, SINGLE_FAILURE = 7.0, 0.10
+SHARD_LATENCY, SHARD_FAILURE = 1.8, 0.05
+
+
+def sleep(seconds):
+    time.sleep(seconds * SCALE)
+
+
+def latency(median):
+    return random.lognormvariate(0, 0.35) * median
+
+
+def fake_question(cat, n):
+    return {'question': f'{cat} {n} {random.random()}', 'options': ['a', 'b', 'c', 'd'],
+            'correct_answer': 0, 'category': cat}
+
+
+def fallback(language, difficulty, skip=None):
+    return [dict(fake_question(cat, n), fallback=True) for cat in QUIZ_CATEGORIES for n in range(5)]
+
+
+class Scenario:
+    def __init__(self, name):
+        self.name = name
+        # Live budget: GEMINI_RPM minus the question pool's share, like main.gemini_rate_limiter
+        self.bucket = TokenBucket(name, limit=GEMINI_RPM - GEMINI_POOL_RPM, window=60 * SCALE, burst=GEMINI_BURST, state_path=None)
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.results = []
+
+    def take(self, max_wait):
+        if not self.bucket.acquire(max_wait=max_wait * SCALE):
+            raise RateLimitExceeded(0)
+        with self.lock:
+            self.calls += 1
+
+    def single_call(self):
+        self.take(RATE_LIMIT_MAX_WAIT)
+        sleep(latency(SINGLE_LATENCY))
+        if random.random() < SINGLE_FAILURE:
+            raise ValueError('truncated')
+        return [fake_question(cat, n) for cat in QUIZ_CATEGORIES for n in range(5)]
+
+    def shard(self, difficulty, language, supports_oop, category, count, queue=False):
+        if queue:
+            self.take(RATE_LIMIT_MAX_WAIT)
+        sleep(latency(SHARD_LATENCY))
+        if random.random() < SHARD_FAILURE:
+            raise ValueError('bad shard')
+        return [fake_question(category, n) for n in range(count)]
+
+    def reserve(self, count):
+        granted = self.bucket.acquire(max_wait=0, tokens=count)
+        if granted:
+            with self.lock:
+                self.calls += count
+        return granted
+
+    def quiz(self):
+        raise NotImplementedError
+
+    def run_one(self):
+        started = time.perf_counter()
+        try:
+            questions = self.quiz()
+        except Exception:
+            questions = fallback('python', 'moderate')
+        elapsed = (time.perf_counter() - started) / SCALE
+        with self.lock:
+            self.results.append((elapsed, sum(1 for q in questions if q.get('fallback'))))
+
+
+class Single(Scenario):
+    def quiz(self):
+        return self.single_call()
+
+
+class PerShard(Scenario):
+    def __init__(self, name):
+        super().__init__(name)
+        self.generator = ShardedGenerator(lambda *a: self.shard(*a, queue=True), fallback,
+                                          timeout=30 * SCALE)
+
+    def quiz(self):
+        return self.generator.generate('moderate', 'python', True)
+
+
+class Unit(Scenario):
+    def __init__(self, name):
+        super().__init__(name)
+        self.generator = ShardedGenerator(self.shard, fallback, self.reserve, timeout=30 * SCALE)
+
+    def quiz(self):
+        questions = self.generator.generate('moderate', 'python', True)
+        return questions if questions is not None else self.single_call()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(scenario, per_minute):
+    random.seed(7)
+    threads = []
+    gap = 60 / per_minute
+    for _ in range(int(per_minute * MINUTES)):
+        thread = threading.Thread(target=scenario.run_one)
+        thread.start()
+        threads.append(thread)
+        sleep(random.expovariate(1 / gap))
+    for thread in threads:
+        thread.join()
+    return scenario
+
+
+def main():
+    rates = [float(arg) for arg in sys.argv[1:]] or [2, 6, 15]
+    print(f"GEMINI_RPM={GEMINI_RPM} GEMINI_POOL_RPM={GEMINI_POOL_RPM} GEMINI_BURST={GEMINI_BURST} RATE_LIMIT_MAX_WAIT={RATE_LIMIT_MAX_WAIT}s, "
+          f"{MINUTES} simulated minutes per run")
+    rows = []
+    stdout = sys.stdout
+    for per_minute in rates:
+        for cls, name in ((Single, 'single'), (PerShard, 'per-shard'), (Unit, 'unit')):
+            # Keep the generators' own log lines out of the table
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                scenario = run(cls(name), per_minute)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            samples = [elapsed for elapsed, _ in scenario.results]
+            fallback_share = sum(n for _, n in scenario.results) / (30 * len(scenario.results))
+            rows.append((per_minute, name, len(samples), statistics.median(samples), percentile(samples, 95),
+                         fallback_share, scenario.calls / len(samples)))
+
+    print(f"\n{'quiz/min':>8} {'path':>10} {'quizzes':>8} {'p50 s':>7} {'p95 s':>7} {'fallback':>9} {'calls/quiz':>11}")
+    for per_minute, name, count, p50, p95, share, calls in rows:
+        print(f"{per_minute:>8g} {name:>10} {count:>8} {p50:>7.2f} {p95:>7.2f} {share:>8.1%} {calls:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Stress test: the shared token bucket under heavy concurrency
+
+Several processes x threads draw from one TokenBucket through a temporary
+SQLite state file, the way gunicorn workers share the Gemini budget. Time
+is compressed (a WINDOW-second window instead of 60s). Checks that:
+    - no sliding window of WINDOW seconds holds more than LIMIT grants
+    - callers whose slot is more than max_wait away get RateLimitExceeded
+      right away, and granted callers never wait longer than max_wait
+Exits non-zero on a violation:
+    python benchmarks/stress_rate_limiter.py [processes] [threads]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rate_limiter import TokenBucket, RateLimitExceeded
+
+
+LIMIT = 30
+BURST = 6
+WINDOW = 6.0
+CALLS_PER_THREAD = 3
+MAX_WAIT = 0.5
+# Allowance for time.sleep overshoot when a grant is recorded after its slot
+SLACK = 0.05
+# A rejection only waits for the SQLite write lock, never for a slot (which is > MAX_WAIT away)
+REJECT_WITHIN = 0.2
+
+
+def take(bucket, max_wait):
+    """Same contract as main.wait_for_rate_limit"""
+    if not bucket.acquire(max_wait=max_wait):
+        raise RateLimitExceeded(bucket.next_slot_in())
+
+
+def worker(name, state_path, threads, calls, max_wait, results):
+    bucket = TokenBucket(name, limit=LIMIT, window=WINDOW, burst=BURST, state_path=state_path)
+    records = []
+    lock = threading.Lock()
+
+    def run():
+        for _ in range(calls):
+            started = time.time()
+            try:
+                take(bucket, max_wait)
+                outcome = 'granted'
+            except RateLimitExceeded:
+                outcome = 'rejected'
+            with lock:
+                records.append((outcome, started, time.time()))
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(records)
+
+
+def hammer(name, state_path, processes, threads, calls, max_wait):
+    results = multiprocessing.Queue()
+    pool = [multiprocessing.Process(target=worker, args=(name, state_path, threads, calls, max_wait, results))
+            for _ in range(processes)]
+    for process in pool:
+        process.start()
+    records = []
+    for _ in pool:
+        records.extend(results.get())
+    for process in pool:
+        process.join()
+    return records
+
+
+def busiest_window(grants):
+    """Most grants inside any WINDOW-second interval starting at a grant"""
+    grants = sorted(grants)
+    busiest, end = 0, 0
+    for start in range(len(grants)):
+        while end < len(grants) and grants[end] < grants[start] + WINDOW - SLACK:
+            end += 1
+        busiest = max(busiest, end - start)
+    return busiest
+
+
+def main():
+    numbers = [int(arg) for arg in sys.argv[1:] if arg.isdigit()]
+    processes = numbers[0] if numbers else 4
+    threads = numbers[1] if len(numbers) > 1 else 8
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, 'rate_limit.sqlite3')
+
+        print(f"🔨 {processes} processes x {threads} threads x {CALLS_PER_THREAD} calls, "
+              f"limit {LIMIT} per {WINDOW:g}s, burst {BURST}")
+        started = time.time()
+        records = hammer('window', state_path, processes, threads, CALLS_PER_THREAD, None)
+        grants = [granted_at for outcome, _, granted_at in records if outcome == 'granted']
+        busiest = busiest_window(grants)
+        print(f"   {len(grants)} grants in {time.time() - started:.1f}s, busiest window: {busiest}/{LIMIT}")
+        if len(grants) != processes * threads * CALLS_PER_THREAD:
+            failures.append(f"{processes * threads * CALLS_PER_THREAD - len(grants)} unbounded calls were not granted")
+        if busiest > LIMIT:
+            failures.append(f"{busiest} grants in one {WINDOW:g}s window (limit {LIMIT})")
+
+        print(f"🔨 Same load with max_wait={MAX_WAIT}s")
+        records = hammer('bounded', state_path, processes, threads, CALLS_PER_THREAD, MAX_WAIT)
+        rejected = [done - start for outcome, start, done in records if outcome == 'rejected']
+        waited = [done - start for outcome, start, done in records if outcome == 'granted']
+        print(f"   {len(waited)} granted (longest wait {max(waited):.3f}s), "
+              f"{len(rejected)} rejected (slowest rejection {max(rejected, default=0) * 1000:.1f}ms)")
+        if not rejected:
+            failures.append("no caller was rejected; the load didn't exceed the budget")
+        if rejected and max(rejected) > REJECT_WITHIN:
+            failures.append(f"a rejection took {max(rejected):.3f}s instead of returning right away")
+        if max(waited) > MAX_WAIT + SLACK:
+            failures.append(f"a granted caller waited {max(waited):.3f}s, over max_wait={MAX_WAIT}s")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Rate limit held under concurrency")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Canonical quiz categories
+
+Gemini labels the same category many ways ("computer networks", "network",
+"python_programming", ...). Every generated question is mapped once, at
+ingest, onto the fixed set below so scoring, aggregation and caches only
+ever see these keys.
+"""
+import re
+import difflib
+from functools import lru_cache
+from typing import Dict, Optional
+
+
+QUIZ_CATEGORIES = ('os', 'dbms', 'networks', 'aptitude', 'verbal', 'programming')
+
+# Languages offered by the frontend plus common spellings Gemini uses for them
+PROGRAMMING_LANGUAGES = (
+    'python', 'java', 'cpp', 'c++', 'c', 'c#', 'csharp', 'javascript', 'js',
+    'typescript', 'ts', 'go', 'golang', 'ruby', 'kotlin', 'swift', 'rust', 'php'
+)
+
+# Closest alias a fuzzy match must reach (difflib ratio)
+FUZZY_CUTOFF = 0.8
+
+_SEPARATORS = re.compile(r'[\s_\-/.,:]+')
+
+
+def normalize(label) -> str:
+    """Lowercase and collapse separators: 'Computer_Networks ' -> 'computer networks'"""
+    return _SEPARATORS.sub(' ', str(label).lower()).strip()
+
+
+def _build_alias_index() -> Dict[str, str]:
+    aliases = {
+        'os': ['operating system', 'operating systems', 'os concepts', 'operating system concepts'],
+        'dbms': ['database', 'databases', 'database management', 'database management system',
+                 'database management systems', 'db', 'rdbms', 'sql', 'dbms concepts'],
+        'networks': ['network', 'networking', 'computer network', 'computer networks',
+                     'computer networking', 'cn', 'networks and protocols'],
+        'aptitude': ['quantitative aptitude', 'quant', 'quantitative', 'logical reasoning', 'reasoning',
+                     'logic', 'math', 'maths', 'mathematics', 'numerical ability', 'analytical reasoning'],
+        'verbal': ['verbal ability', 'verbal reasoning', 'english', 'grammar', 'comprehension',
+                   'reading comprehension', 'vocabulary'],
+        'programming': ['coding', 'code', 'oop', 'oops', 'object oriented programming',
+                        'data structures', 'algorithms', 'data structures and algorithms', 'dsa']
+    }
+    for lang in PROGRAMMING_LANGUAGES:
+        aliases['programming'] += [lang, f"{lang} programming", f"programming in {lang}", f"{lang} coding"]
+
+    index = {}
+    for canonical, names in aliases.items():
+        index[canonical] = canonical
+        for name in names:
+            index[normalize(name)] = canonical
+    return index
+
+
+# Precomputed once at import: normalized alias -> canonical category
+CATEGORY_ALIASES: Dict[str, str] = _build_alias_index()
+_ALIAS_KEYS = list(CATEGORY_ALIASES)
+
+
+@lru_cache(maxsize=1024)
+def _resolve(label: str, language: str) -> Optional[str]:
+    # The quiz language appearing as a word marks a programming question ("java oop basics")
+    if language and language in label.split():
+        return 'programming'
+    match = difflib.get_close_matches(label, _ALIAS_KEYS, n=1, cutoff=FUZZY_CUTOFF)
+    return CATEGORY_ALIASES[match[0]] if match else None
+
+
+def canonical_category(label, language: str = '') -> Optional[str]:
+    """
+    Map a category label onto QUIZ_CATEGORIES.
+    Alias lookup first, then a fuzzy match (memoized); None if nothing is close.
+    """
+    key = normalize(label)
+    canonical = CATEGORY_ALIASES.get(key)
+    if canonical is not None:
+        return canonical
+    return _resolve(key, normalize(language))
@@ -0,0 +1,36 @@
+"""
+Opaque keyset cursors for paginated history endpoints
+
+A cursor encodes the (completed_at, id) of the last row of a page. Both
+values end up in a PostgREST filter string, so decoding re-serializes them
+from a parsed timestamp and UUID and rejects anything else.
+"""
+import json
+import uuid
+import base64
+from datetime import datetime
+from typing import Dict, Tuple
+
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque keyset cursor pointing just after `row` in (completed_at, id) order"""
+    raw = json.dumps([row['completed_at'], row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+class CursorError(ValueError):
+    """Pagination cursor that wasn't issued by encode_cursor"""
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (completed_at, id) from a cursor. Both go into a PostgREST filter string,
+    so they are re-serialized from a parsed timestamp and UUID; anything else
+    raises CursorError.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        completed_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(completed_at).isoformat(), str(uuid.UUID(row_id))
+    except (ValueError, TypeError, AttributeError) as e:
+        raise CursorError(f"Invalid cursor: {cursor!r}") from e
@@ -1,8 +1,11 @@
 import os
 from supabase import create_client, Client
 from datetime import datetime
-from typing import Optional, Dict, List, Any
+import json
+from typing import Optional, Dict, List, Any, Tuple
 from dotenv import load_dotenv
+from cache import TTLCache
+from cursors import encode_cursor, decode_cursor, CursorError
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,12 +23,51 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 print(f"✓ Supabase initialized with {'service role' if os.getenv('SUPABASE_SERVICE_KEY') else 'anon'} key")
 
+# Cross-request cache of clerk_id -> users row
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+
+# Assembled profile documents per user id, per process. Writes through this module invalidate
+# this process's copy only; other workers may serve theirs until the TTL expires
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', 30))
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 5000))
+RECENT_RESULT_COLUMNS = 'id, total_score, recommended_domain, completed_at'
+
+# Columns of an attempt-history entry; the session columns come from an embedded select
+ATTEMPT_COLUMNS = ('id', 'quiz_id', 'total_score', 'programming_score', 'analytics_score', 'testing_score',
+                   'recommended_domain', 'ai_insights', 'completed_at')
+
+# Question content lives in question_bank; quiz_questions rows reference it by bank_id
+BANK_QUESTION_FIELDS = ('question', 'options', 'correct_answer', 'category', 'explanation')
+BANK_EMBED = f"question_bank({', '.join(BANK_QUESTION_FIELDS)})"
+BANK_ROW_COLUMNS = ('content_hash', 'category', 'question', 'options', 'correct_answer',
+                    'explanation', 'answer_key', 'minhash')
+
+
+def rpc_missing(error: Exception) -> bool:
+    """True if a PostgREST RPC failed because the function isn't in the database"""
+    code = str(getattr(error, 'code', '') or '')
+    return code in ('PGRST202', '42883', '404') or 'PGRST202' in str(error)
+
+
+def flatten_bank_rows(rows: List[Dict]) -> List[Dict]:
+    """Fill quiz_questions rows that reference the bank with the embedded entry's content"""
+    for row in rows:
+        entry = row.pop('question_bank', None)
+        if entry:
+            for field in BANK_QUESTION_FIELDS:
+                if row.get(field) is None:
+                    row[field] = entry.get(field)
+    return rows
+
 
 class DatabaseManager:
     """Database manager for Supabase operations"""
     
     def __init__(self):
         self.client = supabase
+        self.user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        self.profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
     
     # ==================== USER OPERATIONS ====================
     
@@ -40,16 +82,27 @@ class DatabaseManager:
                 'created_at': datetime.utcnow().isoformat()
             }
             result = self.client.table('users').insert(data).execute()
-            return result.data[0] if result.data else None
+            user = result.data[0] if result.data else None
+            if user:
+                self.user_cache.set(clerk_id, user)
+            return user
         except Exception as e:
             print(f"Error creating user: {e}")
             return None
     
-    def get_user_by_clerk_id(self, clerk_id: str) -> Optional[Dict]:
-        """Get user by Clerk ID"""
+    def get_user_by_clerk_id(self, clerk_id: str, use_cache: bool = True) -> Optional[Dict]:
+        """Get user by Clerk ID (served from the user cache when possible)"""
+        if use_cache:
+            cached = self.user_cache.get(clerk_id)
+            if cached:
+                return dict(cached)
         try:
             result = self.client.table('users').select('*').eq('clerk_id', clerk_id).execute()
-            return result.data[0] if result.data else None
+            user = result.data[0] if result.data else None
+            if user:
+                self.user_cache.set(clerk_id, user)
+                return dict(user)
+            return None
         except Exception as e:
             print(f"Error getting user: {e}")
             return None
@@ -68,11 +121,26 @@ class DatabaseManager:
         try:
             kwargs['updated_at'] = datetime.utcnow().isoformat()
             result = self.client.table('users').update(kwargs).eq('clerk_id', clerk_id).execute()
-            return result.data[0] if result.data else None
+            user = result.data[0] if result.data else None
+            if user:
+                self.user_cache.set(clerk_id, user)
+                self.invalidate_profile(user['id'])
+            else:
+                self.invalidate_user(clerk_id)
+            return user
         except Exception as e:
+            # The row may or may not have changed; don't keep serving the old copy
+            self.invalidate_user(clerk_id)
             print(f"Error updating user: {e}")
             return None
     
+    def invalidate_user(self, clerk_id: str):
+        """Drop a user (and their cached profile) from the caches so the next read goes to Supabase"""
+        cached = self.user_cache.get(clerk_id)
+        if cached:
+            self.invalidate_profile(cached['id'])
+        self.user_cache.delete(clerk_id)
+    
     def get_or_create_user(self, clerk_id: str, name: str, email: str, degree: str = 'B.Tech') -> Optional[Dict]:
         """Get existing user or create new one"""
         user = self.get_user_by_clerk_id(clerk_id)
@@ -94,6 +162,7 @@ class DatabaseManager:
                 'started_at': datetime.utcnow().isoformat()
             }
             result = self.client.table('quiz_sessions').insert(data).execute()
+            self.invalidate_profile(user_id)
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error creating quiz session: {e}")
@@ -151,25 +220,152 @@ class DatabaseManager:
             print(f"Error adding quiz questions in bulk: {e}")
             return False
     
+    def create_quiz_with_questions(self, user_id: str, difficulty: str, language: str,
+                                   supports_oop: bool, questions: List[Dict]) -> Optional[str]:
+        """
+        Create a quiz session and all of its questions in one transaction (one round trip).
+        Questions must carry pre-assigned UUIDs in 'id' so callers know them in insertion order.
+        Returns the new quiz id. Falls back to separate inserts only when the function is
+        missing; any other error is raised, since the transaction may have committed.
+        """
+        try:
+            result = self.client.rpc('create_quiz_with_questions', {
+                'p_user_id': user_id,
+                'p_difficulty': difficulty,
+                'p_language': language,
+                'p_supports_oop': supports_oop,
+                'p_questions': questions
+            }).execute()
+            self.invalidate_profile(user_id)
+            return result.data if result.data else None
+        except Exception as e:
+            if not rpc_missing(e):
+                # A timeout or reset after commit would otherwise store the quiz twice
+                print(f"Error creating quiz via RPC: {e}")
+                raise
+            print(f"create_quiz_with_questions RPC not installed, falling back to separate inserts: {e}")
+            return self._create_quiz_with_questions_sequential(user_id, difficulty, language,
+                                                               supports_oop, questions)
+    
+    def _create_quiz_with_questions_sequential(self, user_id: str, difficulty: str, language: str,
+                                               supports_oop: bool, questions: List[Dict]) -> Optional[str]:
+        """Two round trips for databases without the RPC; removes the session if questions fail"""
+        quiz_session = self.create_quiz_session(user_id, difficulty, language, supports_oop)
+        if not quiz_session:
+            return None
+        
+        quiz_id = quiz_session['id']
+        if not self.add_quiz_questions_bulk([dict(q, quiz_id=quiz_id) for q in questions]):
+            self.delete_quiz_session(quiz_id)
+            return None
+        return quiz_id
+    
     def get_quiz_questions(self, quiz_id: str) -> List[Dict]:
-        """Get all questions for a quiz session"""
+        """Get all questions for a quiz session (bank-backed rows come back with their content)"""
         try:
-            result = (self.client.table('quiz_questions')
-                     .select('*')
-                     .eq('quiz_id', quiz_id)
-                     .execute())
-            return result.data if result.data else []
+            try:
+                result = (self.client.table('quiz_questions')
+                         .select(f"*, {BANK_EMBED}")
+                         .eq('quiz_id', quiz_id)
+                         .execute())
+            except Exception as e:
+                print(f"⚠️  Question bank embed unavailable, reading quiz_questions only: {e}")
+                result = (self.client.table('quiz_questions')
+                         .select('*')
+                         .eq('quiz_id', quiz_id)
+                         .execute())
+            return flatten_bank_rows(result.data) if result.data else []
         except Exception as e:
             print(f"Error getting quiz questions: {e}")
             return []
     
+    # ==================== QUESTION BANK OPERATIONS ====================
+    
+    def ingest_question_bank(self, entries: List[Dict], threshold: float) -> Optional[List[Dict]]:
+        """
+        Store question_bank entries, reusing exact and near duplicates (one round trip
+        through the ingest_questions function). Returns one row per entry, in order:
+        {'bank_id', 'match', 'question', 'options', 'correct_answer', 'explanation'}.
+        Falls back to exact-hash dedupe if the function isn't installed.
+        """
+        try:
+            result = self.client.rpc('ingest_questions', {
+                'p_entries': entries,
+                'p_threshold': threshold
+            }).execute()
+            rows = sorted(result.data or [], key=lambda row: row['item'])
+            return [{
+                'bank_id': row['bank_id'],
+                'match': row['matched'],
+                'question': row['question'],
+                'options': row['options'],
+                'correct_answer': row['correct_answer'],
+                'explanation': row.get('explanation')
+            } for row in rows]
+        except Exception as e:
+            print(f"Error ingesting via RPC, falling back to exact-match dedupe: {e}")
+            return self._ingest_question_bank_exact(entries)
+    
+    def _ingest_question_bank_exact(self, entries: List[Dict]) -> Optional[List[Dict]]:
+        """Content-hash dedupe only, for databases without ingest_questions"""
+        try:
+            columns = 'id, content_hash, question, options, correct_answer, explanation'
+            hashes = list({e['content_hash'] for e in entries})
+            existing = (self.client.table('question_bank')
+                       .select(columns)
+                       .in_('content_hash', hashes)
+                       .execute())
+            stored = {row['content_hash']: dict(row, match='exact') for row in existing.data or []}
+            
+            new_rows = {}
+            for e in entries:
+                if e['content_hash'] not in stored:
+                    new_rows.setdefault(e['content_hash'], {col: e[col] for col in BANK_ROW_COLUMNS})
+            if new_rows:
+                # First writer wins: a stored entry's content never changes under existing quizzes
+                (self.client.table('question_bank')
+                 .upsert(list(new_rows.values()), on_conflict='content_hash', ignore_duplicates=True)
+                 .execute())
+                inserted = (self.client.table('question_bank')
+                           .select(columns)
+                           .in_('content_hash', list(new_rows))
+                           .execute())
+                for row in inserted.data or []:
+                    stored[row['content_hash']] = dict(row, match='new')
+                bands = [{'band': band, 'bank_id': stored[e['content_hash']]['id']}
+                         for e in entries if e['content_hash'] in new_rows and e['content_hash'] in stored
+                         for band in set(e['bands'])]
+                if bands:
+                    (self.client.table('question_bank_bands')
+                     .upsert(bands, on_conflict='band,bank_id', ignore_duplicates=True)
+                     .execute())
+            
+            rows = []
+            for e in entries:
+                row = stored.get(e['content_hash'])
+                if not row:
+                    return None
+                rows.append({
+                    'bank_id': row['id'],
+                    'match': row['match'],
+                    'question': row['question'],
+                    'options': row['options'],
+                    'correct_answer': row['correct_answer'],
+                    'explanation': row.get('explanation')
+                })
+            return rows
+        except Exception as e:
+            print(f"Error ingesting question bank entries: {e}")
+            return None
+    
     # ==================== RESULTS OPERATIONS ====================
     
     def save_result(self, user_id: str, quiz_id: str, total_score: int,
                    programming_score: float, analytics_score: float, 
                    testing_score: float, recommended_domain: str,
-                   ai_insights: str = None) -> Optional[Dict]:
-        """Save quiz results"""
+                   ai_insights: str = None, insights_status: str = None,
+                   answers: Optional[Dict[str, int]] = None) -> Optional[Dict]:
+        """Save quiz results (insights_status='pending' when insights are attached later)"""
         try:
             data = {
                 'user_id': user_id,
@@ -182,12 +378,130 @@ class DatabaseManager:
                 'ai_insights': ai_insights,
                 'completed_at': datetime.utcnow().isoformat()
             }
+            if insights_status:
+                data['insights_status'] = insights_status
+            if answers is not None:
+                # Kept so results can be re-scored when the weight matrix changes
+                data['answers'] = answers
             result = self.client.table('results').insert(data).execute()
+            self.invalidate_profile(user_id)
             return result.data[0] if result.data else None
         except Exception as e:
             print(f"Error saving result: {e}")
             return None
     
+    def update_result_insights(self, result_id: str, ai_insights: Optional[str],
+                               insights_status: str = 'ready', only_pending: bool = False) -> Optional[Dict]:
+        """Attach AI insights to a stored result (only_pending: leave it alone once it left 'pending')"""
+        try:
+            query = (self.client.table('results')
+                     .update({'ai_insights': ai_insights, 'insights_status': insights_status})
+                     .eq('id', result_id))
+            if only_pending:
+                query = query.eq('insights_status', 'pending')
+            result = query.execute()
+            row = result.data[0] if result.data else None
+            if row:
+                # Recent results on the profile carry the insights
+                self.invalidate_profile(row['user_id'])
+            return row
+        except Exception as e:
+            print(f"Error updating result insights: {e}")
+            return None
+    
+    def iter_results_with_answers(self, batch_size: int = 1000):
+        """Yield pages of stored results that have their answers (keyset pagination on id)"""
+        last_id = None
+        while True:
+            query = (self.client.table('results')
+                     .select('id, quiz_id, answers')
+                     .not_.is_('answers', 'null')
+                     .order('id')
+                     .limit(batch_size))
+            if last_id:
+                query = query.gt('id', last_id)
+            page = query.execute().data or []
+            if not page:
+                return
+            yield page
+            last_id = page[-1]['id']
+
+    def count_results_without_answers(self) -> int:
+        """Results stored before answers were kept; they can't be re-scored"""
+        try:
+            result = (self.client.table('results')
+                     .select('id', count='exact')
+                     .is_('answers', 'null')
+                     .limit(1)
+                     .execute())
+            return result.count or 0
+        except Exception as e:
+            print(f"Error counting results without answers: {e}")
+            return 0
+
+    def get_seen_filter(self, user_id: str) -> Optional[Dict]:
+        """Stored seen-question filter of a user (None if they have none yet)"""
+        try:
+            result = (self.client.table('user_seen_questions')
+                     .select('filter')
+                     .eq('user_id', user_id)
+                     .execute())
+            return result.data[0]['filter'] if result.data else None
+        except Exception as e:
+            print(f"Error getting seen-question filter: {e}")
+            return None
+    
+    def save_seen_filter(self, user_id: str, document: Dict, items: int) -> bool:
+        """Store a user's seen-question filter (replaces the previous one)"""
+        try:
+            (self.client.table('user_seen_questions')
+             .upsert({'user_id': user_id, 'filter': document, 'items': items,
+                      'updated_at': datetime.utcnow().isoformat()}, on_conflict='user_id')
+             .execute())
+            return True
+        except Exception as e:
+            print(f"Error saving seen-question filter: {e}")
+            return False
+    
+    def get_answer_keys(self, quiz_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Answer-key columns of quiz_questions for several quizzes in one query"""
+        keys: Dict[str, List[Dict]] = {quiz_id: [] for quiz_id in quiz_ids}
+        try:
+            result = (self.client.table('quiz_questions')
+                     .select('id, quiz_id, correct_answer, category, question_bank(correct_answer, category)')
+                     .in_('quiz_id', list(quiz_ids))
+                     .execute())
+            for row in flatten_bank_rows(result.data or []):
+                keys[row['quiz_id']].append(row)
+        except Exception as e:
+            print(f"Error getting answer keys: {e}")
+        return keys
+
+    def update_result_scores(self, rows: List[Dict]) -> int:
+        """
+        Bulk-update domain scores, one round trip through the rescore_results function.
+        Falls back to per-row updates if the function isn't installed. Either way the
+        stored public snapshots of the updated results are deleted.
+        """
+        if not rows:
+            return 0
+        try:
+            result = self.client.rpc('rescore_results', {'p_rows': rows}).execute()
+            return int(result.data or 0)
+        except Exception as e:
+            print(f"⚠️  rescore_results RPC unavailable ({e}), updating row by row")
+
+        updated = []
+        for row in rows:
+            changes = {k: v for k, v in row.items() if k != 'id'}
+            try:
+                self.client.table('results').update(changes).eq('id', row['id']).execute()
+                updated.append(row['id'])
+            except Exception as e:
+                print(f"Error updating scores for result {row['id']}: {e}")
+        self.delete_result_snapshots(updated)
+        return len(updated)
+
     def get_result(self, result_id: str) -> Optional[Dict]:
         """Get result by ID"""
         try:
@@ -200,6 +514,72 @@ class DatabaseManager:
     def get_result_by_id(self, result_id: str) -> Optional[Dict]:
         """Get result details by result ID (alias for get_result)"""
         return self.get_result(result_id)
+
+    def get_result_with_user_name(self, result_id: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """Result row and its owner's name in one query (embedded users select)"""
+        try:
+            result = self.client.table('results').select('*, users(name)').eq('id', result_id).execute()
+            if not result.data:
+                return None, None
+            row = result.data[0]
+            user = row.pop('users', None)
+            return row, user['name'] if user else None
+        except Exception as e:
+            print(f"⚠️  Embedded result select failed ({e}), using separate queries")
+        row = self.get_result(result_id)
+        user = self.get_user_by_id(row['user_id']) if row and row.get('user_id') else None
+        return row, user['name'] if user else None
+
+    def count_quiz_questions(self, quiz_id: str) -> int:
+        """Number of questions in a quiz without downloading them"""
+        try:
+            result = (self.client.table('quiz_questions')
+                     .select('id', count='exact')
+                     .eq('quiz_id', quiz_id)
+                     .limit(1)
+                     .execute())
+            return result.count or 0
+        except Exception as e:
+            print(f"Error counting quiz questions: {e}")
+            return 0
+
+    def get_result_snapshot(self, result_id: str) -> Optional[Tuple[Dict, str]]:
+        """Stored public snapshot of a result as (document, etag)"""
+        try:
+            result = (self.client.table('result_snapshots')
+                     .select('document, etag')
+                     .eq('result_id', result_id)
+                     .execute())
+            if not result.data:
+                return None
+            row = result.data[0]
+            return row['document'], row['etag']
+        except Exception as e:
+            print(f"Error getting result snapshot: {e}")
+            return None
+
+    def save_result_snapshot(self, result_id: str, document: Dict, etag: str) -> bool:
+        """Store a public snapshot of a result (first write wins)"""
+        try:
+            (self.client.table('result_snapshots')
+             .upsert({'result_id': result_id, 'document': document, 'etag': etag},
+                     on_conflict='result_id', ignore_duplicates=True)
+             .execute())
+            return True
+        except Exception as e:
+            print(f"Error saving result snapshot: {e}")
+            return False
+    
+    def delete_result_snapshots(self, result_ids: List[str]) -> bool:
+        """Drop stored snapshots so the next read rebuilds them (e.g. after re-scoring)"""
+        if not result_ids:
+            return True
+        try:
+            self.client.table('result_snapshots').delete().in_('result_id', result_ids).execute()
+            return True
+        except Exception as e:
+            print(f"Error deleting result snapshots: {e}")
+            return False
     
     def get_user_results(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Get all results for a user"""
@@ -215,6 +595,65 @@ class DatabaseManager:
             print(f"Error getting user results: {e}")
             return []
     
+    def get_user_attempts(self, user_id: str, limit: int = 10, cursor: Optional[str] = None,
+                          columns: Optional[List[str]] = None,
+                          with_session: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        """
+        One page of a user's results, newest first, each with its quiz session's
+        difficulty and language (unless with_session=False). Only `columns` of
+        results are selected (default ATTEMPT_COLUMNS). Keyset pagination on
+        (completed_at, id): pass the returned cursor to get the next page.
+        Returns (rows, next_cursor); raises CursorError for a malformed cursor.
+        """
+        position = decode_cursor(cursor) if cursor else None
+        # The cursor needs id and completed_at, the session fallback needs quiz_id
+        columns = list(dict.fromkeys(['id', 'completed_at', 'quiz_id'] + list(columns or ATTEMPT_COLUMNS)))
+        try:
+            rows = self._attempts_page(user_id, limit, position, columns, embed=with_session)
+        except Exception as e:
+            if not with_session:
+                print(f"Error getting user attempts: {e}")
+                return [], None
+            # No results -> quiz_sessions relationship exposed: one batched session lookup instead
+            print(f"⚠️  Embedded attempts select failed ({e}), batching session lookup")
+            try:
+                rows = self._attempts_page(user_id, limit, position, columns, embed=False)
+                quiz_ids = list({row['quiz_id'] for row in rows if row.get('quiz_id')})
+                sessions = {}
+                if quiz_ids:
+                    result = (self.client.table('quiz_sessions')
+                             .select('id, difficulty, language')
+                             .in_('id', quiz_ids)
+                             .execute())
+                    sessions = {s['id']: s for s in result.data or []}
+                for row in rows:
+                    row['quiz_sessions'] = sessions.get(row['quiz_id'])
+            except Exception as e:
+                print(f"Error getting user attempts: {e}")
+                return [], None
+
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def _attempts_page(self, user_id: str, limit: int, position: Optional[Tuple[str, str]],
+                       columns: List[str], embed: bool) -> List[Dict]:
+        select = ', '.join(columns) + (', quiz_sessions(difficulty, language)' if embed else '')
+        query = (self.client.table('results')
+                 .select(select)
+                 .eq('user_id', user_id))
+        if position:
+            completed_at, row_id = position
+            query = query.or_(
+                f'completed_at.lt."{completed_at}",'
+                f'and(completed_at.eq."{completed_at}",id.lt.{row_id})'
+            )
+        # One extra row tells us whether another page exists
+        result = (query.order('completed_at', desc=True)
+                  .order('id', desc=True)
+                  .limit(limit + 1)
+                  .execute())
+        return result.data or []
+
     def get_quiz_result(self, quiz_id: str) -> Optional[Dict]:
         """Get result for a specific quiz"""
         try:
@@ -230,8 +669,37 @@ class DatabaseManager:
     
     # ==================== ANALYTICS OPERATIONS ====================
     
+    def get_user_stats_row(self, user_id: str) -> Optional[Dict]:
+        """The trigger-maintained user_stats row (None if missing or not yet backfilled)"""
+        try:
+            result = self.client.table('user_stats').select('*').eq('user_id', user_id).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            print(f"Error getting user stats row: {e}")
+            return None
+
     def get_user_statistics(self, user_id: str) -> Optional[Dict]:
-        """Get user statistics"""
+        """Get user statistics (single-row read of user_stats, full scan if the row is missing)"""
+        row = self.get_user_stats_row(user_id)
+        if row is None:
+            return self._scan_user_statistics(user_id)
+        return self.format_user_stats(row)
+
+    @staticmethod
+    def format_user_stats(row: Dict) -> Dict:
+        """Statistics dict from a user_stats row"""
+        completed = row['completed_quizzes']
+        return {
+            'total_quizzes': row['total_quizzes'],
+            'completed_quizzes': completed,
+            'average_score': round(row['score_sum'] / completed, 2) if completed else 0,
+            'best_score': row['best_score'],
+            'last_quiz_date': row['last_quiz_date'],
+            'domain_counts': row.get('domain_counts') or {}
+        }
+
+    def _scan_user_statistics(self, user_id: str) -> Optional[Dict]:
+        """Compute statistics from the user's sessions and results (before backfill)"""
         try:
             # Get total quizzes
             quiz_sessions = self.get_user_quiz_sessions(user_id, limit=1000)
@@ -244,37 +712,87 @@ class DatabaseManager:
                     'total_quizzes': len(quiz_sessions),
                     'completed_quizzes': 0,
                     'average_score': 0,
-                    'last_quiz_date': None
+                    'best_score': 0,
+                    'last_quiz_date': None,
+                    'domain_counts': {}
                 }
             
             total_score = sum(r['total_score'] for r in results)
             avg_score = total_score / len(results) if results else 0
             last_quiz = max(results, key=lambda x: x['completed_at'])
+            domain_count = {}
+            for result in results:
+                domain = result['recommended_domain']
+                domain_count[domain] = domain_count.get(domain, 0) + 1
             
             return {
                 'total_quizzes': len(quiz_sessions),
                 'completed_quizzes': len(results),
                 'average_score': round(avg_score, 2),
-                'last_quiz_date': last_quiz['completed_at']
+                'best_score': max(r['total_score'] for r in results),
+                'last_quiz_date': last_quiz['completed_at'],
+                'domain_counts': domain_count
             }
         except Exception as e:
             print(f"Error getting user statistics: {e}")
             return None
     
-    def get_domain_recommendations(self, user_id: str) -> Dict[str, int]:
-        """Get domain recommendation frequency for a user"""
+    def get_profile_bundle(self, user_id: str, recent: int = 5,
+                           include_insights: bool = False) -> Optional[Dict]:
+        """
+        User row with its user_stats row and `recent` newest results embedded, in one query.
+        Keys: the user columns plus 'user_stats' (dict or None) and 'results' (newest first).
+        The results' ai_insights blobs are only selected with include_insights=True.
+        """
+        result_columns = RECENT_RESULT_COLUMNS + (', ai_insights' if include_insights else '')
         try:
-            results = self.get_user_results(user_id, limit=1000)
-            domain_count = {}
-            
-            for result in results:
-                domain = result['recommended_domain']
-                domain_count[domain] = domain_count.get(domain, 0) + 1
-            
-            return domain_count
+            result = (self.client.table('users')
+                     .select(f'*, user_stats(*), results({result_columns})')
+                     .eq('id', user_id)
+                     .order('completed_at', desc=True, foreign_table='results')
+                     .limit(recent, foreign_table='results')
+                     .execute())
+            if not result.data:
+                return None
+            bundle = result.data[0]
+            # One-to-one embeds come back as an object, older PostgREST versions use a list
+            stats = bundle.get('user_stats')
+            if isinstance(stats, list):
+                bundle['user_stats'] = stats[0] if stats else None
+            bundle['results'] = bundle.get('results') or []
+            return bundle
         except Exception as e:
-            print(f"Error getting domain recommendations: {e}")
-            return {}
+            print(f"⚠️  Embedded profile select failed ({e}), using separate queries")
+
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return None
+        return dict(user, user_stats=self.get_user_stats_row(user_id),
+                    results=self.get_user_results(user_id, limit=recent))
+
+    def get_cached_profile(self, user_id: str, variant: Any = None) -> Optional[Dict]:
+        """Cached profile document; `variant` tells apart differently shaped documents (fieldsets)"""
+        return (self.profile_cache.get(user_id) or {}).get(variant)
+
+    def cache_profile(self, user_id: str, profile: Dict, variant: Any = None):
+        variants = dict(self.profile_cache.get(user_id) or {})
+        variants[variant] = profile
+        self.profile_cache.set(user_id, variants)
+
+    def invalidate_profile(self, user_id: str):
+        """Drop this process's cached profile document; called by every write that changes it"""
+        if user_id:
+            self.profile_cache.delete(user_id)
+
+    def get_domain_recommendations(self, user_id: str) -> Dict[str, int]:
+        """Get domain recommendation frequency for a user"""
+        stats = self.get_user_statistics(user_id)
+        return stats['domain_counts'] if stats else {}
+
+    def backfill_user_stats(self, after: Optional[str] = None, limit: int = 500) -> Optional[str]:
+        """Rebuild user_stats rows for the next `limit` users after `after`; returns the last id or None when done"""
+        result = self.client.rpc('backfill_user_stats', {'p_after': after, 'p_limit': limit}).execute()
+        return result.data or None
     
     # ==================== UTILITY OPERATIONS ====================
     
@@ -291,6 +809,7 @@ class DatabaseManager:
         """Delete a user and all related data (cascade)"""
         try:
             self.client.table('users').delete().eq('clerk_id', clerk_id).execute()
+            self.invalidate_user(clerk_id)
             return True
         except Exception as e:
             print(f"Error deleting user: {e}")
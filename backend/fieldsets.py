@@ -0,0 +1,40 @@
+"""
+Sparse fieldsets for list endpoints
+
+`fields=a,b` picks the fields of each document; heavy fields (e.g. the
+multi-kilobyte ai_insights) are left out unless named in `fields` or
+`include`. Callers use the resolved set to decide which columns to select
+and which blobs to decode.
+"""
+from typing import Dict, FrozenSet, Iterable, Optional
+
+
+class FieldsetError(ValueError):
+    """Unknown field requested"""
+
+
+def parse_list(value: Optional[str]) -> Optional[list]:
+    """'a, b,,c' -> ['a', 'b', 'c']; None when the parameter is absent"""
+    if value is None:
+        return None
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def resolve_fields(fields: Optional[str], include: Optional[str],
+                   available: Iterable[str], heavy: Iterable[str] = ()) -> FrozenSet[str]:
+    """Fields to return: `fields` (default: all light fields) plus `include`"""
+    available = frozenset(available)
+    requested = parse_list(fields)
+    extra = parse_list(include) or []
+
+    unknown = set(requested or ()).union(extra) - available
+    if unknown:
+        raise FieldsetError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+
+    selected = set(requested) if requested is not None else available - frozenset(heavy)
+    return frozenset(selected.union(extra))
+
+
+def pick(document: Dict, fields: FrozenSet[str]) -> Dict:
+    """Keep only the selected keys (in document order)"""
+    return {key: value for key, value in document.items() if key in fields}
@@ -0,0 +1,194 @@
+"""
+Cache of AI career insights keyed by a performance signature
+
+Insights depend only on the recommended domain, the total score and the
+per-category results. The generated text quotes the exact score, so the
+signature uses the exact counts: only identical performances share text.
+Up to INSIGHTS_CACHE_VARIANTS different insight documents are kept per
+signature so repeat visitors don't always read the same text.
+"""
+import os
+import json
+import time
+import atexit
+import random
+import copy
+import threading
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialized across processes
+    fcntl = None
+
+from cache import TTLCache
+
+
+INSIGHTS_CACHE_ENABLED = os.getenv('INSIGHTS_CACHE_ENABLED', 'true').lower() == 'true'
+INSIGHTS_CACHE_SIZE = int(os.getenv('INSIGHTS_CACHE_SIZE', 2048))
+INSIGHTS_CACHE_TTL = int(os.getenv('INSIGHTS_CACHE_TTL', 7 * 24 * 3600))
+# Distinct insight documents generated per signature before serving from cache
+INSIGHTS_CACHE_VARIANTS = int(os.getenv('INSIGHTS_CACHE_VARIANTS', 2))
+# Optional JSON file the cache is loaded from and saved to
+INSIGHTS_CACHE_PATH = os.getenv('INSIGHTS_CACHE_PATH')
+# Seconds a background writer waits after a new variant so several land in one save
+INSIGHTS_CACHE_SAVE_DELAY = float(os.getenv('INSIGHTS_CACHE_SAVE_DELAY', 5))
+
+
+def performance_signature(domain: str, total_correct: int, category_correct: Dict[str, Dict]) -> str:
+    """Normalized cache key: domain, exact total and exact correct/total per category"""
+    categories = ','.join(
+        f"{cat}:{stats.get('correct', 0)}/{stats.get('total', 0)}"
+        for cat, stats in sorted(category_correct.items())
+    )
+    return f"{domain}|{total_correct}|{categories}"
+
+
+class InsightsCache:
+    """
+    LRU + TTL cache of insight variants with optional on-disk persistence.
+
+    New variants mark the cache dirty; a background thread saves it at most
+    once per `save_delay` seconds, merging in whatever other worker processes
+    saved to the same file (under an flock) instead of overwriting it.
+    """
+
+    def __init__(self, maxsize: int = INSIGHTS_CACHE_SIZE, ttl: int = INSIGHTS_CACHE_TTL,
+                 variants: int = INSIGHTS_CACHE_VARIANTS, path: Optional[str] = INSIGHTS_CACHE_PATH,
+                 save_delay: float = INSIGHTS_CACHE_SAVE_DELAY):
+        self.variants = max(1, variants)
+        self.path = path
+        self.save_delay = save_delay
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stats = {'hits': 0, 'misses': 0, 'generations': 0, 'generation_seconds': 0.0, 'saved_seconds': 0.0,
+                       'saves': 0, 'save_errors': 0}
+        if path:
+            loaded = self._merge(self._read())
+            print(f"✓ Loaded {loaded} cached insight signatures from {path}")
+            threading.Thread(target=self._writer, name='insights-cache-writer', daemon=True).start()
+            atexit.register(self.flush)
+
+    def get_or_generate(self, signature: str, generate: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Serve cached insights for a signature once it has enough variants,
+        otherwise call `generate()` and remember its result.
+        Exceptions from `generate` propagate and nothing is cached.
+        """
+        variants = self._cache.get(signature) or []
+
+        if len(variants) >= self.variants:
+            with self._lock:
+                self._stats['hits'] += 1
+                generations = self._stats['generations']
+                if generations:
+                    self._stats['saved_seconds'] += self._stats['generation_seconds'] / generations
+            print(f"⚡ Insights served from cache ({signature})")
+            return copy.deepcopy(random.choice(variants))
+
+        with self._lock:
+            self._stats['misses'] += 1
+
+        started = time.time()
+        insights = generate()
+        elapsed = time.time() - started
+
+        with self._lock:
+            self._stats['generations'] += 1
+            self._stats['generation_seconds'] += elapsed
+
+        # Re-read in case another thread added a variant meanwhile
+        variants = list(self._cache.get(signature) or [])
+        if len(variants) < self.variants:
+            variants.append(copy.deepcopy(insights))
+            self._cache.set(signature, variants)
+            if self.path:
+                self._dirty.set()
+
+        return insights
+
+    def flush(self):
+        """Save now if there are unsaved variants"""
+        if self._dirty.is_set():
+            self._dirty.clear()
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        generations = stats['generations']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        stats['avg_generation_seconds'] = round(stats.pop('generation_seconds') / generations, 3) if generations else 0
+        stats['saved_seconds'] = round(stats['saved_seconds'], 2)
+        stats['signatures'] = len(self._cache)
+        stats['variants_per_signature'] = self.variants
+        stats['persisted_to'] = self.path
+        return stats
+
+    # ==================== PERSISTENCE ====================
+
+    def _writer(self):
+        while True:
+            self._dirty.wait()
+            # Let a burst of misses accumulate into one save
+            time.sleep(self.save_delay)
+            self.flush()
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"⚠️  Could not load insights cache from {self.path}: {e}")
+            return {}
+
+    def _merge(self, data: Dict[str, Dict]) -> int:
+        """Add stored signatures and variants this process doesn't have yet"""
+        now = time.time()
+        merged = 0
+        for signature, entry in data.items():
+            ttl = entry.get('expires_at', 0) - now
+            stored = entry.get('variants') or []
+            if ttl <= 0 or not stored:
+                continue
+            variants = list(self._cache.get(signature) or [])
+            if len(variants) >= self.variants:
+                continue
+            variants.extend(v for v in stored if v not in variants)
+            self._cache.set(signature, variants[:self.variants], ttl=ttl)
+            merged += 1
+        return merged
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._save_lock:
+            try:
+                with open(f"{self.path}.lock", 'a') as lock_file:
+                    if fcntl:
+                        # Serializes read-merge-write across worker processes
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    merged = self._merge(self._read())
+                    data = {
+                        signature: {'variants': variants, 'expires_at': expires_at}
+                        for signature, variants, expires_at in self._cache.items()
+                    }
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(data, f)
+                    os.replace(tmp_path, self.path)
+                with self._lock:
+                    self._stats['saves'] += 1
+                if merged:
+                    print(f"✓ Insights cache saved, merged {merged} signatures from other workers")
+            except Exception as e:
+                with self._lock:
+                    self._stats['save_errors'] += 1
+                print(f"⚠️  Could not save insights cache to {self.path}: {e}")
+
+
+# Create a global instance
+insights_cache = InsightsCache()
@@ -0,0 +1,187 @@
+"""
+Incremental, tolerant parsing of JSON objects out of model output
+
+Gemini responses are expected to be a JSON array of question objects but
+often arrive wrapped in markdown fences, truncated by the token limit or
+with a garbled object in the middle. The parser here scans the text once
+and yields every complete top-level object, skipping malformed ones
+instead of discarding everything after them.
+"""
+import re
+import json
+from typing import Any, Dict, List, Tuple
+
+
+# Nested rescans allowed when broken objects swallow their neighbours
+MAX_SALVAGE_DEPTH = 8
+
+_OBJECT_SPECIALS = re.compile(r'[{}"]')
+_STRING_SPECIALS = re.compile(r'["\\\n]')
+
+
+class IncrementalObjectParser:
+    """
+    Pull complete top-level JSON objects out of text as it arrives.
+
+    Feed chunks of a JSON array (``[{...}, {...}, ...``) and get back every
+    object whose closing brace has been seen. Text outside objects (array
+    brackets, commas, markdown fences, prose) is ignored, and consumed text
+    is discarded so memory stays proportional to one object.
+
+    Malformed objects are skipped without losing their neighbours:
+    - a raw newline inside a string (never valid JSON) abandons the object
+    - the text of a broken object (e.g. one missing its closing brace or a
+      quote) is rescanned so the intact objects it swallowed are recovered
+    """
+
+    def __init__(self, _salvage_depth: int = 0):
+        self._salvage_depth = _salvage_depth
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._start = -1
+        self._in_string = False
+        self.parsed = 0
+        self.skipped = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add a chunk of text and return the objects it completed"""
+        self._buffer += chunk
+        objects = []
+        buffer = self._buffer
+        i = self._pos
+        n = len(buffer)
+
+        while i < n:
+            if self._depth == 0:
+                i = buffer.find('{', i)
+                if i < 0:
+                    i = n
+                    break
+                self._depth = 1
+                self._start = i
+                i += 1
+                continue
+
+            # Jump straight to the next character that can change parser state
+            match = (_STRING_SPECIALS if self._in_string else _OBJECT_SPECIALS).search(buffer, i)
+            if not match:
+                i = n
+                break
+            i = match.start()
+            ch = buffer[i]
+
+            if self._in_string:
+                if ch == '\\':
+                    if i + 1 >= n:
+                        # Escape split across chunks; resume here next time
+                        break
+                    i += 1
+                elif ch == '"':
+                    self._in_string = False
+                else:
+                    # Raw newline: unterminated string, the object is broken; resync on the next line
+                    objects.extend(self._salvage(buffer[self._start + 1:i]))
+                    self._reset_object()
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = self._decode(buffer[self._start:i + 1])
+                    if obj is not None:
+                        objects.append(obj)
+                    else:
+                        objects.extend(self._salvage(buffer[self._start + 1:i + 1]))
+                    self._reset_object()
+            i += 1
+
+        # Drop everything before the object currently being read
+        if self._start >= 0:
+            offset = self._start
+            self._buffer = buffer[offset:]
+            self._pos = i - offset
+            self._start = 0
+        else:
+            self._buffer = ''
+            self._pos = 0
+
+        return objects
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """End of input: salvage complete objects nested in a truncated trailing object"""
+        objects = []
+        if self._start >= 0:
+            objects = self._salvage(self._buffer[self._start + 1:])
+        self._reset_object()
+        self._buffer = ''
+        self._pos = 0
+        return objects
+
+    # ==================== INTERNALS ====================
+
+    def _reset_object(self):
+        self._depth = 0
+        self._start = -1
+        self._in_string = False
+
+    def _salvage(self, region: str) -> List[Dict[str, Any]]:
+        """
+        The object starting just before `region` is broken (and lost). Rescan the
+        rest of it with fresh state: a missing brace or quote can swallow the
+        objects that follow, and those are usually intact.
+        """
+        self.skipped += 1
+        if self._salvage_depth >= MAX_SALVAGE_DEPTH:
+            return []
+        sub = IncrementalObjectParser(_salvage_depth=self._salvage_depth + 1)
+        objects = sub.feed(region)
+        objects.extend(sub.finish())
+        self.parsed += sub.parsed
+        self.skipped += sub.skipped
+        return objects
+
+    def _decode(self, text: str):
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(obj, dict):
+            return None
+        self.parsed += 1
+        return obj
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove markdown code fences around model output"""
+    return text.replace('```json', '').replace('```', '').strip()
+
+
+def parse_json_objects(text: str) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Parse model output into a list of objects in a single pass.
+    Returns (objects, skipped) where skipped counts malformed objects.
+    """
+    text = strip_code_fences(text)
+
+    # Well-formed (or cleanly truncated) output: let the C decoder do the work
+    start = text.find('[')
+    candidates = [text]
+    if start >= 0:
+        candidates.append(text[start:text.rfind(']') + 1])
+        candidates.append(text[start:text.rfind('}') + 1] + ']')
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, list):
+            objects = [obj for obj in data if isinstance(obj, dict)]
+            return objects, len(data) - len(objects)
+
+    parser = IncrementalObjectParser()
+    objects = parser.feed(text)
+    objects.extend(parser.finish())
+    return objects, parser.skipped
@@ -0,0 +1,190 @@
+"""
+Process-wide cache for Clerk JWKS signing keys
+"""
+import os
+import json
+import time
+import threading
+from typing import Optional, Dict, Any
+
+import requests
+from jwt.algorithms import RSAAlgorithm
+
+
+# How long a fetched key set is considered fresh
+JWKS_CACHE_TTL = int(os.getenv('JWKS_CACHE_TTL', 3600))
+# Start a background refresh once this fraction of the TTL has elapsed
+JWKS_REFRESH_AHEAD = float(os.getenv('JWKS_REFRESH_AHEAD', 0.8))
+# Minimum spacing between forced refetches caused by unknown key ids
+JWKS_MIN_REFETCH_INTERVAL = float(os.getenv('JWKS_MIN_REFETCH_INTERVAL', 30))
+JWKS_FETCH_TIMEOUT = 5
+
+
+class _KeySet:
+    """Parsed keys for a single issuer domain"""
+
+    def __init__(self, keys: Dict[str, Any], fetched_at: float):
+        self.keys = keys
+        self.fetched_at = fetched_at
+
+
+class JWKSCache:
+    """
+    Cache of parsed RSA public keys keyed by issuer domain and kid.
+
+    - Fresh keys are served from memory without any network call
+    - Keys nearing expiry are refreshed in a background thread
+    - An unknown kid triggers an immediate refetch (one fetch per domain at a time)
+    - If the JWKS endpoint is down, previously fetched (stale) keys are served
+    """
+
+    def __init__(self, ttl: int = JWKS_CACHE_TTL, refresh_ahead: float = JWKS_REFRESH_AHEAD,
+                 min_refetch_interval: float = JWKS_MIN_REFETCH_INTERVAL):
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refetch_interval = min_refetch_interval
+        self._key_sets: Dict[str, _KeySet] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self._refreshing = set()
+        self._last_fetch_attempt: Dict[str, float] = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'fetches': 0,
+            'fetch_errors': 0,
+            'background_refreshes': 0,
+            'stale_served': 0
+        }
+
+    # ==================== PUBLIC API ====================
+
+    def get_key(self, clerk_domain: str, kid: str):
+        """Return the parsed public key for (domain, kid), or None if unknown"""
+        now = time.time()
+        key_set = self._key_sets.get(clerk_domain)
+
+        if key_set and kid in key_set.keys:
+            age = now - key_set.fetched_at
+            if age < self.ttl:
+                self._count('hits')
+                if age >= self.ttl * self.refresh_ahead:
+                    self._refresh_in_background(clerk_domain)
+                return key_set.keys[kid]
+
+        # Expired entry or unknown kid: fetch synchronously
+        self._count('misses')
+        key_set = self._fetch(clerk_domain, force=bool(key_set and kid not in key_set.keys))
+
+        if key_set and kid in key_set.keys:
+            if now - key_set.fetched_at >= self.ttl:
+                self._count('stale_served')
+            return key_set.keys[kid]
+
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and cached domains"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        stats['domains'] = {
+            domain: {
+                'keys': len(key_set.keys),
+                'age_seconds': round(time.time() - key_set.fetched_at, 1)
+            }
+            for domain, key_set in list(self._key_sets.items())
+        }
+        return stats
+
+    def clear(self):
+        """Drop all cached key sets"""
+        with self._lock:
+            self._key_sets.clear()
+            self._last_fetch_attempt.clear()
+
+    # ==================== INTERNALS ====================
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _domain_lock(self, clerk_domain: str) -> threading.Lock:
+        with self._lock:
+            if clerk_domain not in self._fetch_locks:
+                self._fetch_locks[clerk_domain] = threading.Lock()
+            return self._fetch_locks[clerk_domain]
+
+    def _fetch(self, clerk_domain: str, force: bool = False) -> Optional[_KeySet]:
+        """
+        Fetch keys for a domain with single-flight protection.
+        Threads that arrive while a fetch is running wait for it and reuse its result.
+        """
+        started = time.time()
+        with self._domain_lock(clerk_domain):
+            key_set = self._key_sets.get(clerk_domain)
+
+            # Another thread refreshed while we were waiting for the lock
+            if key_set and key_set.fetched_at >= started:
+                return key_set
+
+            if key_set and not force and time.time() - key_set.fetched_at < self.ttl:
+                return key_set
+
+            # Don't hammer the endpoint with tokens carrying bogus kids
+            last_attempt = self._last_fetch_attempt.get(clerk_domain, 0)
+            if force and key_set and time.time() - last_attempt < self.min_refetch_interval:
+                return key_set
+
+            self._last_fetch_attempt[clerk_domain] = time.time()
+            try:
+                keys = self._download(clerk_domain)
+            except Exception as e:
+                self._count('fetch_errors')
+                print(f"⚠️  JWKS fetch failed for {clerk_domain}: {e}")
+                # Serve stale keys if we have any
+                return key_set
+
+            key_set = _KeySet(keys, time.time())
+            with self._lock:
+                self._key_sets[clerk_domain] = key_set
+            return key_set
+
+    def _download(self, clerk_domain: str) -> Dict[str, Any]:
+        """Download and parse the JWKS document for a domain"""
+        self._count('fetches')
+        jwks_url = f"https://{clerk_domain}/.well-known/jwks.json"
+        response = requests.get(jwks_url, timeout=JWKS_FETCH_TIMEOUT)
+        response.raise_for_status()
+        jwks = response.json()
+
+        keys = {}
+        for key in jwks.get('keys', []):
+            if key.get('kty') != 'RSA' or 'kid' not in key:
+                continue
+            keys[key['kid']] = RSAAlgorithm.from_jwk(json.dumps(key))
+
+        print(f"✓ JWKS loaded for {clerk_domain} ({len(keys)} keys)")
+        return keys
+
+    def _refresh_in_background(self, clerk_domain: str):
+        """Refresh a domain's keys without blocking the current request"""
+        with self._lock:
+            if clerk_domain in self._refreshing:
+                return
+            self._refreshing.add(clerk_domain)
+            self._stats['background_refreshes'] += 1
+
+        def refresh():
+            try:
+                self._fetch(clerk_domain, force=True)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(clerk_domain)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+# Create a global instance
+jwks_cache = JWKSCache()
@@ -1,12 +1,33 @@
-from flask import Flask, request, jsonify       
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 import json
 import time
+import hashlib
+import threading
+import uuid
 import google.generativeai as genai
-from db import db, init_db
-from user_supabase import User
+from db import db, init_db, CursorError
+from user_supabase import User, ATTEMPT_FIELD_COLUMNS, PROFILE_FIELDS, HEAVY_FIELDS
+from jwks_cache import jwks_cache
+from cache import TTLCache
+from rate_limiter import gemini_rate_limiter, pool_rate_limiter, RateLimitExceeded, RATE_LIMIT_MAX_WAIT
+from question_pool import QuestionPool, QUESTION_POOL_ENABLED
+from quiz_jobs import quiz_jobs, JobManager, JobQueueFull
+from quiz_pipeline import quiz_pipeline, StageTimer
+from question_shards import ShardedGenerator, QUESTION_SHARDING_ENABLED
+from question_bank import QuestionBank, QUESTION_BANK_ENABLED
+from seen_questions import SeenQuestions
+from offline_bank import offline_bank
+from json_stream import IncrementalObjectParser, parse_json_objects
+from answer_keys import answer_keys
+from scoring import scoring
+from categories import canonical_category, normalize as normalize_category, QUIZ_CATEGORIES
+from result_snapshots import ResultSnapshotStore, shared_result_document, RESULT_SNAPSHOT_MAX_AGE
+from response_layer import ResponseLayer
+from fieldsets import resolve_fields, pick, FieldsetError
+from insights_cache import insights_cache, performance_signature, INSIGHTS_CACHE_ENABLED
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,6 +36,9 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 CORS(app, supports_credentials=True, origins=["*"])
 
+# gzip/brotli for large responses, ETag + 304 for the GET documents below
+response_layer = ResponseLayer(app, conditional_endpoints=['get_profile', 'get_attempts', 'get_result_details'])
+
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 if not GEMINI_API_KEY:
@@ -25,25 +49,73 @@ genai.configure(api_key=GEMINI_API_KEY)
 # Initialize database (just prints message for Supabase)
 init_db()
 
-# Rate limiting for gemini-2.0-flash-lite (30 RPM = 2 seconds between calls)
-last_api_call_time = 0
-API_CALL_INTERVAL = 2.5  # 2.5 seconds to be safe with 30 RPM limit
+# Map the offline question bank before workers fork (gunicorn --preload) so they share it.
+# Fallback quizzes depend on it, so refuse to start without one.
+offline_bank.open(required=True)
+
+def wait_for_rate_limit(max_wait=RATE_LIMIT_MAX_WAIT, limiter=gemini_rate_limiter):
+    """Reserve a Gemini slot from a shared token bucket (raises RateLimitExceeded if too far away)"""
+    if not limiter.acquire(max_wait=max_wait):
+        raise RateLimitExceeded(limiter.next_slot_in())
+
+def reserve_shard_slots(count):
+    """Take `count` Gemini slots together, only if they are all free right now (spare burst)"""
+    return gemini_rate_limiter.acquire(max_wait=0, tokens=count)
+
+# Default for /api/quiz/submit when the client doesn't send defer_insights
+DEFER_INSIGHTS = os.getenv('DEFER_INSIGHTS', 'false').lower() == 'true'
+# Deferred insight jobs waiting or running per process; past this, submits generate them inline
+INSIGHTS_JOB_MAX_PENDING = int(os.getenv('INSIGHTS_JOB_MAX_PENDING', 200))
+insights_jobs = JobManager('insights-job', max_workers=int(os.getenv('INSIGHTS_JOB_WORKERS', 2)),
+                           max_pending=INSIGHTS_JOB_MAX_PENDING, max_pending_per_owner=None)
+# Attempts at storing deferred insights before the result is marked 'failed' (backoff 1s, 2s, 4s...)
+INSIGHTS_WRITE_RETRIES = int(os.getenv('INSIGHTS_WRITE_RETRIES', 3))
+# A result still 'pending' after this many seconds lost its job (e.g. a restart) and gets the fallback insights
+INSIGHTS_PENDING_TIMEOUT = int(os.getenv('INSIGHTS_PENDING_TIMEOUT', 600))
+
+# Streamed questions are written to Supabase in batches of this size
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 5))
+
+# Largest page /api/profile/attempts will return
+MAX_ATTEMPTS_PAGE = 50
+
+# Top-level keys of the /api/quiz/submit response, selectable with ?fields=
+SUBMIT_RESPONSE_FIELDS = ('result_id', 'total_score', 'total_questions', 'percentage', 'domain_scores',
+                          'recommended_domain', 'category_breakdown', 'question_results',
+                          'ai_insights', 'insights_status')
+
+OOP_LANGUAGES = ['python', 'java', 'cpp', 'javascript', 'csharp', 'go', 'ruby']
+
+question_bank = QuestionBank(db.ingest_question_bank)
+seen_questions = SeenQuestions(db.get_seen_filter, db.save_seen_filter)
+
+def generate_pool_questions(difficulty, language):
+    """Refill source for the question pool (only real Gemini questions, never fallback)"""
+    # Refills have their own share of the RPM and never queue, so live requests keep the whole burst
+    questions = request_questions_from_gemini(difficulty, language, language.lower() in OOP_LANGUAGES,
+                                              max_wait=0, limiter=pool_rate_limiter)
+    # Banked off the request path, so pool draws already carry their bank ids
+    if QUESTION_BANK_ENABLED:
+        question_bank.attach(questions)
+    return questions
 
-def wait_for_rate_limit():
-    """Wait to respect gemini-2.0-flash-lite's 30 RPM rate limit"""
-    global last_api_call_time
-    current_time = time.time()
-    time_since_last = current_time - last_api_call_time
-    
-    if time_since_last < API_CALL_INTERVAL:
-        wait_time = API_CALL_INTERVAL - time_since_last
-        print(f"⏳ Rate limiting: waiting {wait_time:.1f}s...")
-        time.sleep(wait_time)
-    
-    last_api_call_time = time.time()
+question_pool = QuestionPool(generate_pool_questions)
+
+@app.before_request
+def start_background_workers():
+    """Start background workers on the first request (the pool refiller in one process per host)"""
+    if QUESTION_POOL_ENABLED:
+        question_pool.ensure_started()
 
 # ==================== AUTH MIDDLEWARE ====================
 
+# Verified tokens are cached by digest until shortly before they expire
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 4096))
+TOKEN_CACHE_SKEW = int(os.getenv('TOKEN_CACHE_SKEW', 30))
+verified_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=60)
+token_verify_stats = {'verifications': 0, 'verify_seconds': 0.0, 'saved_seconds': 0.0}
+token_verify_lock = threading.Lock()
+
 def verify_clerk_token():
     """Verify Clerk authentication token from header"""
     auth_header = request.headers.get('Authorization')
@@ -51,21 +123,51 @@ def verify_clerk_token():
         return None
     
     token = auth_header.split('Bearer ')[1]
+    token_digest = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    clerk_user_id = verified_token_cache.get(token_digest)
+    if clerk_user_id:
+        with token_verify_lock:
+            if token_verify_stats['verifications']:
+                token_verify_stats['saved_seconds'] += (
+                    token_verify_stats['verify_seconds'] / token_verify_stats['verifications']
+                )
+        return clerk_user_id
+    
+    started = time.perf_counter()
+    payload = decode_clerk_token(token)
+    elapsed = time.perf_counter() - started
+    
+    with token_verify_lock:
+        token_verify_stats['verifications'] += 1
+        token_verify_stats['verify_seconds'] += elapsed
     
+    if not payload or not payload.get('sub'):
+        return None
+    
+    # Only cache until exp minus a skew margin; tokens without exp are not cached
+    exp = payload.get('exp')
+    if exp:
+        ttl = exp - time.time() - TOKEN_CACHE_SKEW
+        if ttl > 0:
+            verified_token_cache.set(token_digest, payload['sub'], ttl=ttl)
+    
+    return payload['sub']
+
+def decode_clerk_token(token):
+    """Decode a Clerk JWT and return its payload, or None if verification fails"""
     if os.getenv('FLASK_ENV') == 'development':
         try:
             import jwt
             decoded = jwt.decode(token, options={"verify_signature": False})
-            clerk_user_id = decoded.get('sub')
-            if clerk_user_id:
-                return clerk_user_id
+            if decoded.get('sub'):
+                return decoded
         except Exception as e:
             print(f"Token decode error: {e}")
             return None
     
     try:
         import jwt
-        import requests
         from urllib.parse import urlparse
         
         try:
@@ -79,26 +181,11 @@ def verify_clerk_token():
         except:
             clerk_domain = os.getenv('CLERK_FRONTEND_API', 'clerk.example.com')
         
-        jwks_url = f"https://{clerk_domain}/.well-known/jwks.json"
-        jwks_response = requests.get(jwks_url, timeout=5)
-        jwks = jwks_response.json()
-        
         unverified_header = jwt.get_unverified_header(token)
-        rsa_key = {}
-        
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"]
-                }
+        rsa_key = jwks_cache.get_key(clerk_domain, unverified_header.get('kid'))
         
         if rsa_key:
-            payload = jwt.decode(token, rsa_key, algorithms=["RS256"])
-            return payload.get('sub')
+            return jwt.decode(token, rsa_key, algorithms=["RS256"])
         
     except Exception as e:
         print(f"Token verification error: {e}")
@@ -106,6 +193,16 @@ def verify_clerk_token():
     
     return None
 
+def token_cache_metrics():
+    """Hit rate of the verified-token cache and verification time it saved"""
+    stats = verified_token_cache.stats()
+    with token_verify_lock:
+        verifications = token_verify_stats['verifications']
+        stats['verifications'] = verifications
+        stats['avg_verify_ms'] = round(token_verify_stats['verify_seconds'] / verifications * 1000, 3) if verifications else 0
+        stats['saved_seconds'] = round(token_verify_stats['saved_seconds'], 3)
+    return stats
+
 def require_auth(f):
     """Decorator to require authentication"""
     from functools import wraps
@@ -115,6 +212,8 @@ def require_auth(f):
         if not clerk_id:
             return jsonify({'error': 'Not authenticated'}), 401
         request.clerk_user_id = clerk_id
+        # Resolve the user row once per request (served from the user cache when hot)
+        request.current_user = User.get_by_clerk_id(clerk_id)
         return f(*args, **kwargs)
     return decorated_function
 
@@ -145,7 +244,7 @@ def sync_user():
 @require_auth
 def get_current_user():
     """Get current authenticated user"""
-    user = User.get_by_clerk_id(request.clerk_user_id)
+    user = request.current_user
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -153,97 +252,395 @@ def get_current_user():
 
 # ==================== QUIZ ROUTES ====================
 
-@app.route('/api/quiz/generate', methods=['POST'])
-@require_auth
-def generate_quiz():
-    """Generate quiz - SINGLE API call optimized for 2 RPM limit"""
-    data = request.json or {}
-    difficulty = data.get('difficulty', 'moderate')
-    language = data.get('language', 'python')
-
+class QuizBuildError(Exception):
+    """Quiz could not be built; carries the HTTP status to report"""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+def question_row(quiz_id, q):
+    """quiz_questions row for a generated question (a bank reference when it has one)"""
+    if q.get('bank_id'):
+        row = {'bank_id': q['bank_id']}
+    else:
+        row = {
+            'question': q['question'],
+            'options': json.dumps(q['options']),
+            'correct_answer': q['correct_answer'],
+            'category': q['category'],
+            'explanation': q.get('explanation', '')
+        }
+    if quiz_id:
+        row['quiz_id'] = quiz_id
+    # Questions carry a pre-assigned UUID so they can be returned before/without a read-back
+    if q.get('db_id'):
+        row['id'] = q['db_id']
+    return row
+
+def build_quiz(user, difficulty, language, timer=None):
+    """Generate, store and return a quiz for a user (raises QuizBuildError)"""
     print(f"\n{'='*60}")
     print(f"🎯 Generating quiz: {difficulty} difficulty, {language}")
     print(f"{'='*60}\n")
 
-    try:
-        oop_languages = ['python', 'java', 'cpp', 'javascript', 'csharp', 'go', 'ruby']
-        supports_oop = language.lower() in oop_languages
+    timer = timer or StageTimer()
+    supports_oop = language.lower() in OOP_LANGUAGES
+
+    print(f"✓ User: {user['name']} (ID: {user['id']})")
+
+    # Serve from the pre-generated pool (skipping questions this user was already served),
+    # fall back to live generation
+    all_questions = None
+    skip = timer.run('seen', seen_questions.skipper, user['id'])
+    if QUESTION_POOL_ENABLED:
+        all_questions = timer.run('pool', question_pool.draw, difficulty, language, skip=skip)
+    if all_questions:
+        print(f"⚡ Served {len(all_questions)} questions from the pool")
+        quiz_id = store_pooled_quiz(user, difficulty, language, supports_oop, all_questions, timer)
+    else:
+        if QUESTION_POOL_ENABLED:
+            question_pool.register(difficulty, language)
+        all_questions, quiz_id = generate_and_store_quiz(user, difficulty, language, supports_oop, timer, skip)
+
+    # Format questions for response (insertion order)
+    questions_with_db_ids = []
+    for q in all_questions:
+        questions_with_db_ids.append({
+            'id': q['db_id'],  # UUID stored in Supabase
+            'question': q['question'],
+            'options': q['options'],
+            'correct_answer': q['correct_answer'],
+            'category': q['category'],
+            'explanation': q.get('explanation', '')
+        })
 
-        user = User.get_by_clerk_id(request.clerk_user_id)
-        if not user:
-            return jsonify({'error': 'User not found. Please try logging in again.'}), 404
+    answer_keys.remember(quiz_id, questions_with_db_ids)
+    seen_questions.mark(user['id'], all_questions)
 
-        print(f"✓ User: {user['name']} (ID: {user['id']})")
+    timings = quiz_pipeline.record(timer)
+    print(f"\n✅ Quiz {quiz_id} created with {len(questions_with_db_ids)} questions")
+    print(f"   Stages: {timings['stages']} | total {timings['wall']}s, {timings['saved']}s saved by overlap")
+    print(f"   Sample question IDs: {[str(q['id'])[:8] for q in questions_with_db_ids[:5]]}")
+    print(f"{'='*60}\n")
 
-        # Generate ALL 30 questions in ONE call
-        all_questions = generate_all_questions_optimized(difficulty, language, supports_oop)
+    return {
+        'quiz_id': quiz_id,
+        'questions': questions_with_db_ids,
+        'total': len(questions_with_db_ids)
+    }
+
+def store_pooled_quiz(user, difficulty, language, supports_oop, all_questions, timer):
+    """Pool hit: session + questions in one transaction and one round trip"""
+    # No-op unless banking failed when these questions entered the pool
+    if QUESTION_BANK_ENABLED:
+        timer.run('bank', question_bank.attach, all_questions)
+        all_questions = replace_bank_duplicates(all_questions, language, difficulty)
+
+    # Pre-assign question UUIDs so the response needs no read-back
+    for q in all_questions:
+        q['db_id'] = str(uuid.uuid4())
+
+    quiz_id = timer.run('store', db.create_quiz_with_questions,
+        user_id=user['id'],
+        difficulty=difficulty,
+        language=language,
+        supports_oop=supports_oop,
+        questions=[question_row(None, q) for q in all_questions]
+    )
+
+    if not quiz_id:
+        raise QuizBuildError('Failed to store quiz')
+    return quiz_id
+
+def generate_and_store_quiz(user, difficulty, language, supports_oop, timer, skip=None):
+    """
+    Live generation: the session insert doesn't depend on Gemini's output, so it
+    runs on the pipeline pool while the questions are generated. A session whose
+    generation fails is cancelled if the insert hasn't started, deleted otherwise.
+    `skip` keeps questions the user has already seen out of fallback draws.
+    Returns (questions, quiz_id).
+    """
+    session_future = quiz_pipeline.submit(timer, 'session', db.create_quiz_session,
+                                          user_id=user['id'],
+                                          difficulty=difficulty,
+                                          language=language,
+                                          supports_oop=supports_oop)
+    quiz_id = None
+    try:
+        all_questions = timer.run('generate', generate_all_questions_optimized, difficulty, language, supports_oop,
+                                  skip=skip)
 
         if len(all_questions) < 20:
             print(f"❌ Only generated {len(all_questions)} questions, need at least 20")
-            return jsonify({'error': 'Failed to generate sufficient questions. Please try again in 30 seconds.'}), 500
-
-        # Create quiz session in Supabase
-        quiz_session = db.create_quiz_session(
-            user_id=user['id'],
-            difficulty=difficulty,
-            language=language,
-            supports_oop=supports_oop
-        )
+            raise QuizBuildError('Failed to generate sufficient questions. Please try again in 30 seconds.')
 
+        if QUESTION_BANK_ENABLED:
+            timer.run('bank', question_bank.attach, all_questions)
+            all_questions = replace_bank_duplicates(all_questions, language, difficulty, skip)
+
+        # Pre-assign question UUIDs so the response needs no read-back
+        for q in all_questions:
+            q['db_id'] = str(uuid.uuid4())
+
+        quiz_session = session_future.result()
         if not quiz_session:
-            return jsonify({'error': 'Failed to create quiz session'}), 500
+            # Session insert failed; the transactional path creates both in one go
+            quiz_id = timer.run('store', db.create_quiz_with_questions,
+                user_id=user['id'],
+                difficulty=difficulty,
+                language=language,
+                supports_oop=supports_oop,
+                questions=[question_row(None, q) for q in all_questions]
+            )
+            if not quiz_id:
+                raise QuizBuildError('Failed to store quiz')
+            return all_questions, quiz_id
 
         quiz_id = quiz_session['id']
+        if not timer.run('store', db.add_quiz_questions_bulk, [question_row(quiz_id, q) for q in all_questions]):
+            raise QuizBuildError('Failed to store quiz questions')
+        return all_questions, quiz_id
+
+    except BaseException:
+        discard_quiz_session(session_future)
+        quiz_pipeline.record(timer, cleaned_up=True)
+        raise
+
+def discard_quiz_session(session_future):
+    """Cancel a pending session insert, or delete the session it created"""
+    if session_future.cancel():
+        print("🧹 Cancelled quiz session insert")
+        return
+    try:
+        quiz_session = session_future.result()
+    except Exception:
+        return
+    if quiz_session:
+        db.delete_quiz_session(quiz_session['id'])
+        print(f"🧹 Removed quiz session {quiz_session['id']} after failed generation")
 
-        # Prepare questions for bulk insert
-        questions_to_insert = []
-        for q in all_questions:
-            questions_to_insert.append({
-                'quiz_id': quiz_id,
-                'question': q['question'],
-                'options': json.dumps(q['options']),
-                'correct_answer': q['correct_answer'],
-                'category': q['category'],
-                'explanation': q.get('explanation', '')
-            })
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        # Bulk insert questions
-        success = db.add_quiz_questions_bulk(questions_to_insert)
-
-        if not success:
-            return jsonify({'error': 'Failed to store quiz questions'}), 500
-
-        # Retrieve stored questions with their database IDs
-        stored_questions = db.get_quiz_questions(quiz_id)
-
-        # Format questions for response
-        questions_with_db_ids = []
-        for sq in stored_questions:
-            questions_with_db_ids.append({
-                'id': sq['id'],  # UUID from Supabase
-                'question': sq['question'],
-                'options': json.loads(sq['options']),
-                'correct_answer': sq['correct_answer'],
-                'category': sq['category'],
-                'explanation': sq.get('explanation', '')
-            })
+@app.route('/api/quiz/generate', methods=['POST'])
+@require_auth
+def generate_quiz():
+    """
+    Generate a quiz. Questions come from the pre-generated pool when it has a
+    full unseen quiz, otherwise from Gemini: six parallel per-category shards
+    when six rate-limit slots are free right now, else one 30-question call,
+    with offline questions filling any gap. Synchronous by default (200); with
+    "async": true or ?mode=async the same work runs as a background job (202,
+    429 when the job queue is full).
+    """
+    data = request.json or {}
+    difficulty = data.get('difficulty', 'moderate')
+    language = data.get('language', 'python')
 
-        print(f"\n✅ Quiz {quiz_id} created with {len(questions_with_db_ids)} questions")
-        print(f"   Sample question IDs: {[str(q['id'])[:8] for q in questions_with_db_ids[:5]]}")
-        print(f"{'='*60}\n")
+    user = request.current_user
+    if not user:
+        return jsonify({'error': 'User not found. Please try logging in again.'}), 404
 
+    # Async mode: hand generation to the job executor and answer right away
+    if str(data.get('async', 'false')).lower() == 'true' or request.args.get('mode') == 'async':
+        try:
+            job = quiz_jobs.submit(user['id'], build_quiz, user, difficulty, language)
+        except JobQueueFull as e:
+            print(f"⚠️  Quiz job rejected: {e}")
+            response = jsonify({'error': 'Too many quiz generations in progress, please retry shortly',
+                                'scope': e.scope, 'limit': e.limit})
+            response.headers['Retry-After'] = '10'
+            return response, 429
+        print(f"📨 Queued quiz job {job.id} ({difficulty}, {language})")
         return jsonify({
-            'quiz_id': quiz_id,
-            'questions': questions_with_db_ids,
-            'total': len(questions_with_db_ids)
-        }), 200
+            'job_id': job.id,
+            'status': job.state,
+            'status_url': f"/api/quiz/jobs/{job.id}",
+            'events_url': f"/api/quiz/jobs/{job.id}/events"
+        }), 202
+
+    try:
+        timer = StageTimer()
+        response = jsonify(build_quiz(user, difficulty, language, timer))
+        response.headers['Server-Timing'] = timer.server_timing()
+        return response, 200
 
+    except QuizBuildError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': 'Failed to generate quiz', 'details': str(e)}), 500
 
+@app.route('/api/quiz/generate/stream', methods=['POST'])
+@require_auth
+def generate_quiz_stream():
+    """Generate quiz and stream each question over SSE as soon as Gemini completes it"""
+    data = request.json or {}
+    difficulty = data.get('difficulty', 'moderate')
+    language = data.get('language', 'python')
+
+    user = request.current_user
+    if not user:
+        return jsonify({'error': 'User not found. Please try logging in again.'}), 404
+
+    supports_oop = language.lower() in OOP_LANGUAGES
+
+    # The session is created up front so questions can be stored as they arrive
+    quiz_session = db.create_quiz_session(
+        user_id=user['id'],
+        difficulty=difficulty,
+        language=language,
+        supports_oop=supports_oop
+    )
+
+    if not quiz_session:
+        return jsonify({'error': 'Failed to create quiz session'}), 500
+
+    quiz_id = quiz_session['id']
+
+    def stream():
+        started = time.time()
+        pending = []
+        streamed = []
+        served = []
+        served_bank_ids = set()
+        category_count = {}
+        sent = 0
+
+        def emit(q):
+            nonlocal sent
+            q_id = str(uuid.uuid4())
+            pending.append(question_row(quiz_id, dict(q, db_id=q_id)))
+            served.append(q)
+            category_count[q['category']] = category_count.get(q['category'], 0) + 1
+            sent += 1
+            if sent == 1:
+                print(f"⚡ First question streamed after {time.time() - started:.2f}s")
+            streamed.append({
+                'id': q_id,
+                'question': q['question'],
+                'options': q['options'],
+                'correct_answer': q['correct_answer'],
+                'category': q['category'],
+                'explanation': q.get('explanation', '')
+            })
+            return sse_event('question', streamed[-1])
+
+        def emit_batch(batch):
+            # Matched bank entries are served in their stored wording, so attach before sending
+            if QUESTION_BANK_ENABLED:
+                question_bank.attach(batch)
+                # A second copy of an entry is dropped; the fallback top-up below fills its category
+                duplicates = set(question_bank.duplicates(batch, served_bank_ids))
+                batch[:] = [q for index, q in enumerate(batch) if index not in duplicates]
+            for q in batch:
+                yield emit(q)
+            batch.clear()
+
+        def flush():
+            if pending and not db.add_quiz_questions_bulk(list(pending)):
+                raise QuizBuildError('Failed to store quiz questions')
+            pending.clear()
+
+        yield sse_event('session', {'quiz_id': quiz_id})
+
+        try:
+            ready = []
+            try:
+                for q in stream_questions_from_gemini(difficulty, language, supports_oop):
+                    if sent + len(ready) >= 30:
+                        break
+                    ready.append(q)
+                    # The first question goes out alone to keep time-to-first-question low
+                    if len(ready) >= (STREAM_BATCH_SIZE if sent else 1):
+                        yield from emit_batch(ready)
+                    if len(pending) >= STREAM_BATCH_SIZE:
+                        flush()
+            except QuizBuildError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Streaming generation stopped after {sent + len(ready)} questions: {e}")
+            yield from emit_batch(ready)
+
+            # Top up short categories with fallback questions
+            if sent < 30:
+                fallback = generate_quality_fallback(language, difficulty, seen_questions.skipper(user['id']))
+                for q in fallback:
+                    if sent < 30 and category_count.get(q['category'], 0) < 5:
+                        q['used'] = True
+                        yield emit(q)
+                # Gemini over-filling some categories can still leave us short
+                for q in fallback:
+                    if sent < 30 and not q.get('used'):
+                        yield emit(q)
+
+            flush()
+        except QuizBuildError as e:
+            yield sse_event('error', {'quiz_id': quiz_id, 'error': str(e)})
+            return
+        finally:
+            # Client went away mid-stream: keep what it already saw
+            if pending:
+                db.add_quiz_questions_bulk(list(pending))
+                pending.clear()
+            if served:
+                seen_questions.mark(user['id'], served)
+
+        answer_keys.remember(quiz_id, streamed)
+
+        print(f"✅ Quiz {quiz_id} streamed with {sent} questions in {time.time() - started:.2f}s")
+        yield sse_event('done', {'quiz_id': quiz_id, 'total': sent})
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def get_owned_job(job_id):
+    """Look up a quiz job that belongs to the current user"""
+    job = quiz_jobs.get(job_id)
+    if not job or not request.current_user or job.owner_id != request.current_user['id']:
+        return None
+    return job
+
+@app.route('/api/quiz/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_quiz_job(job_id):
+    """Poll the state of an async quiz generation job"""
+    job = get_owned_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/quiz/jobs/<job_id>/events', methods=['GET'])
+@require_auth
+def stream_quiz_job(job_id):
+    """Server-sent events for an async quiz generation job until it finishes"""
+    job = get_owned_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        version = -1
+        while True:
+            current = quiz_jobs.wait_for_change(job_id, version, timeout=15)
+            if current is None:
+                yield sse_event('failed', {'job_id': job_id, 'error': 'Job expired'})
+                return
+            if current.version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = current.version
+            yield sse_event(current.state, current.to_dict())
+            if current.done:
+                return
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/quiz/submit', methods=['POST'])
 @require_auth
 def submit_quiz():
@@ -267,14 +664,25 @@ def submit_quiz():
     print(f"   Normalized answers: {len(normalized_answers)} answers")
     print(f"   Sample answer keys: {list(normalized_answers.keys())[:5]}")
 
-    user = User.get_by_clerk_id(request.clerk_user_id)
+    user = request.current_user
     
     if not user:
         return jsonify({'error': 'User not found. Please try logging in again.'}), 404
     
     try:
-        result = evaluate_quiz_with_gemini(quiz_id, normalized_answers, user['id'])
-        return jsonify(result), 200
+        # The client already has question text and options; compact mode leaves them out
+        compact = str(data.get('compact', request.args.get('compact', 'false'))).lower() == 'true'
+        fields = resolve_fields(request.args.get('fields'), request.args.get('include'), SUBMIT_RESPONSE_FIELDS)
+    except FieldsetError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        # Deferred mode answers with scores right away; insights follow via /api/results/<result_id>
+        defer_insights = str(data.get('defer_insights', DEFER_INSIGHTS)).lower() == 'true'
+        result = evaluate_quiz_with_gemini(quiz_id, normalized_answers, user['id'],
+                                           defer_insights=defer_insights, user_name=user.get('name'),
+                                           compact=compact)
+        return jsonify(pick(result, fields)), 200
     except Exception as e:
         print(f"❌ Error evaluating quiz: {e}")
         import traceback
@@ -287,8 +695,16 @@ def submit_quiz():
 @require_auth
 def get_profile():
     """Get user profile"""
-    user = User.get_by_clerk_id(request.clerk_user_id)
-    user_data = User.get_profile(user['id'])
+    user = request.current_user
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    try:
+        # ?fields=user,stats ; ?include=ai_insights adds insights to recent_results
+        fields = resolve_fields(request.args.get('fields'), request.args.get('include'),
+                                PROFILE_FIELDS, HEAVY_FIELDS)
+    except FieldsetError as e:
+        return jsonify({'error': str(e)}), 400
+    user_data = User.get_profile(user['id'], fields=fields)
     return jsonify(user_data), 200
 
 @app.route('/api/profile/update', methods=['PUT'])
@@ -296,7 +712,9 @@ def get_profile():
 def update_profile():
     """Update user profile"""
     data = request.json
-    user = User.get_by_clerk_id(request.clerk_user_id)
+    user = request.current_user
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
     success = User.update_profile(user['id'], data)
     
     if success:
@@ -307,9 +725,24 @@ def update_profile():
 @require_auth
 def get_attempts():
     """Get quiz attempts"""
-    user = User.get_by_clerk_id(request.clerk_user_id)
-    attempts = User.get_attempts(user['id'])
-    return jsonify({'attempts': attempts}), 200
+    user = request.current_user
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_ATTEMPTS_PAGE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    try:
+        # ai_insights is only selected and parsed when requested (?include=ai_insights)
+        fields = resolve_fields(request.args.get('fields'), request.args.get('include'),
+                                ATTEMPT_FIELD_COLUMNS, HEAVY_FIELDS)
+    except FieldsetError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        page = User.get_attempts(user['id'], limit=limit, cursor=request.args.get('cursor'), fields=fields)
+    except CursorError:
+        return jsonify({'error': 'cursor must be a next_cursor value from a previous page'}), 400
+    return jsonify(page), 200
 
 # ==================== HEALTH CHECK ====================
 
@@ -322,16 +755,36 @@ def health_check():
         'timestamp': datetime.utcnow().isoformat()
     }), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Cache and performance counters for this worker process"""
+    return jsonify({
+        'pid': os.getpid(),
+        'jwks_cache': jwks_cache.stats(),
+        'token_cache': token_cache_metrics(),
+        'user_cache': db.user_cache.stats(),
+        'profile_cache': db.profile_cache.stats(),
+        'result_snapshots': result_snapshots.stats(),
+        'responses': response_layer.stats(),
+        'question_pool': question_pool.stats(),
+        'gemini_rate_limiter': gemini_rate_limiter.stats(),
+        'pool_rate_limiter': pool_rate_limiter.stats() if pool_rate_limiter else None,
+        'quiz_jobs': quiz_jobs.stats(),
+        'insights_cache': insights_cache.stats(),
+        'insights_jobs': insights_jobs.stats(),
+        'answer_keys': answer_keys.stats(),
+        'quiz_pipeline': quiz_pipeline.stats(),
+        'question_shards': sharded_generator.stats(),
+        'question_bank': question_bank.stats(),
+        'seen_questions': seen_questions.stats(),
+        'offline_bank': offline_bank.stats(),
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200
+
 # ==================== GEMINI AI FUNCTIONS ====================
 
-def generate_all_questions_optimized(difficulty, language, supports_oop):
-    """Generate all 30 questions in ONE call - optimized for gemini-2.0-flash-lite"""
-    
-    # Wait for rate limit
-    wait_for_rate_limit()
-    
-    model = genai.GenerativeModel('gemini-2.0-flash-lite')
-    
+def build_question_prompt(difficulty, language, supports_oop):
+    """Compact 30-question prompt optimized for flash-lite"""
     diff_map = {
         'easy': 'easy',
         'moderate': 'medium',
@@ -340,7 +793,6 @@ def generate_all_questions_optimized(difficulty, language, supports_oop):
     
     oop_text = "Include 2 OOP questions." if supports_oop else ""
     
-    # Compact prompt optimized for flash-lite
     prompt = f"""Generate exactly 30 {diff_map[difficulty]} difficulty MCQs for technical placement test.
 
 CATEGORIES (5 questions each):
@@ -366,95 +818,215 @@ Requirements:
 - NO markdown, NO explanations
 - Return pure JSON only"""
 
-    try:
-        print("🔄 Generating 30 questions with gemini-2.0-flash-lite...")
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.9,
-                top_p=0.95,
-                max_output_tokens=8192,
-            )
+    return prompt
+
+# What each category shard asks for
+SHARD_TOPICS = {
+    'os': 'Operating Systems: processes, memory, scheduling',
+    'dbms': 'Database Management: SQL, normalization, transactions',
+    'networks': 'Computer Networks: TCP/IP, protocols, routing',
+    'aptitude': 'Aptitude: logic, math, reasoning',
+    'verbal': 'Verbal: grammar, comprehension',
+    'programming': '{language} Programming: syntax, algorithms, data structures'
+}
+# 5 short questions fit comfortably; keeps each shard fast and untruncated
+SHARD_MAX_OUTPUT_TOKENS = int(os.getenv('SHARD_MAX_OUTPUT_TOKENS', 1536))
+
+def build_shard_prompt(difficulty, language, supports_oop, category, count):
+    """Prompt for `count` questions of a single category"""
+    diff_map = {
+        'easy': 'easy',
+        'moderate': 'medium',
+        'hard': 'hard'
+    }
+    
+    topic = SHARD_TOPICS[category].format(language=language)
+    oop_text = "Include 2 OOP questions." if supports_oop and category == 'programming' else ""
+    
+    return f"""Generate exactly {count} {diff_map[difficulty]} difficulty MCQs for technical placement test.
+
+TOPIC: {topic} {oop_text}
+
+Return ONLY valid JSON array:
+[
+  {{"question":"...","options":["...","...","...","..."],"correct_answer":0,"category":"{category}"}},
+  ...
+]
+
+Requirements:
+- Exactly 4 options per question
+- correct_answer must be 0, 1, 2, or 3
+- Keep questions concise (under 100 chars)
+- Keep options short (under 50 chars each)
+- NO markdown, NO explanations
+- Return pure JSON only"""
+
+def request_shard_from_gemini(difficulty, language, supports_oop, category, count):
+    """
+    Ask Gemini for `count` questions of one category and return the valid ones (raises on failure).
+    The slot was reserved with the rest of the round by reserve_shard_slots.
+    """
+    model = genai.GenerativeModel('gemini-2.0-flash-lite')
+    response = model.generate_content(
+        build_shard_prompt(difficulty, language, supports_oop, category, count),
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.9,
+            top_p=0.95,
+            max_output_tokens=SHARD_MAX_OUTPUT_TOKENS,
         )
+    )
+    
+    questions_data, skipped = parse_json_objects(response.text.strip())
+    if not questions_data:
+        raise ValueError(f"No question objects found in {category} shard")
+    
+    # The shard is about one category whatever label Gemini put on it
+    category_count = {}
+    valid_questions = [
+        format_question(dict(q, category=category), category_count, language)
+        for q in questions_data if validate_question_structure(q)
+    ]
+    print(f"   Shard {category}: {len(valid_questions)}/{count} valid ({skipped} unparseable)")
+    return valid_questions
+
+def request_questions_from_gemini(difficulty, language, supports_oop, max_wait=RATE_LIMIT_MAX_WAIT,
+                                  limiter=gemini_rate_limiter):
+    """Ask Gemini for 30 questions in ONE call and return the valid ones (raises on failure)"""
+    
+    # Wait for rate limit
+    wait_for_rate_limit(max_wait, limiter)
+    
+    model = genai.GenerativeModel('gemini-2.0-flash-lite')
+    
+    prompt = build_question_prompt(difficulty, language, supports_oop)
+
+    print("🔄 Generating 30 questions with gemini-2.0-flash-lite...")
+    
+    response = model.generate_content(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.9,
+            top_p=0.95,
+            max_output_tokens=8192,
+        )
+    )
+    
+    text = response.text.strip()
+    print(f"📦 Received {len(text)} chars")
+    
+    # Single-pass tolerant parse: strips fences, skips malformed objects, keeps the rest
+    questions_data, skipped = parse_json_objects(text)
+    if skipped:
+        print(f"🔧 Skipped {skipped} malformed objects, salvaged {len(questions_data)}")
+    
+    if not questions_data:
+        raise ValueError("No question objects found in response")
+    
+    # Validate and format
+    valid_questions = []
+    category_count = {}
+    
+    for idx, q in enumerate(questions_data):
+        if not validate_question_structure(q):
+            print(f"⚠️  Q{idx+1} invalid")
+            continue
         
-        text = response.text.strip()
-        print(f"📦 Received {len(text)} chars")
-        
-        # Clean JSON
-        text = text.replace('```json', '').replace('```', '').strip()
-        
-        # Try to fix truncated JSON
-        if not text.endswith(']'):
-            # Find last complete question
-            last_close_brace = text.rfind('}')
-            if last_close_brace > 0:
-                text = text[:last_close_brace+1] + ']'
-                print("🔧 Fixed truncated JSON")
-        
-        # Parse JSON
-        try:
-            questions_data = json.loads(text)
-        except json.JSONDecodeError as e:
-            print(f"⚠️  JSON error at char {e.pos}, attempting repair...")
-            # Try to salvage partial JSON
-            for i in range(len(text)-1, max(0, len(text)-500), -1):
-                try:
-                    test_text = text[:i]
-                    if test_text.endswith('}'):
-                        test_text += ']'
-                    elif test_text.endswith(','):
-                        test_text = test_text[:-1] + ']'
-                    questions_data = json.loads(test_text)
-                    print(f"✓ Repaired JSON (salvaged {len(questions_data)} questions)")
-                    break
-                except:
-                    continue
-            else:
-                raise
-        
-        if not isinstance(questions_data, list):
-            raise ValueError(f"Expected array, got {type(questions_data)}")
-        
-        # Validate and format
-        valid_questions = []
-        category_count = {}
-        
-        for idx, q in enumerate(questions_data):
-            if not validate_question_structure(q):
-                print(f"⚠️  Q{idx+1} invalid")
-                continue
-            
-            cat = q['category']
-            category_count[cat] = category_count.get(cat, 0) + 1
-            
-            valid_questions.append({
-                'id': f"{cat}_{category_count[cat]}",
-                'question': str(q['question']).strip(),
-                'options': [str(opt).strip() for opt in q['options'][:4]],
-                'correct_answer': int(q['correct_answer']),
-                'category': cat,
-                'explanation': ''
-            })
-        
-        print(f"✅ Generated {len(valid_questions)} valid questions")
-        print(f"   Distribution: {category_count}")
+        valid_questions.append(format_question(q, category_count, language))
+    
+    print(f"✅ Generated {len(valid_questions)} valid questions")
+    print(f"   Distribution: {category_count}")
+    
+    return valid_questions
+
+def format_question(q, category_count, language):
+    """
+    Normalize a validated Gemini question, numbering it within its category.
+    The category is mapped onto QUIZ_CATEGORIES; a label that matches none is
+    kept (normalized) rather than dropping the question.
+    """
+    cat = canonical_category(q['category'], language)
+    if cat is None:
+        # One odd label shouldn't cost the quiz a question and push it into the fallback
+        cat = normalize_category(q['category']).replace(' ', '_') or 'general'
+        print(f"⚠️  Unknown category {q['category']!r}, kept as {cat!r}")
+    category_count[cat] = category_count.get(cat, 0) + 1
+    
+    return {
+        'id': f"{cat}_{category_count[cat]}",
+        'question': str(q['question']).strip(),
+        'options': [str(opt).strip() for opt in q['options'][:4]],
+        'correct_answer': int(q['correct_answer']),
+        'category': cat,
+        'explanation': ''
+    }
+
+def stream_questions_from_gemini(difficulty, language, supports_oop, max_wait=RATE_LIMIT_MAX_WAIT):
+    """Yield each valid question as soon as its JSON object is complete in Gemini's streamed output"""
+    
+    wait_for_rate_limit(max_wait)
+    
+    model = genai.GenerativeModel('gemini-2.0-flash-lite')
+    prompt = build_question_prompt(difficulty, language, supports_oop)
+    
+    print("🔄 Streaming 30 questions from gemini-2.0-flash-lite...")
+    
+    response = model.generate_content(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.9,
+            top_p=0.95,
+            max_output_tokens=8192,
+        ),
+        stream=True
+    )
+    
+    parser = IncrementalObjectParser()
+    category_count = {}
+    
+    def completed_objects():
+        for chunk in response:
+            yield from parser.feed(chunk.text)
+        # Objects swallowed by a truncated or broken trailing object
+        yield from parser.finish()
+    
+    for q in completed_objects():
+        if not validate_question_structure(q):
+            print(f"⚠️  Streamed question invalid")
+            continue
+        yield format_question(q, category_count, language)
+    
+    print(f"✅ Streamed {sum(category_count.values())} valid questions ({parser.skipped} unparseable)")
+    print(f"   Distribution: {category_count}")
+
+def generate_all_questions_optimized(difficulty, language, supports_oop, skip=None):
+    """
+    Generate all 30 questions: one parallel call per category, or ONE call when sharding is off.
+    `skip` marks fallback questions the user has already seen.
+    """
+    if QUESTION_SHARDING_ENABLED:
+        questions = sharded_generator.generate(difficulty, language, supports_oop, skip=skip)
+        if questions is not None:
+            return questions
+        print("   No spare Gemini burst for parallel shards, using one call")
+    
+    try:
+        valid_questions = request_questions_from_gemini(difficulty, language, supports_oop)
         
         # Return what we have, fill rest with fallback if needed
         if len(valid_questions) >= 25:
             if len(valid_questions) < 30:
                 print(f"   Adding {30-len(valid_questions)} fallback questions")
-                fallback = generate_quality_fallback(language)
+                fallback = generate_quality_fallback(language, difficulty, skip)
                 return (valid_questions + fallback)[:30]
             return valid_questions[:30]
         else:
             print(f"⚠️  Only {len(valid_questions)} questions, using all fallback")
-            return generate_quality_fallback(language)
+            return generate_quality_fallback(language, difficulty, skip)
             
     except Exception as e:
         print(f"❌ Generation failed: {e}")
         print("   Using fallback questions")
-        return generate_quality_fallback(language)
+        return generate_quality_fallback(language, difficulty, skip)
 
 def validate_question_structure(q):
     """Validate question has required fields and correct structure"""
@@ -476,138 +1048,46 @@ def validate_question_structure(q):
     except:
         return False
 
-def generate_quality_fallback(language):
-    """Generate high-quality fallback questions when API fails"""
-    
-    questions = []
-    
-    # OS Questions
-    os_questions = [
-        ("What is the primary purpose of an operating system?", 
-         ["Manage hardware resources", "Edit documents", "Browse internet", "Play games"], 0),
-        ("Which scheduling algorithm can cause starvation?",
-         ["Priority Scheduling", "Round Robin", "FCFS", "SJF with aging"], 0),
-        ("What is a deadlock in OS?",
-         ["Circular wait for resources", "Process termination", "Memory leak", "CPU idle state"], 0),
-        ("Virtual memory uses which storage?",
-         ["Hard disk", "RAM only", "Cache only", "Registers"], 0),
-        ("What is a critical section?",
-         ["Code accessing shared resources", "Error handling code", "Main function", "Loop structure"], 0),
-    ]
-    
-    for i, (q, opts, ans) in enumerate(os_questions):
-        questions.append({
-            'id': f'os_{i}', 'question': q, 'options': opts,
-            'correct_answer': ans, 'category': 'os', 'explanation': ''
-        })
-    
-    # DBMS Questions
-    dbms_questions = [
-        ("What is normalization in databases?",
-         ["Removing redundancy", "Adding indexes", "Backing up data", "Encrypting data"], 0),
-        ("Which SQL clause filters grouped data?",
-         ["HAVING", "WHERE", "GROUP BY", "ORDER BY"], 0),
-        ("ACID properties ensure what?",
-         ["Transaction reliability", "Fast queries", "Data encryption", "User authentication"], 0),
-        ("What is a foreign key?",
-         ["References primary key of another table", "Primary key", "Unique constraint", "Index"], 0),
-        ("Which JOIN returns all rows from both tables?",
-         ["FULL OUTER JOIN", "INNER JOIN", "LEFT JOIN", "RIGHT JOIN"], 0),
-    ]
-    
-    for i, (q, opts, ans) in enumerate(dbms_questions):
-        questions.append({
-            'id': f'dbms_{i}', 'question': q, 'options': opts,
-            'correct_answer': ans, 'category': 'dbms', 'explanation': ''
-        })
-    
-    # Networks Questions
-    net_questions = [
-        ("What layer is TCP in OSI model?",
-         ["Transport Layer", "Network Layer", "Application Layer", "Data Link Layer"], 0),
-        ("Default HTTP port number is?",
-         ["80", "443", "8080", "21"], 0),
-        ("What does DNS do?",
-         ["Converts domain names to IP", "Encrypts data", "Routes packets", "Assigns IP addresses"], 0),
-        ("Which protocol is connectionless?",
-         ["UDP", "TCP", "FTP", "HTTP"], 0),
-        ("What is subnet mask used for?",
-         ["Divide network into subnets", "Encrypt traffic", "Authenticate users", "Cache data"], 0),
-    ]
-    
-    for i, (q, opts, ans) in enumerate(net_questions):
-        questions.append({
-            'id': f'networks_{i}', 'question': q, 'options': opts,
-            'correct_answer': ans, 'category': 'networks', 'explanation': ''
-        })
-    
-    # Aptitude Questions
-    apt_questions = [
-        ("If 20% of 150 is X, then X = ?",
-         ["30", "25", "35", "40"], 0),
-        ("Next in series: 2, 6, 12, 20, ?",
-         ["30", "28", "32", "26"], 0),
-        ("A train 100m long crosses a pole in 10 sec. Speed?",
-         ["10 m/s", "100 m/s", "1 m/s", "50 m/s"], 0),
-        ("If A:B = 2:3 and B:C = 4:5, then A:C = ?",
-         ["8:15", "2:5", "3:5", "4:15"], 0),
-        ("Average of 5 numbers is 20. If one number is 30, average of rest?",
-         ["17.5", "20", "22.5", "15"], 0),
-    ]
-    
-    for i, (q, opts, ans) in enumerate(apt_questions):
-        questions.append({
-            'id': f'aptitude_{i}', 'question': q, 'options': opts,
-            'correct_answer': ans, 'category': 'aptitude', 'explanation': ''
-        })
-    
-    # Verbal Questions
-    verbal_questions = [
-        ("Choose correct: He ___ to school every day.",
-         ["goes", "go", "going", "gone"], 0),
-        ("Synonym of 'Abundant':",
-         ["Plentiful", "Scarce", "Limited", "Rare"], 0),
-        ("Antonym of 'Ancient':",
-         ["Modern", "Old", "Historic", "Traditional"], 0),
-        ("Identify error: 'She don't like coffee.'",
-         ["don't should be doesn't", "No error", "like should be likes", "coffee should be coffees"], 0),
-        ("'Break the ice' means:",
-         ["Start conversation", "Destroy something", "Cool down", "Make ice cubes"], 0),
-    ]
-    
-    for i, (q, opts, ans) in enumerate(verbal_questions):
-        questions.append({
-            'id': f'verbal_{i}', 'question': q, 'options': opts,
-            'correct_answer': ans, 'category': 'verbal', 'explanation': ''
-        })
-    
-    # Programming Questions
-    prog_questions = [
-        (f"What is the time complexity of binary search in {language}?",
-         ["O(log n)", "O(n)", "O(n²)", "O(1)"], 0),
-        (f"Which data structure uses LIFO?",
-         ["Stack", "Queue", "Array", "Tree"], 0),
-        (f"What does 'return' keyword do in {language}?",
-         ["Exits function with value", "Loops back", "Throws error", "Prints output"], 0),
-        (f"Array indexing in {language} starts from?",
-         ["0", "1", "-1", "Depends on declaration"], 0),
-        (f"What is recursion in {language}?",
-         ["Function calling itself", "Loop structure", "Variable declaration", "Error handling"], 0),
-    ]
-    
-    for i, (q, opts, ans) in enumerate(prog_questions):
-        questions.append({
-            'id': f'programming_{i}', 'question': q, 'options': opts,
-            'correct_answer': ans, 'category': 'programming', 'explanation': ''
-        })
-    
+def replace_bank_duplicates(questions, language, difficulty, skip=None):
+    """
+    Keep the first of several questions that resolved to the same bank entry and
+    replace the others with fallback questions of the same category (dropped if
+    the fallback has none left)
+    """
+    duplicates = question_bank.duplicates(questions)
+    if not duplicates:
+        return questions
+    print(f"♊ {len(duplicates)} questions matched a bank entry already in the quiz, replacing them")
+    fallback = generate_quality_fallback(language, difficulty, skip)
+    replaced = list(questions)
+    for index in duplicates:
+        q = questions[index]
+        replacement = next((f for f in fallback if f['category'] == q['category']), None)
+        if replacement is not None:
+            fallback.remove(replacement)
+            replacement = dict(replacement, id=q['id'])
+        replaced[index] = replacement
+    return [q for q in replaced if q is not None]
+
+def generate_quality_fallback(language, difficulty='moderate', skip=None):
+    """Random fallback quiz from the offline question bank when the API fails, avoiding `skip`ped questions"""
+    questions = offline_bank.draw(difficulty, language, skip=skip)
     print(f"📚 Using {len(questions)} fallback questions")
     return questions
 
-def evaluate_quiz_with_gemini(quiz_id, answers, user_id):
-    """Evaluate quiz with detailed question-by-question analysis"""
+sharded_generator = ShardedGenerator(request_shard_from_gemini, generate_quality_fallback, reserve_shard_slots)
+if QUESTION_SHARDING_ENABLED and gemini_rate_limiter.capacity < len(QUIZ_CATEGORIES):
+    print(f"⚠️  GEMINI_BURST={gemini_rate_limiter.capacity:g} is below {len(QUIZ_CATEGORIES)}: "
+          f"quizzes will never be sharded, every live quiz uses one call")
+
+def evaluate_quiz_with_gemini(quiz_id, answers, user_id, defer_insights=False, user_name=None, compact=False):
+    """
+    Evaluate quiz with detailed question-by-question analysis.
+    compact=True reports each question as {id, user_answer, correct_answer, is_correct} only.
+    """
     
-    questions = db.get_quiz_questions(quiz_id)
+    # Memory lookup for quizzes generated by this process, database read otherwise
+    questions = answer_keys.load(quiz_id, db.get_quiz_questions)
 
     print(f"\n{'='*60}")
     print(f"📊 Evaluating Quiz {quiz_id}")
@@ -615,21 +1095,13 @@ def evaluate_quiz_with_gemini(quiz_id, answers, user_id):
     print(f"Total questions: {len(questions)}")
     print(f"User answers received: {len(answers)}")
 
-    scores = {'programming': 0, 'analytics': 0, 'testing': 0, 'technical': 0}
     total_correct = 0
     category_correct = {}
     
     # NEW: Detailed question results
     question_results = []
 
-    for q in questions:
-        q_id = str(q['id'])
-        question_text = q['question']
-        options = json.loads(q['options']) if isinstance(q['options'], str) else q['options']
-        correct_answer = q['correct_answer']
-        category = q['category']
-        explanation = q.get('explanation', '')
-
+    for q_id, correct_answer, category, question_text, options, explanation in questions:
         user_answer = answers.get(q_id)
 
         if category not in category_correct:
@@ -639,43 +1111,38 @@ def evaluate_quiz_with_gemini(quiz_id, answers, user_id):
         is_correct = (user_answer == correct_answer)
 
         # Store detailed question result
-        question_results.append({
-            'id': q_id,
-            'question': question_text,
-            'options': options,
-            'user_answer': user_answer,
-            'correct_answer': correct_answer,
-            'is_correct': is_correct,
-            'category': category,
-            'explanation': explanation
-        })
+        if compact:
+            question_results.append({
+                'id': q_id,
+                'user_answer': user_answer,
+                'correct_answer': correct_answer,
+                'is_correct': is_correct
+            })
+        else:
+            question_results.append({
+                'id': q_id,
+                'question': question_text,
+                'options': options,
+                'user_answer': user_answer,
+                'correct_answer': correct_answer,
+                'is_correct': is_correct,
+                'category': category,
+                'explanation': explanation
+            })
 
         if is_correct:
             total_correct += 1
             category_correct[category]['correct'] += 1
 
-            # Scoring logic
-            if category in ['programming', 'python programming', 'python', 'python_programming']:
-                scores['programming'] += 3.5
-                scores['technical'] += 1
-            elif category in ['aptitude', 'verbal']:
-                scores['analytics'] += 3
-                scores['testing'] += 1.5
-            elif category in ['os', 'dbms', 'networks', 'network', 'computer networks', 'computer_networks']:
-                scores['technical'] += 2.5
-                scores['testing'] += 2
-                scores['programming'] += 1
+    # Domain scores from the category x domain weight matrix (scoring_weights.json)
+    scores = scoring.score({cat: counts['correct'] for cat, counts in category_correct.items()})
 
     print(f"\n✅ Correct answers: {total_correct}/{len(questions)}")
     print(f"📈 Category breakdown: {category_correct}")
     print(f"🎯 Domain scores: {scores}")
     print(f"{'='*60}\n")
 
-    max_score = max(scores.values()) if scores.values() else 0
-    recommended_domain = [k for k, v in scores.items() if v == max_score][0] if max_score > 0 else 'programming'
-
-    # Generate comprehensive insights with URLs
-    insights = generate_comprehensive_insights(scores, total_correct, recommended_domain, category_correct)
+    recommended_domain = scoring.recommend(scores)
 
     domain_names = {
         'programming': 'Programmer/Developer',
@@ -684,8 +1151,7 @@ def evaluate_quiz_with_gemini(quiz_id, answers, user_id):
         'technical': 'Technical Support/Engineering'
     }
 
-    # Save result to Supabase
-    result = db.save_result(
+    result_kwargs = dict(
         user_id=user_id,
         quiz_id=quiz_id,
         total_score=total_correct,
@@ -693,9 +1159,42 @@ def evaluate_quiz_with_gemini(quiz_id, answers, user_id):
         analytics_score=scores['analytics'],
         testing_score=scores['testing'],
         recommended_domain=recommended_domain,
-        ai_insights=json.dumps(insights)
+        answers=answers
     )
 
+    insights = None
+    insights_status = 'ready'
+    result = None
+
+    if defer_insights:
+        # Store the scores now and let a background worker attach the insights
+        result = db.save_result(ai_insights=None, insights_status='pending', **result_kwargs)
+        if result:
+            try:
+                insights_jobs.submit(
+                    user_id, fill_deferred_insights,
+                    result['id'], scores, total_correct, recommended_domain, category_correct
+                )
+                insights_status = 'pending'
+            except JobQueueFull as e:
+                # Worker backlog is full; generate them inline below and attach them to the stored row
+                print(f"⚠️  Deferred insights not queued ({e}), generating inline")
+
+    if insights_status != 'pending':
+        # Generate comprehensive insights with URLs
+        insights = generate_comprehensive_insights(scores, total_correct, recommended_domain, category_correct)
+
+        if result:
+            # Already stored as pending above
+            result = db.update_result_insights(result['id'], json.dumps(insights)) or result
+        else:
+            # Save result to Supabase
+            result = db.save_result(ai_insights=json.dumps(insights), **result_kwargs)
+
+        if result:
+            # Shared links are served from this snapshot without touching Supabase
+            result_snapshots.put(result['id'], shared_result_document(result, user_name, len(questions)))
+
     result_id = result['id'] if result else None
 
     return {
@@ -707,13 +1206,69 @@ def evaluate_quiz_with_gemini(quiz_id, answers, user_id):
         'recommended_domain': domain_names.get(recommended_domain, recommended_domain),
         'category_breakdown': category_correct,
         'question_results': question_results,  # NEW: Detailed results
-        'ai_insights': insights
+        'ai_insights': insights,
+        'insights_status': insights_status
     }
 
+def fill_deferred_insights(result_id, scores, total_correct, domain, category_correct):
+    """Background job: generate insights for a stored result and attach them"""
+    try:
+        insights = generate_comprehensive_insights(scores, total_correct, domain, category_correct)
+    except Exception as e:
+        print(f"⚠️  Deferred insights failed for result {result_id} ({e}), using fallback")
+        insights = get_fallback_insights_with_urls(domain, total_correct)
+
+    for attempt in range(INSIGHTS_WRITE_RETRIES):
+        if attempt:
+            time.sleep(2 ** (attempt - 1))
+        if db.update_result_insights(result_id, json.dumps(insights)):
+            print(f"✓ Deferred insights attached to result {result_id}")
+            return {'result_id': result_id}
+        print(f"⚠️  Storing insights for result {result_id} failed (attempt {attempt + 1}/{INSIGHTS_WRITE_RETRIES})")
+
+    # Give polling clients a terminal state; if even this write fails, the pending timeout takes over
+    db.update_result_insights(result_id, None, insights_status='failed', only_pending=True)
+    raise RuntimeError(f"Failed to store insights for result {result_id}")
+
+def recover_stale_insights(result):
+    """Attach fallback insights to a result whose deferred job was lost; returns the updated row"""
+    completed_at = result.get('completed_at')
+    try:
+        completed = datetime.fromisoformat(completed_at)
+    except (TypeError, ValueError):
+        return result
+    if completed.tzinfo:
+        completed = completed.astimezone(timezone.utc).replace(tzinfo=None)
+    if (datetime.utcnow() - completed).total_seconds() < INSIGHTS_PENDING_TIMEOUT:
+        return result
+
+    insights = get_fallback_insights_with_urls(result['recommended_domain'], result['total_score'])
+    row = db.update_result_insights(result['id'], json.dumps(insights), only_pending=True)
+    if row:
+        print(f"⚠️  Insights for result {result['id']} were pending for over {INSIGHTS_PENDING_TIMEOUT}s, "
+              f"attached fallback insights")
+        return row
+    # Someone else finished it in the meantime
+    return db.get_result(result['id']) or result
+
 def generate_comprehensive_insights(scores, total_correct, domain, category_correct):
     """Generate comprehensive career insights with URLs for all sections"""
-    
-    wait_for_rate_limit()
+    try:
+        if INSIGHTS_CACHE_ENABLED:
+            # Similar performances share insights; skips the Gemini call and rate-limit wait
+            signature = performance_signature(domain, total_correct, category_correct)
+            return insights_cache.get_or_generate(
+                signature,
+                lambda: request_insights_from_gemini(scores, total_correct, domain, category_correct)
+            )
+        return request_insights_from_gemini(scores, total_correct, domain, category_correct)
+        
+    except Exception as e:
+        print(f"⚠️  Insights fallback: {e}")
+        return get_fallback_insights_with_urls(domain, total_correct)
+
+def request_insights_from_gemini(scores, total_correct, domain, category_correct):
+    """Ask Gemini for career insights with URLs (raises on failure)"""
     
     model = genai.GenerativeModel('gemini-2.0-flash-lite')
     
@@ -819,34 +1374,31 @@ Return valid JSON with these sections:
 
 Make URLs relevant to {domain} domain. Use real platforms that exist."""
 
-    try:
-        print("🔄 Generating comprehensive insights with URLs...")
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.8,
-                max_output_tokens=4096,  # Increased for URLs
-            )
+    wait_for_rate_limit()
+    
+    print("🔄 Generating comprehensive insights with URLs...")
+    response = model.generate_content(
+        prompt,
+        generation_config=genai.types.GenerationConfig(
+            temperature=0.8,
+            max_output_tokens=4096,  # Increased for URLs
         )
-        
-        text = response.text.strip().replace('```json', '').replace('```', '').strip()
-        insights = json.loads(text)
-        
-        # Validate that URLs are included
-        has_urls = False
-        if insights.get('career_paths'):
-            has_urls = any(path.get('learn_more_url') for path in insights['career_paths'])
-        
-        if not has_urls:
-            print("⚠️  No URLs in response, adding fallback URLs...")
-            insights = add_fallback_urls(insights, domain)
-        
-        print("✓ Comprehensive insights with URLs generated")
-        return insights
-        
-    except Exception as e:
-        print(f"⚠️  Insights fallback: {e}")
-        return get_fallback_insights_with_urls(domain, total_correct)
+    )
+    
+    text = response.text.strip().replace('```json', '').replace('```', '').strip()
+    insights = json.loads(text)
+    
+    # Validate that URLs are included
+    has_urls = False
+    if insights.get('career_paths'):
+        has_urls = any(path.get('learn_more_url') for path in insights['career_paths'])
+    
+    if not has_urls:
+        print("⚠️  No URLs in response, adding fallback URLs...")
+        insights = add_fallback_urls(insights, domain)
+    
+    print("✓ Comprehensive insights with URLs generated")
+    return insights
 
 def add_fallback_urls(insights, domain):
     """Add fallback URLs if Gemini didn't provide them"""
@@ -1055,45 +1607,46 @@ def get_fallback_insights_with_urls(domain, score):
 
 @app.route('/api/results/<result_id>', methods=['GET'])
 def get_result_details(result_id):
-    """Get detailed results for sharing - public endpoint"""
+    """Get detailed results for sharing - public endpoint (served from an immutable snapshot)"""
     try:
-        result = db.get_result_by_id(result_id)
+        snapshot = result_snapshots.get(result_id)
         
-        if not result:
+        if not snapshot:
             return jsonify({'error': 'Result not found'}), 404
         
-        # Get user info
-        user = User.get_by_id(result['user_id'])
-        
-        # Get quiz questions for detailed breakdown
-        quiz_id = result['quiz_id']
-        questions = db.get_quiz_questions(quiz_id)
-        
-        # Parse AI insights
-        ai_insights = json.loads(result['ai_insights']) if result.get('ai_insights') else None
-        
-        return jsonify({
-            'result_id': result['id'],
-            'user_name': user['name'] if user else 'Anonymous',
-            'quiz_id': quiz_id,
-            'total_score': result['total_score'],
-            'total_questions': len(questions),
-            'percentage': round((result['total_score'] / len(questions)) * 100, 2) if questions else 0,
-            'domain_scores': {
-                'programming': result['programming_score'],
-                'analytics': result['analytics_score'],
-                'testing': result['testing_score'],
-                'technical': result.get('technical_score', 0)
-            },
-            'recommended_domain': result['recommended_domain'],
-            'ai_insights': ai_insights,
-            'created_at': result['created_at']
-        }), 200
+        response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        if snapshot.final:
+            response.headers['Cache-Control'] = f'public, max-age={RESULT_SNAPSHOT_MAX_AGE}'
+        else:
+            # Insights are still being generated, always revalidate
+            response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
         
     except Exception as e:
         print(f"❌ Error fetching result: {e}")
         return jsonify({'error': 'Failed to fetch result'}), 500
 
+def build_shared_result(result_id):
+    """Assemble the public result document from Supabase (snapshot miss)"""
+    result, user_name = db.get_result_with_user_name(result_id)
+    if not result:
+        return None
+    if result.get('insights_status') == 'pending':
+        # Nothing else will finish a result whose job died with its worker
+        result = recover_stale_insights(result)
+    
+    # Answer key length if this worker generated the quiz, otherwise a count query
+    key = answer_keys.peek(result['quiz_id'])
+    total_questions = len(key) if key else db.count_quiz_questions(result['quiz_id'])
+    return shared_result_document(result, user_name, total_questions)
+
+result_snapshots = ResultSnapshotStore(
+    build=build_shared_result,
+    load=db.get_result_snapshot,
+    save=db.save_result_snapshot
+)
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.run(debug=os.getenv('FLASK_ENV') == 'development', port=port, host='0.0.0.0') 
\ No newline at end of file
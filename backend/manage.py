@@ -0,0 +1,136 @@
+"""
+Maintenance commands
+
+Usage (from the backend directory):
+    python manage.py rescore [--batch-size 1000] [--dry-run]
+    python manage.py backfill-stats [--batch-size 500]
+    python manage.py build-offline-bank [--source offline_questions.json] [--output PATH]
+"""
+import sys
+import time
+import argparse
+
+
+def rescore(args):
+    """
+    Recompute domain scores of stored results with the current weight matrix.
+    Only results saved with their answers can be re-scored; older ones are
+    counted and reported as skipped.
+    """
+    from db import db
+    from scoring import scoring
+
+    print(f"🔁 Re-scoring results with weight matrix {scoring.version}")
+    started = time.time()
+    seen = rescored = missing_keys = 0
+    without_answers = db.count_results_without_answers()
+
+    for page in db.iter_results_with_answers(batch_size=args.batch_size):
+        seen += len(page)
+        keys = db.get_answer_keys({row['quiz_id'] for row in page})
+
+        submissions, result_ids = [], []
+        for row in page:
+            key = [(str(q['id']), q['correct_answer'], q['category']) for q in keys.get(row['quiz_id'], [])]
+            if not key:
+                missing_keys += 1
+                continue
+            submissions.append((key, row['answers'] or {}))
+            result_ids.append(row['id'])
+
+        if not submissions:
+            continue
+
+        # One matrix product for the whole page
+        scores = scoring.score_batch(scoring.correct_counts(submissions))
+        domains = scoring.recommend_batch(scores)
+        column = {d: i for i, d in enumerate(scoring.domains)}
+
+        updates = [{
+            'id': result_id,
+            'programming_score': float(scores[i, column['programming']]),
+            'analytics_score': float(scores[i, column['analytics']]),
+            'testing_score': float(scores[i, column['testing']]),
+            'recommended_domain': domains[i]
+        } for i, result_id in enumerate(result_ids)]
+
+        if not args.dry_run:
+            rescored += db.update_result_scores(updates)
+        else:
+            rescored += len(updates)
+        print(f"   ... {seen} results read, {rescored} re-scored")
+
+    elapsed = time.time() - started
+    action = 'would be re-scored' if args.dry_run else 're-scored'
+    print(f"✅ {rescored}/{seen + without_answers} results {action} in {elapsed:.1f}s")
+    if without_answers:
+        print(f"⚠️  {without_answers} results skipped: saved before answers were stored, their scores are unchanged")
+    if missing_keys:
+        print(f"⚠️  {missing_keys} results skipped: quiz questions no longer exist")
+    return 0
+
+
+def backfill_stats(args):
+    """Build user_stats rows for existing users (the triggers keep them current afterwards)"""
+    from db import db
+
+    print("📊 Backfilling user_stats...")
+    started = time.time()
+    last_id, pages = None, 0
+    while True:
+        last_id = db.backfill_user_stats(after=last_id, limit=args.batch_size)
+        if not last_id:
+            break
+        pages += 1
+        print(f"   ... page {pages} done (through user {last_id})")
+
+    print(f"✅ user_stats backfilled in {pages} pages, {time.time() - started:.1f}s")
+    return 0
+
+
+def build_offline_bank(args):
+    """Compile the offline question seed into the memory-mapped bank file"""
+    from offline_bank import build, OfflineBank, OfflineBankError
+
+    try:
+        summary = build(args.source, args.output)
+    except (OSError, ValueError, OfflineBankError) as e:
+        print(f"❌ Could not build offline bank: {e}")
+        return 1
+    print(f"✅ {summary['questions']} questions, {summary['keys']} index keys, {summary['bytes']} bytes -> {summary['path']}")
+    print(f"   Languages: {', '.join(summary['languages'])}")
+
+    bank = OfflineBank(args.output, args.source)
+    if not bank.open():
+        return 1
+    for difficulty in ('easy', 'moderate', 'hard'):
+        bank.draw(difficulty, 'python')
+    print(f"   Draw check: {bank.stats()['avg_draw_us']} µs per 30-question draw")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Career guidance backend maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rescore_parser = commands.add_parser('rescore', help='re-score stored results with the current weights')
+    rescore_parser.add_argument('--batch-size', type=int, default=1000, help='results per page')
+    rescore_parser.add_argument('--dry-run', action='store_true', help='compute scores without writing them')
+    rescore_parser.set_defaults(handler=rescore)
+
+    backfill_parser = commands.add_parser('backfill-stats', help='build user_stats rows from existing data')
+    backfill_parser.add_argument('--batch-size', type=int, default=500, help='users per page')
+    backfill_parser.set_defaults(handler=backfill_stats)
+
+    from offline_bank import OFFLINE_BANK_SOURCE, OFFLINE_BANK_PATH
+    bank_parser = commands.add_parser('build-offline-bank', help='compile the offline fallback questions')
+    bank_parser.add_argument('--source', default=OFFLINE_BANK_SOURCE, help='seed JSON file')
+    bank_parser.add_argument('--output', default=OFFLINE_BANK_PATH, help='bank file to write')
+    bank_parser.set_defaults(handler=build_offline_bank)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
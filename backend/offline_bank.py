@@ -0,0 +1,344 @@
+"""
+Offline question bank
+
+Quizzes fall back to stored questions when Gemini fails or comes back
+short. Those questions live in offline_questions.json (the seed), which is
+compiled into a compact, versioned binary file and memory-mapped read-only.
+Every worker on the host shares the same page-cache pages (and, with
+gunicorn --preload, the master's mapping itself). A draw reads a few index
+entries and records, picks questions at random for each category from the
+ones matching the difficulty and language, and shuffles their options, so
+no two fallback quizzes are the same.
+
+File layout (little-endian):
+    header   magic b'QBNK', format version, section offsets and counts
+    meta     JSON: category / difficulty / language tables, seed checksum
+    records  category, difficulty, language, correct option, blob offset, blob length
+    keys     category, difficulty, language, first index entry, entry count
+    index    u32 record numbers, grouped by key
+    blobs    UTF-8 question, options and explanation separated by 0x1f
+"""
+import os
+import json
+import mmap
+import random
+import struct
+import hashlib
+import itertools
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from categories import QUIZ_CATEGORIES
+from question_pool import QUESTIONS_PER_CATEGORY
+
+
+MAGIC = b'QBNK'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHH8I')
+RECORD = struct.Struct('<BBBBII')
+KEY = struct.Struct('<BBBxII')
+INDEX_ENTRY = struct.Struct('<I')
+SEPARATOR = '\x1f'
+# All 24 option orders; picking one is far cheaper than shuffling per question
+OPTION_ORDERS = tuple(itertools.permutations(range(4)))
+
+# Untagged questions suit every difficulty / language
+ANY = 'any'
+DIFFICULTIES = (ANY, 'easy', 'moderate', 'hard')
+
+OFFLINE_BANK_SOURCE = os.getenv(
+    'OFFLINE_BANK_SOURCE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offline_questions.json')
+)
+# Built from the seed on startup when missing or stale; workers on a host share it
+OFFLINE_BANK_PATH = os.getenv(
+    'OFFLINE_BANK_PATH',
+    os.path.join(tempfile.gettempdir(), 'career_guidance_offline_bank.qbk')
+)
+
+
+class OfflineBankError(ValueError):
+    """Malformed seed or bank file"""
+
+
+def _sha256(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _validate(n: int, q: Dict):
+    if q.get('category') not in QUIZ_CATEGORIES:
+        raise OfflineBankError(f"Question {n}: unknown category {q.get('category')!r}")
+    if q.get('difficulty', ANY) not in DIFFICULTIES:
+        raise OfflineBankError(f"Question {n}: unknown difficulty {q.get('difficulty')!r}")
+    options = q.get('options')
+    if not isinstance(options, list) or len(options) != 4 or not all(options) or not q.get('question'):
+        raise OfflineBankError(f"Question {n}: needs question text and 4 options")
+    if q.get('correct_answer') not in (0, 1, 2, 3):
+        raise OfflineBankError(f"Question {n}: correct_answer must be 0-3")
+    if any(SEPARATOR in str(text) for text in [q['question'], q.get('explanation', '')] + options):
+        raise OfflineBankError(f"Question {n}: text contains the field separator")
+
+
+def compile_bank(raw: bytes) -> Tuple[bytes, Dict]:
+    """Bank image for a seed document, plus a summary"""
+    questions = json.loads(raw)['questions']
+    for n, q in enumerate(questions):
+        _validate(n, q)
+
+    # Only programming questions are language-specific
+    languages = [ANY] + sorted({q['language'].lower() for q in questions
+                                if q['category'] == 'programming' and q.get('language', ANY) != ANY})
+    records, blobs, groups = bytearray(), bytearray(), {}
+    for n, q in enumerate(questions):
+        language = q.get('language', ANY).lower() if q['category'] == 'programming' else ANY
+        key = (QUIZ_CATEGORIES.index(q['category']), DIFFICULTIES.index(q.get('difficulty', ANY)),
+               languages.index(language))
+        blob = SEPARATOR.join([q['question']] + q['options'] + [q.get('explanation') or '']).encode('utf-8')
+        records += RECORD.pack(*key, q['correct_answer'], len(blobs), len(blob))
+        blobs += blob
+        groups.setdefault(key, []).append(n)
+
+    keys, index = bytearray(), bytearray()
+    for key in sorted(groups):
+        keys += KEY.pack(*key, len(index) // INDEX_ENTRY.size, len(groups[key]))
+        for record_no in groups[key]:
+            index += INDEX_ENTRY.pack(record_no)
+
+    meta = json.dumps({
+        'categories': list(QUIZ_CATEGORIES),
+        'difficulties': list(DIFFICULTIES),
+        'languages': languages,
+        'source_sha256': hashlib.sha256(raw).hexdigest(),
+        'built_at': datetime.utcnow().isoformat()
+    }).encode('utf-8')
+
+    meta_offset = HEADER.size
+    records_offset = meta_offset + len(meta)
+    keys_offset = records_offset + len(records)
+    index_offset = keys_offset + len(keys)
+    blobs_offset = index_offset + len(index)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, meta_offset, len(meta), records_offset, len(questions),
+                         keys_offset, len(groups), index_offset, blobs_offset)
+    image = bytes(header + meta + records + keys + index + blobs)
+    return image, {'questions': len(questions), 'keys': len(groups), 'languages': languages, 'bytes': len(image)}
+
+
+def build(source: str = OFFLINE_BANK_SOURCE, output: str = OFFLINE_BANK_PATH) -> Dict:
+    """Compile the seed into a bank file (written atomically); returns a summary"""
+    with open(source, 'rb') as f:
+        image, summary = compile_bank(f.read())
+
+    # Readers either see the old file or the complete new one
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(prefix='.offline_bank.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return dict(summary, path=output)
+
+
+class OfflineBank:
+    """
+    Read-only view of a bank file, memory-mapped.
+
+    If the file can't be built or mapped (read-only temp directory, corrupt
+    file), the seed is compiled into the same layout in memory instead, so
+    draws work either way; only the sharing between workers is lost.
+    """
+
+    def __init__(self, path: str = OFFLINE_BANK_PATH, source: str = OFFLINE_BANK_SOURCE):
+        self.path = path
+        self.source = source
+        # mmap of the bank file, or the compiled image (bytes) when loaded from the seed
+        self._buffer = None
+        self.mode: Optional[str] = None
+        self._meta: Dict = {}
+        self._keys: Dict[Tuple[int, int, int], Tuple[int, int]] = {}
+        self._sections: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {'draws': 0, 'questions_served': 0, 'repeats': 0, 'short_draws': 0, 'draw_seconds': 0.0,
+                       'builds': 0, 'load_errors': 0}
+
+    def open(self, required: bool = False) -> bool:
+        """
+        Map the bank file, (re)building it from the seed when missing, outdated
+        or stale; fall back to compiling the seed in memory. With `required`,
+        raises OfflineBankError when neither works instead of returning False.
+        """
+        with self._lock:
+            if self._buffer is not None:
+                return True
+            try:
+                if self._needs_build():
+                    summary = build(self.source, self.path)
+                    self._stats['builds'] += 1
+                    print(f"📚 Built offline question bank: {summary['questions']} questions, {summary['bytes']} bytes")
+                self._load(self._map(), 'mmap')
+                print(f"📚 Offline question bank mapped: {self.path}")
+                return True
+            except Exception as e:
+                self._stats['load_errors'] += 1
+                print(f"⚠️  Offline question bank file unusable ({e}), loading {self.source} into memory")
+
+            try:
+                with open(self.source, 'rb') as f:
+                    image, summary = compile_bank(f.read())
+                self._load(image, 'memory')
+                print(f"📚 Offline question bank loaded in memory: {summary['questions']} questions")
+                return True
+            except Exception as e:
+                self._stats['load_errors'] += 1
+                print(f"❌ Offline question bank unavailable: {e}")
+                if required:
+                    raise OfflineBankError(f"No usable offline question bank at {self.path} or {self.source}: {e}")
+                return False
+
+    def draw(self, difficulty: str, language: str, per_category: int = QUESTIONS_PER_CATEGORY,
+             skip: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """
+        Up to `per_category` random questions for each category, in
+        QUIZ_CATEGORIES order, with options shuffled. Questions tagged for
+        another difficulty or language are never drawn. Questions for which
+        `skip` returns True (already seen by the user) are only used when a
+        category has nothing else left: the offline set is small, and a
+        repeat beats a short quiz.
+        """
+        if self._buffer is None and not self.open():
+            return []
+        started = time.perf_counter()
+
+        difficulties = self._meta['difficulties']
+        languages = self._meta['languages']
+        diff_ids = {0, difficulties.index(difficulty)} if difficulty in difficulties else {0}
+        lang = str(language).lower()
+        lang_ids = {0, languages.index(lang)} if lang in languages else {0}
+
+        questions, skipped_count = [], 0
+        for cat_id, category in enumerate(self._meta['categories']):
+            spans = [self._keys[key] for key in
+                     ((cat_id, d, l) for d in sorted(diff_ids) for l in sorted(lang_ids)) if key in self._keys]
+            total = sum(count for _, count in spans)
+            picked, skipped = [], []
+            for pick in random.sample(range(total), total if skip else min(per_category, total)):
+                if len(picked) >= per_category:
+                    break
+                q = self._question(self._index_entry(spans, pick), category)
+                if skip and skip(q):
+                    skipped.append(q)
+                else:
+                    picked.append(q)
+            repeats = skipped[:per_category - len(picked)]
+            skipped_count += len(repeats)
+            picked += repeats
+            for n, q in enumerate(picked, start=1):
+                q['id'] = f"{category}_{n}"
+            questions.extend(picked)
+
+        with self._lock:
+            self._stats['draws'] += 1
+            self._stats['questions_served'] += len(questions)
+            self._stats['repeats'] += skipped_count
+            self._stats['short_draws'] += int(len(questions) < per_category * len(self._meta['categories']))
+            self._stats['draw_seconds'] += time.perf_counter() - started
+        return questions
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['avg_draw_us'] = round(stats['draw_seconds'] / stats['draws'] * 1e6, 1) if stats['draws'] else 0
+        stats['draw_seconds'] = round(stats['draw_seconds'], 6)
+        stats['mode'] = self.mode
+        if self._buffer is not None:
+            stats['format_version'] = FORMAT_VERSION
+            stats['bytes'] = len(self._buffer)
+            stats['questions'] = self._sections['record_count']
+            stats['languages'] = self._meta['languages']
+            stats['source_sha256'] = self._meta['source_sha256']
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    def _needs_build(self) -> bool:
+        """True when the file is missing, from another format version, or built from an older seed"""
+        source_sha = _sha256(self.source)
+        try:
+            with open(self.path, 'rb') as f:
+                head = f.read(HEADER.size)
+                magic, version, _, meta_offset, meta_length = HEADER.unpack(head)[:5]
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    return source_sha is not None
+                f.seek(meta_offset)
+                meta = json.loads(f.read(meta_length))
+        except (OSError, ValueError, struct.error):
+            if source_sha is None:
+                raise OfflineBankError(f"No bank file at {self.path} and no seed at {self.source}")
+            return True
+        # Without the seed, the existing file is the best we have
+        return source_sha is not None and meta.get('source_sha256') != source_sha
+
+    def _map(self) -> mmap.mmap:
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load(self, buffer, mode: str):
+        """Parse the header, meta and key table of a bank image"""
+        (magic, version, _, meta_offset, meta_length, records_offset, record_count,
+         keys_offset, key_count, index_offset, blobs_offset) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            if mode == 'mmap':
+                buffer.close()
+            raise OfflineBankError(f"{self.path} is not a version {FORMAT_VERSION} question bank")
+
+        keys = {}
+        for i in range(key_count):
+            cat, diff, lang, start, count = KEY.unpack_from(buffer, keys_offset + i * KEY.size)
+            keys[(cat, diff, lang)] = (start, count)
+
+        self._meta = json.loads(buffer[meta_offset:meta_offset + meta_length])
+        self._keys = keys
+        self._sections = {'records': records_offset, 'record_count': record_count,
+                          'index': index_offset, 'blobs': blobs_offset}
+        self._buffer = buffer
+        self.mode = mode
+
+    def _index_entry(self, spans: List[Tuple[int, int]], pick: int) -> int:
+        """Record number of the pick-th candidate across the matching keys"""
+        for start, count in spans:
+            if pick < count:
+                return INDEX_ENTRY.unpack_from(self._buffer, self._sections['index'] + (start + pick) * INDEX_ENTRY.size)[0]
+            pick -= count
+        raise IndexError(pick)
+
+    def _question(self, record_no: int, category: str) -> Dict:
+        _, _, _, correct, offset, length = RECORD.unpack_from(self._buffer, self._sections['records'] + record_no * RECORD.size)
+        start = self._sections['blobs'] + offset
+        fields = self._buffer[start:start + length].decode('utf-8').split(SEPARATOR)
+        options = fields[1:5]
+        order = OPTION_ORDERS[random.randrange(len(OPTION_ORDERS))]
+        return {
+            'question': fields[0],
+            'options': [options[i] for i in order],
+            'correct_answer': order.index(correct),
+            'category': category,
+            'explanation': fields[5],
+            # Kept out of the question bank, which would pin one option order
+            'offline': True
+        }
+
+
+# Create a global instance
+offline_bank = OfflineBank()
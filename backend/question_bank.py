@@ -0,0 +1,214 @@
+"""
+Global question bank with near-duplicate detection
+
+Every generated question is stored once in the question_bank table, keyed
+by a hash of its normalized content, and quiz_questions rows reference the
+bank entry instead of copying the text. Gemini rewords the same question
+often ("What is a deadlock?" / "What is deadlock?"), so at ingest each
+question also gets a MinHash signature over character shingles. Entries
+sharing an LSH band with it are candidates, and a candidate with the same
+category and correct answer whose signatures agree on at least
+QUESTION_BANK_NEAR_DUPLICATE of positions is reused instead of stored again.
+
+Both lookups are indexed (unique content_hash, primary key on the band
+table), so ingest cost doesn't grow with the size of the bank.
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from cache import TTLCache
+
+
+QUESTION_BANK_ENABLED = os.getenv('QUESTION_BANK_ENABLED', 'true').lower() == 'true'
+# Estimated Jaccard similarity above which two questions count as the same
+QUESTION_BANK_NEAR_DUPLICATE = float(os.getenv('QUESTION_BANK_NEAR_DUPLICATE', 0.8))
+# content_hash -> bank id for entries this process has seen recently
+QUESTION_BANK_CACHE_SIZE = int(os.getenv('QUESTION_BANK_CACHE_SIZE', 20000))
+QUESTION_BANK_CACHE_TTL = int(os.getenv('QUESTION_BANK_CACHE_TTL', 24 * 3600))
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+# 16 bands x 4 rows: pairs at 0.8 similarity share a band with probability > 0.999
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# Fixed seed: signatures are stored and compared across processes and restarts
+_rng = np.random.RandomState(1729)
+# Multiply-shift hash family: odd 64-bit multipliers, arithmetic wraps mod 2**64
+_PERM_A = _rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 1 << 62, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize_text(text) -> str:
+    """Lowercase and collapse whitespace; punctuation is kept ('O(n^2)' != 'O(n)')"""
+    return ' '.join(str(text).lower().split())
+
+
+def content_hash(question: str, options: List[str]) -> str:
+    """Identity of a question: its text and its set of options, in any order"""
+    parts = [normalize_text(question)] + sorted(normalize_text(opt) for opt in options)
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def shingles(question: str, options: List[str]) -> set:
+    text = ' '.join([normalize_text(question)] + sorted(normalize_text(opt) for opt in options))
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set: set) -> List[int]:
+    """NUM_PERM-value MinHash signature (32-bit values, fit a Postgres BIGINT)"""
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingle_set),
+        dtype=np.uint64, count=len(shingle_set)
+    )
+    # High 32 bits of (a * x + b) mod 2**64
+    with np.errstate(over='ignore'):
+        permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+    return [int(v) for v in permuted.min(axis=1)]
+
+
+def band_keys(signature: List[int]) -> List[int]:
+    """One signed 64-bit bucket key per LSH band"""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(repr((band, rows)).encode('utf-8'), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def bank_entry(q: Dict) -> Dict:
+    """question_bank row (plus LSH bands) for a validated question"""
+    options = q['options']
+    if isinstance(options, str):
+        options = json.loads(options)
+    signature = minhash(shingles(q['question'], options))
+    return {
+        'content_hash': content_hash(q['question'], options),
+        'category': q['category'],
+        'question': q['question'],
+        'options': options,
+        'correct_answer': q['correct_answer'],
+        'explanation': q.get('explanation') or '',
+        # Rewordings only merge when they agree on the right answer
+        'answer_key': normalize_text(options[q['correct_answer']]),
+        'minhash': signature,
+        'bands': band_keys(signature)
+    }
+
+
+class QuestionBank:
+    """
+    Attaches bank ids to questions.
+
+    `ingest(entries, threshold)` stores bank entries and returns one row per
+    entry, in order: {'bank_id', 'match', 'question', 'options',
+    'correct_answer', 'explanation'} where match is 'exact', 'near' or 'new'
+    and the content is the stored entry's.
+    """
+
+    def __init__(self, ingest: Callable[[List[Dict], float], Optional[List[Dict]]],
+                 threshold: float = QUESTION_BANK_NEAR_DUPLICATE,
+                 cache_size: int = QUESTION_BANK_CACHE_SIZE, cache_ttl: int = QUESTION_BANK_CACHE_TTL):
+        self.ingest = ingest
+        self.threshold = threshold
+        self._known = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._lock = threading.Lock()
+        self._stats = {'questions': 0, 'cached': 0, 'exact': 0, 'near': 0, 'new': 0, 'errors': 0,
+                       'quiz_duplicates': 0}
+
+    def attach(self, questions: List[Dict]) -> List[Dict]:
+        """
+        Set 'bank_id' (and 'content_hash') on each question that lacks one.
+
+        A question matched to an existing entry takes that entry's wording,
+        option order and answer, so what is served agrees with the answer key
+        read back from the bank. Questions keep no bank_id if the bank can't
+        be reached; callers then store their full text as before. Offline
+        fallback questions are never banked, so their shuffled option order
+        is what gets stored and served.
+        """
+        missing = [q for q in questions if not q.get('bank_id') and not q.get('offline')]
+        if not missing:
+            return questions
+
+        new_entries, new_questions = [], []
+        for q in missing:
+            entry = bank_entry(q)
+            q['content_hash'] = entry['content_hash']
+            stored = self._known.get(entry['content_hash'])
+            if stored:
+                self._apply(q, stored)
+            else:
+                new_entries.append(entry)
+                new_questions.append(q)
+        self._count('questions', len(missing))
+        self._count('cached', len(missing) - len(new_entries))
+
+        if new_entries:
+            rows = self.ingest(new_entries, self.threshold)
+            if not rows or len(rows) != len(new_entries):
+                self._count('errors')
+                return questions
+            for q, row in zip(new_questions, rows):
+                self._apply(q, row)
+                self._known.set(q['content_hash'], row)
+                self._count(row['match'])
+
+        return questions
+
+    def duplicates(self, questions: List[Dict], seen: Optional[set] = None) -> List[int]:
+        """
+        Indexes of questions whose bank_id already appeared earlier in the list
+        (or in `seen`). Near-duplicates from one Gemini batch resolve to the same
+        entry and would be served with identical wording. Kept ids are added
+        to `seen`, so it can carry across the batches of a stream.
+        """
+        seen = set() if seen is None else seen
+        indexes = []
+        for index, q in enumerate(questions):
+            bank_id = q.get('bank_id')
+            if not bank_id:
+                continue
+            if bank_id in seen:
+                indexes.append(index)
+            else:
+                seen.add(bank_id)
+        if indexes:
+            self._count('quiz_duplicates', len(indexes))
+        return indexes
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        ingested = stats['exact'] + stats['near'] + stats['new']
+        stats['duplicate_rate'] = round((stats['exact'] + stats['near'] + stats['cached']) / stats['questions'], 4) \
+            if stats['questions'] else 0
+        stats['near_duplicate_rate'] = round(stats['near'] / ingested, 4) if ingested else 0
+        stats['known_hashes'] = self._known.stats()
+        return stats
+
+    @staticmethod
+    def _apply(q: Dict, row: Dict):
+        q['bank_id'] = row['bank_id']
+        q['question'] = row['question']
+        q['options'] = row['options']
+        q['correct_answer'] = row['correct_answer']
+        if row.get('explanation'):
+            q['explanation'] = row['explanation']
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
@@ -0,0 +1,284 @@
+"""
+Pre-generated question pool per (difficulty, language)
+
+A background worker keeps validated Gemini questions topped up so that
+/api/quiz/generate can draw a full quiz from memory instead of waiting
+on a live generation call. Only one process per host runs the worker
+(whichever holds the refiller lock file), so background Gemini spend does
+not grow with the number of gunicorn workers.
+"""
+import os
+import time
+import random
+import tempfile
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from categories import QUIZ_CATEGORIES, canonical_category
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, every process refills
+    fcntl = None
+
+
+QUESTIONS_PER_CATEGORY = 5
+
+QUESTION_POOL_ENABLED = os.getenv('QUESTION_POOL_ENABLED', 'true').lower() == 'true'
+# Questions to keep per category for every (difficulty, language)
+QUESTION_POOL_TARGET_DEPTH = int(os.getenv('QUESTION_POOL_TARGET_DEPTH', 10))
+# Minimum seconds between refill calls, keeps the worker well inside the Gemini budget
+QUESTION_POOL_REFILL_INTERVAL = float(os.getenv('QUESTION_POOL_REFILL_INTERVAL', 10))
+QUESTION_POOL_DIFFICULTIES = os.getenv('QUESTION_POOL_DIFFICULTIES', 'easy,moderate,hard').split(',')
+QUESTION_POOL_LANGUAGES = os.getenv('QUESTION_POOL_LANGUAGES', 'python,java,cpp,javascript').split(',')
+# Set to false on hosts that should never refill (e.g. all but one host of a deployment)
+RUN_POOL_REFILLER = os.getenv('RUN_POOL_REFILLER', 'true').lower() == 'true'
+# The process holding this lock is the host's only refiller
+QUESTION_POOL_LOCK_PATH = os.getenv(
+    'QUESTION_POOL_LOCK_PATH',
+    os.path.join(tempfile.gettempdir(), 'career_guidance_pool_refiller.lock')
+)
+# Window used to report refill/drain rates
+RATE_WINDOW_SECONDS = 600
+
+PoolKey = Tuple[str, str]
+
+
+class QuestionPool:
+    """Per-category question queues for each (difficulty, language) combination"""
+
+    def __init__(self, generator: Callable[[str, str], List[Dict]],
+                 target_depth: int = QUESTION_POOL_TARGET_DEPTH,
+                 refill_interval: float = QUESTION_POOL_REFILL_INTERVAL):
+        self.generator = generator
+        self.target_depth = target_depth
+        self.refill_interval = refill_interval
+        self._pools: Dict[PoolKey, Dict[str, deque]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._lock_file = None
+        self._next_lock_attempt = 0.0
+        self._backoff: Dict[PoolKey, Tuple[int, float]] = {}
+        self._refill_events = deque()
+        self._drain_events = deque()
+        self._stats = {
+            'draws': 0,
+            'empty_draws': 0,
+            # Enough questions, but not enough this user hasn't seen
+            'skipped_draws': 0,
+            'refills': 0,
+            'refill_errors': 0,
+            'budget_waits': 0,
+            'questions_added': 0,
+            'questions_drained': 0
+        }
+
+    # ==================== PUBLIC API ====================
+
+    def register(self, difficulty: str, language: str):
+        """Make sure a (difficulty, language) combination is kept topped up"""
+        key = self._key(difficulty, language)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = {}
+                self._wakeup.set()
+
+    def ensure_started(self):
+        """Start the refill worker if this process is (or becomes) the host's refiller"""
+        if not RUN_POOL_REFILLER or (self._worker and self._worker.is_alive()):
+            return
+        if time.time() < self._next_lock_attempt:
+            return
+        with self._lock:
+            if self._worker and self._worker.is_alive():
+                return
+            if not self._take_refiller_lock():
+                # Another worker refills; retry now and then in case it exits
+                self._next_lock_attempt = time.time() + self.refill_interval * 6
+                return
+            for difficulty in QUESTION_POOL_DIFFICULTIES:
+                for language in QUESTION_POOL_LANGUAGES:
+                    if difficulty.strip() and language.strip():
+                        self._pools.setdefault(self._key(difficulty, language), {})
+            self._worker = threading.Thread(target=self._run, name='question-pool-refill', daemon=True)
+            self._worker.start()
+            print(f"✓ Question pool worker started ({len(self._pools)} combinations)")
+
+    def add(self, difficulty: str, language: str, questions: List[Dict]) -> int:
+        """Add validated questions to the pool, returns how many were kept"""
+        key = self._key(difficulty, language)
+        added = 0
+        with self._lock:
+            pool = self._pools.setdefault(key, {})
+            for q in questions:
+                category = canonical_category(q['category'], language)
+                if category is None:
+                    continue
+                q = dict(q, category=category)
+                queue = pool.setdefault(category, deque(maxlen=self.target_depth * 2))
+                # Rewordings banked as the same entry would show up as one question twice
+                if q.get('bank_id') and any(queued.get('bank_id') == q['bank_id'] for queued in queue):
+                    continue
+                queue.append(q)
+                added += 1
+            self._stats['questions_added'] += added
+            self._refill_events.append((time.time(), added))
+        return added
+
+    def draw(self, difficulty: str, language: str,
+             skip: Optional[Callable[[Dict], bool]] = None) -> Optional[List[Dict]]:
+        """
+        Take a full quiz (5 questions from each category) out of the pool.
+        Questions for which `skip(q)` is true (e.g. already seen by this user)
+        are passed over and stay in the pool for others.
+        Returns None without consuming anything if any category is short.
+        """
+        key = self._key(difficulty, language)
+        with self._lock:
+            self._stats['draws'] += 1
+            pool = self._pools.get(key, {})
+            if any(len(pool.get(cat, ())) < QUESTIONS_PER_CATEGORY for cat in QUIZ_CATEGORIES):
+                self._stats['empty_draws'] += 1
+                self._pools.setdefault(key, pool)
+                self._wakeup.set()
+                return None
+
+            # Oldest eligible questions first
+            chosen = {}
+            for cat in QUIZ_CATEGORIES:
+                picks = []
+                for index, q in enumerate(pool[cat]):
+                    if skip is None or not skip(q):
+                        picks.append(index)
+                        if len(picks) == QUESTIONS_PER_CATEGORY:
+                            break
+                if len(picks) < QUESTIONS_PER_CATEGORY:
+                    self._stats['skipped_draws'] += 1
+                    return None
+                chosen[cat] = picks
+
+            questions = []
+            for cat, picks in chosen.items():
+                queue = pool[cat]
+                for n, index in enumerate(picks, start=1):
+                    q = dict(queue[index])
+                    q['id'] = f"{cat}_{n}"
+                    questions.append(q)
+                taken = set(picks)
+                pool[cat] = deque((q for index, q in enumerate(queue) if index not in taken), maxlen=queue.maxlen)
+
+            self._stats['questions_drained'] += len(questions)
+            self._drain_events.append((time.time(), len(questions)))
+
+        # Wake the worker so it replaces what we just took
+        self._wakeup.set()
+        random.shuffle(questions)
+        return questions
+
+    def stats(self) -> Dict:
+        """Pool depth per combination plus refill and drain rates"""
+        with self._lock:
+            now = time.time()
+            self._trim_events(now)
+            stats = dict(self._stats)
+            stats['enabled'] = QUESTION_POOL_ENABLED
+            stats['refiller'] = bool(self._worker and self._worker.is_alive())
+            stats['target_depth'] = self.target_depth
+            stats['refill_rate_per_min'] = round(
+                sum(n for _, n in self._refill_events) / (RATE_WINDOW_SECONDS / 60), 2)
+            stats['drain_rate_per_min'] = round(
+                sum(n for _, n in self._drain_events) / (RATE_WINDOW_SECONDS / 60), 2)
+            stats['depth'] = {
+                f"{difficulty}/{language}": {cat: len(queue) for cat, queue in pool.items()}
+                for (difficulty, language), pool in self._pools.items()
+            }
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    @staticmethod
+    def _key(difficulty: str, language: str) -> PoolKey:
+        return (difficulty.strip().lower(), language.strip().lower())
+
+    def _take_refiller_lock(self) -> bool:
+        """Non-blocking exclusive lock, held for the life of the process"""
+        if fcntl is None:
+            return True
+        try:
+            lock_file = open(QUESTION_POOL_LOCK_PATH, 'a')
+        except OSError as e:
+            print(f"⚠️  Could not open pool refiller lock {QUESTION_POOL_LOCK_PATH}: {e}")
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _trim_events(self, now: float):
+        for events in (self._refill_events, self._drain_events):
+            while events and events[0][0] < now - RATE_WINDOW_SECONDS:
+                events.popleft()
+
+    def _depth(self, key: PoolKey) -> int:
+        pool = self._pools.get(key, {})
+        return min(len(pool.get(cat, ())) for cat in QUIZ_CATEGORIES)
+
+    def _most_depleted(self) -> Optional[PoolKey]:
+        """Combination whose shallowest category is furthest below target"""
+        now = time.time()
+        with self._lock:
+            best_key, best_depth = None, self.target_depth
+            for key in self._pools:
+                if self._backoff.get(key, (0, 0))[1] > now:
+                    continue
+                depth = self._depth(key)
+                if depth < best_depth:
+                    best_key, best_depth = key, depth
+            return best_key
+
+    def _record_refill(self, key: PoolKey, depth_before: int):
+        """Back off combinations whose refills don't make progress (e.g. bad categories)"""
+        with self._lock:
+            if self._depth(key) > depth_before:
+                self._backoff.pop(key, None)
+                return
+            failures = self._backoff.get(key, (0, 0))[0] + 1
+            delay = self.refill_interval * (2 ** min(failures, 6))
+            self._backoff[key] = (failures, time.time() + delay)
+
+    def _run(self):
+        while True:
+            key = self._most_depleted()
+            if key is None:
+                self._wakeup.wait(timeout=self.refill_interval * 6)
+                self._wakeup.clear()
+                continue
+
+            difficulty, language = key
+            with self._lock:
+                depth_before = self._depth(key)
+            try:
+                questions = self.generator(difficulty, language)
+                added = self.add(difficulty, language, questions)
+                with self._lock:
+                    self._stats['refills'] += 1
+                print(f"♻️  Question pool refilled {difficulty}/{language} (+{added})")
+            except Exception as e:
+                retry_after = getattr(e, 'retry_after', None)
+                if retry_after is not None:
+                    # No Gemini budget to spare right now; not this combination's fault
+                    with self._lock:
+                        self._stats['budget_waits'] += 1
+                    time.sleep(max(retry_after, self.refill_interval))
+                    continue
+                with self._lock:
+                    self._stats['refill_errors'] += 1
+                print(f"⚠️  Question pool refill failed for {difficulty}/{language}: {e}")
+            self._record_refill(key, depth_before)
+
+            time.sleep(self.refill_interval)
@@ -0,0 +1,173 @@
+"""
+Sharded live question generation
+
+Instead of one 30-question Gemini call (slow, and often truncated at the
+output token limit), a quiz is requested as one small call per category,
+issued in parallel. Each shard is validated on its own; only shards that
+fail or come back short are regenerated, and a category that still can't
+be filled takes its questions from the fallback set. The shards are then
+merged into the usual 5-per-category quiz.
+
+A round only starts when the rate limit can grant all of its calls right
+now, as one unit; queuing them one by one would space them out and undo
+the parallelism. Without that budget the caller uses the single call, so
+under load a quiz costs one request instead of six.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from categories import QUIZ_CATEGORIES
+from question_pool import QUESTIONS_PER_CATEGORY
+
+
+QUESTION_SHARDING_ENABLED = os.getenv('QUESTION_SHARDING_ENABLED', 'true').lower() == 'true'
+# Threads shared by all shard requests of this process (6 per quiz in flight)
+QUESTION_SHARD_WORKERS = int(os.getenv('QUESTION_SHARD_WORKERS', 12))
+# Extra attempts for a shard that failed or came back short
+QUESTION_SHARD_RETRIES = int(os.getenv('QUESTION_SHARD_RETRIES', 1))
+# Longest a quiz waits on its shards per round before using fallback questions
+QUESTION_SHARD_TIMEOUT = float(os.getenv('QUESTION_SHARD_TIMEOUT', 30))
+
+
+class ShardedGenerator:
+    """
+    One Gemini request per category, merged into a full quiz.
+
+    `request_shard(difficulty, language, supports_oop, category, count)` returns
+    validated questions for that category (raises on failure) and
+    `fallback(language, difficulty, skip)` returns an offline quiz to take questions
+    from, avoiding those `skip` returns True for where it can. `reserve(count)`
+    takes `count` rate-limit slots at once, without waiting, or returns False;
+    request_shard must not take slots of its own.
+    """
+
+    def __init__(self, request_shard: Callable[[str, str, bool, str, int], List[Dict]],
+                 fallback: Callable[[str, str, Optional[Callable[[Dict], bool]]], List[Dict]],
+                 reserve: Callable[[int], bool] = lambda count: True,
+                 max_workers: int = QUESTION_SHARD_WORKERS,
+                 retries: int = QUESTION_SHARD_RETRIES,
+                 timeout: float = QUESTION_SHARD_TIMEOUT):
+        self.request_shard = request_shard
+        self.fallback = fallback
+        self.reserve = reserve
+        self.retries = retries
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='question-shard')
+        self._lock = threading.Lock()
+        self._stats = {'quizzes': 0, 'fully_generated': 0, 'no_budget': 0, 'shards': 0, 'shard_failures': 0,
+                       'shard_timeouts': 0, 'shard_retries': 0, 'fallback_categories': 0, 'fallback_questions': 0}
+
+    def generate(self, difficulty: str, language: str, supports_oop: bool,
+                 skip: Optional[Callable[[Dict], bool]] = None) -> Optional[List[Dict]]:
+        """
+        30 questions, 5 per category, in QUIZ_CATEGORIES order. Returns None,
+        having spent nothing, when the rate limit can't grant every shard now.
+        """
+        started = time.time()
+        collected: Dict[str, List[Dict]] = {cat: [] for cat in QUIZ_CATEGORIES}
+        requested = list(QUIZ_CATEGORIES)
+        timed_out = set()
+
+        if not self.reserve(len(requested)):
+            self._count('no_budget')
+            return None
+
+        for attempt in range(self.retries + 1):
+            timed_out |= self._run_round(difficulty, language, supports_oop, requested, collected)
+            # A timed-out call is still running on our budget: don't pay for it twice
+            requested = [cat for cat in requested
+                         if len(collected[cat]) < QUESTIONS_PER_CATEGORY and cat not in timed_out]
+            # No point asking again when the budget is gone
+            if not requested or attempt == self.retries or not self.reserve(len(requested)):
+                break
+            self._count('shard_retries', len(requested))
+            print(f"🔁 Regenerating shards: {requested}")
+
+        pending = [cat for cat in QUIZ_CATEGORIES if len(collected[cat]) < QUESTIONS_PER_CATEGORY]
+        if pending:
+            self._fill_from_fallback(difficulty, language, pending, collected, skip)
+
+        questions = self._merge(collected)
+        self._count('quizzes')
+        if not pending:
+            self._count('fully_generated')
+        print(f"✅ Sharded generation: {len(questions)} questions in {time.time() - started:.2f}s"
+              f" ({len(pending)} categories from fallback)")
+        return questions
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['fallback_rate'] = round(stats['fallback_categories'] / (stats['quizzes'] * len(QUIZ_CATEGORIES)), 4) \
+            if stats['quizzes'] else 0
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    def _run_round(self, difficulty: str, language: str, supports_oop: bool,
+                   categories: List[str], collected: Dict[str, List[Dict]]) -> set:
+        """Request the given shards in parallel; returns the categories whose shard timed out"""
+        futures = {
+            self._executor.submit(self.request_shard, difficulty, language, supports_oop, cat,
+                                  QUESTIONS_PER_CATEGORY - len(collected[cat])): cat
+            for cat in categories
+        }
+        self._count('shards', len(futures))
+
+        done, not_done = wait(futures, timeout=self.timeout)
+        timed_out = set()
+        for future in not_done:
+            # A running call can't be stopped; its late answer is simply ignored
+            future.cancel()
+            timed_out.add(futures[future])
+            print(f"⏱️  Shard {futures[future]} timed out")
+        self._count('shard_timeouts', len(timed_out))
+
+        for future in done:
+            cat = futures[future]
+            try:
+                questions = future.result()
+            except Exception as e:
+                print(f"⚠️  Shard {cat} failed: {e}")
+                questions = []
+
+            seen = {q['question'].lower() for q in collected[cat]}
+            for q in questions:
+                if q['question'].lower() not in seen and len(collected[cat]) < QUESTIONS_PER_CATEGORY:
+                    seen.add(q['question'].lower())
+                    collected[cat].append(q)
+
+        failures = sum(1 for cat in categories if len(collected[cat]) < QUESTIONS_PER_CATEGORY)
+        self._count('shard_failures', failures)
+        return timed_out
+
+    def _fill_from_fallback(self, difficulty: str, language: str, categories: List[str],
+                            collected: Dict[str, List[Dict]], skip: Optional[Callable[[Dict], bool]] = None):
+        fallback = self.fallback(language, difficulty, skip)
+        for cat in categories:
+            seen = {q['question'].lower() for q in collected[cat]}
+            added = 0
+            for q in fallback:
+                if len(collected[cat]) >= QUESTIONS_PER_CATEGORY:
+                    break
+                if q['category'] == cat and q['question'].lower() not in seen:
+                    collected[cat].append(q)
+                    added += 1
+            self._count('fallback_categories')
+            self._count('fallback_questions', added)
+
+    @staticmethod
+    def _merge(collected: Dict[str, List[Dict]]) -> List[Dict]:
+        """Concatenate shards in category order, numbering questions within their category"""
+        questions = []
+        for cat in QUIZ_CATEGORIES:
+            for n, q in enumerate(collected[cat], start=1):
+                questions.append(dict(q, id=f"{cat}_{n}", category=cat))
+        return questions
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
@@ -0,0 +1,174 @@
+"""
+Background jobs for slow quiz work (Gemini generation)
+
+Jobs run on a dedicated thread pool so WSGI workers are free to serve
+other requests. Job state lives in the worker process that accepted the
+job, so clients should poll the same backend (sticky sessions when
+running several gunicorn workers behind a load balancer).
+"""
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+QUIZ_JOB_WORKERS = int(os.getenv('QUIZ_JOB_WORKERS', 4))
+# Finished jobs are kept this long for polling clients
+QUIZ_JOB_TTL = int(os.getenv('QUIZ_JOB_TTL', 600))
+# Queued + running jobs allowed per process and per user; further submits get 429
+QUIZ_JOB_MAX_PENDING = int(os.getenv('QUIZ_JOB_MAX_PENDING', 32))
+QUIZ_JOB_MAX_PENDING_PER_USER = int(os.getenv('QUIZ_JOB_MAX_PENDING_PER_USER', 2))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """Raised by submit when the pending-job limit (global or per owner) is reached"""
+
+    def __init__(self, scope: str, limit: int):
+        self.scope = scope
+        self.limit = limit
+        super().__init__(f"Too many pending jobs ({scope} limit {limit})")
+
+
+class Job:
+    """A single background job and its outcome"""
+
+    def __init__(self, owner_id: str):
+        self.id = str(uuid.uuid4())
+        self.owner_id = owner_id
+        self.state = QUEUED
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Bumped on every state change so streams can detect updates
+        self.version = 0
+
+    @property
+    def done(self) -> bool:
+        return self.state in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'status': self.state,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+        if self.state == SUCCEEDED and self.result:
+            data.update(self.result)
+        if self.state == FAILED:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Runs callables on a thread pool and tracks their state by job id.
+
+    At most `max_pending` jobs (and `max_pending_per_owner` per owner) may be
+    queued or running at once; None disables a limit.
+    """
+
+    def __init__(self, name: str, max_workers: int = QUIZ_JOB_WORKERS, ttl: int = QUIZ_JOB_TTL,
+                 max_pending: Optional[int] = QUIZ_JOB_MAX_PENDING,
+                 max_pending_per_owner: Optional[int] = QUIZ_JOB_MAX_PENDING_PER_USER):
+        self.name = name
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.max_pending_per_owner = max_pending_per_owner
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs: Dict[str, Job] = {}
+        self._cond = threading.Condition()
+        self._stats = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'rejected': 0, 'run_seconds': 0.0}
+
+    def submit(self, owner_id: str, fn: Callable[..., Dict[str, Any]], *args, **kwargs) -> Job:
+        """Queue `fn(*args, **kwargs)`; its return value becomes the job result (raises JobQueueFull)"""
+        job = Job(owner_id)
+        with self._cond:
+            self._purge_expired()
+            self._check_capacity(owner_id)
+            self._jobs[job.id] = job
+            self._stats['submitted'] += 1
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait_for_change(self, job_id: str, version: int, timeout: float) -> Optional[Job]:
+        """Block until the job's version differs from `version` or the timeout passes"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job.version != version:
+                    return job
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return job
+                self._cond.wait(remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued'] = sum(1 for j in self._jobs.values() if j.state == QUEUED)
+            stats['running'] = sum(1 for j in self._jobs.values() if j.state == RUNNING)
+            stats['tracked'] = len(self._jobs)
+        finished = stats['succeeded'] + stats['failed']
+        stats['avg_run_seconds'] = round(stats.pop('run_seconds') / finished, 3) if finished else 0
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    def _update(self, job: Job, **changes):
+        with self._cond:
+            for key, value in changes.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+            job.version += 1
+            self._cond.notify_all()
+
+    def _run(self, job: Job, fn: Callable, args: tuple, kwargs: dict):
+        started = time.time()
+        self._update(job, state=RUNNING)
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job, state=SUCCEEDED, result=result)
+            outcome = 'succeeded'
+        except Exception as e:
+            print(f"❌ Job {job.id} failed: {e}")
+            self._update(job, state=FAILED, error=str(e))
+            outcome = 'failed'
+        with self._cond:
+            self._stats[outcome] += 1
+            self._stats['run_seconds'] += time.time() - started
+
+    def _check_capacity(self, owner_id: str):
+        pending = [j for j in self._jobs.values() if not j.done]
+        if self.max_pending is not None and len(pending) >= self.max_pending:
+            scope, limit = 'global', self.max_pending
+        elif (self.max_pending_per_owner is not None
+              and sum(1 for j in pending if j.owner_id == owner_id) >= self.max_pending_per_owner):
+            scope, limit = 'per-user', self.max_pending_per_owner
+        else:
+            return
+        self._stats['rejected'] += 1
+        raise JobQueueFull(scope, limit)
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.updated_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Create a global instance
+quiz_jobs = JobManager('quiz-job')
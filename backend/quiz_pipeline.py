@@ -0,0 +1,93 @@
+"""
+Concurrent stages for quiz generation
+
+Quiz generation overlaps independent I/O: the quiz session insert runs on
+this module's thread pool while Gemini writes the questions, instead of
+after it. StageTimer records how long each stage took; the time saved by
+overlapping is the sum of the stage times minus the elapsed (wall-clock)
+time. Totals per stage are kept for /api/metrics.
+"""
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+QUIZ_PIPELINE_WORKERS = int(os.getenv('QUIZ_PIPELINE_WORKERS', 8))
+
+
+class StageTimer:
+    """Durations of the named stages of one quiz build"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def run(self, stage: str, fn: Callable, *args, **kwargs):
+        """Call fn and add its duration to `stage`"""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+
+    def summary(self) -> Dict:
+        wall = time.perf_counter() - self.started
+        with self._lock:
+            stages = dict(self.stages)
+        return {
+            'stages': {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            'wall': round(wall, 3),
+            'saved': round(max(sum(stages.values()) - wall, 0.0), 3)
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (milliseconds)"""
+        summary = self.summary()
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in summary['stages'].items()]
+        parts.append(f"total;dur={summary['wall'] * 1000:.1f}")
+        return ', '.join(parts)
+
+
+class QuizPipeline:
+    """Thread pool for the background stages of a quiz build, plus aggregate timings"""
+
+    def __init__(self, max_workers: int = QUIZ_PIPELINE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quiz-pipeline')
+        self._lock = threading.Lock()
+        self._stats = {'builds': 0, 'cleanups': 0, 'wall_seconds': 0.0, 'saved_seconds': 0.0}
+        self._stage_seconds: Dict[str, float] = {}
+
+    def submit(self, timer: StageTimer, stage: str, fn: Callable, *args, **kwargs) -> Future:
+        """Run a stage in the background, timed under `stage`"""
+        return self._executor.submit(timer.run, stage, fn, *args, **kwargs)
+
+    def record(self, timer: StageTimer, cleaned_up: bool = False) -> Dict:
+        """Add a finished build to the totals and return its summary"""
+        summary = timer.summary()
+        with self._lock:
+            self._stats['builds'] += 1
+            self._stats['cleanups'] += int(cleaned_up)
+            self._stats['wall_seconds'] += summary['wall']
+            self._stats['saved_seconds'] += summary['saved']
+            for stage, seconds in summary['stages'].items():
+                self._stage_seconds[stage] = self._stage_seconds.get(stage, 0.0) + seconds
+        return summary
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stage_seconds = dict(self._stage_seconds)
+        builds = stats['builds']
+        stats['wall_seconds'] = round(stats['wall_seconds'], 3)
+        stats['saved_seconds'] = round(stats['saved_seconds'], 3)
+        stats['avg_stage_seconds'] = {stage: round(seconds / builds, 3) for stage, seconds in stage_seconds.items()} if builds else {}
+        return stats
+
+
+# Create a global instance
+quiz_pipeline = QuizPipeline()
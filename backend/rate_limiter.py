@@ -0,0 +1,228 @@
+"""
+Token-bucket rate scheduler shared by threads and worker processes
+
+Bucket state lives in a small SQLite file so every gunicorn worker draws
+from the same Gemini budget. Callers reserve a slot in arrival order (a
+virtual FIFO queue); if their slot is further away than `max_wait` they
+are told right away instead of sleeping.
+"""
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from question_pool import QUESTION_POOL_ENABLED
+
+
+# Gemini 2.0 flash-lite allows 30 requests per minute
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', 30))
+# Calls allowed back-to-back; the refill rate is reduced so burst + refill stays within the RPM.
+# Sharded quiz generation needs 6 at once (one per category)
+GEMINI_BURST = int(os.getenv('GEMINI_BURST', 6))
+# Part of GEMINI_RPM set aside for question-pool refills, in their own bucket so they never
+# take the burst live (sharded) generation needs. At least 2 when the pool is on
+GEMINI_POOL_RPM = max(2, int(os.getenv('GEMINI_POOL_RPM', 4))) if QUESTION_POOL_ENABLED else 0
+# Longest a request thread will queue for a Gemini slot
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', 10))
+RATE_LIMIT_STATE_PATH = os.getenv(
+    'RATE_LIMIT_STATE_PATH',
+    os.path.join(tempfile.gettempdir(), 'career_guidance_rate_limit.sqlite3')
+)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the budget can't grant a slot within the allowed wait"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit budget exhausted, retry in {retry_after:.1f}s")
+
+
+class TokenBucket:
+    """
+    Token bucket allowing at most `limit` calls in any `window` seconds.
+
+    `burst` tokens may be used back-to-back and the bucket refills at
+    (limit - burst) / window tokens per second, so burst + refill never
+    exceeds `limit` within a window. Reservations may drive the token
+    count negative; each caller then sleeps until its reserved slot.
+    """
+
+    def __init__(self, name: str, limit: int, window: float = 60, burst: int = 1,
+                 state_path: Optional[str] = RATE_LIMIT_STATE_PATH):
+        if burst >= limit:
+            burst = max(1, limit - 1)
+        self.name = name
+        self.capacity = float(burst)
+        self.rate = (limit - burst) / window
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._local_state = {'tokens': self.capacity, 'updated_at': time.time()}
+        self._waiting = 0
+        self._stats = {
+            'granted': 0,
+            'rejected': 0,
+            'waited': 0,
+            'wait_seconds': 0.0,
+            'state_errors': 0
+        }
+        if state_path:
+            self._init_state()
+
+    # ==================== PUBLIC API ====================
+
+    def acquire(self, max_wait: Optional[float] = None, tokens: int = 1) -> bool:
+        """
+        Reserve the next slot and sleep until it arrives.
+        Returns False immediately (without reserving) if the slot is more than `max_wait` away.
+
+        `tokens` > 1 reserves that many slots as one unit, for calls that must
+        start together; the unit is granted once all of them are available,
+        which is never if it is larger than the burst.
+        """
+        wait = self._reserve(max_wait, tokens) if tokens <= self.capacity else None
+        if wait is None:
+            with self._lock:
+                self._stats['rejected'] += 1
+            return False
+
+        with self._lock:
+            self._stats['granted'] += tokens
+            if wait > 0:
+                self._stats['waited'] += 1
+                self._stats['wait_seconds'] += wait
+                self._waiting += 1
+
+        if wait > 0:
+            print(f"⏳ Rate limiting ({self.name}): waiting {wait:.1f}s...")
+            time.sleep(wait)
+            with self._lock:
+                self._waiting -= 1
+        return True
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is available right now"""
+        return self.acquire(max_wait=0)
+
+    def next_slot_in(self) -> float:
+        """Seconds until a slot would be granted, without reserving it"""
+        with self._lock:
+            tokens, _ = self._read_tokens(commit=False)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['waiting'] = self._waiting
+        stats['limit_per_minute'] = round(self.capacity + self.rate * 60, 2)
+        stats['burst'] = self.capacity
+        stats['shared_state'] = self.state_path
+        stats['next_slot_in'] = round(self.next_slot_in(), 2)
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    def _refill(self, tokens: float, updated_at: float, now: float) -> float:
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def _reserve(self, max_wait: Optional[float], count: int = 1) -> Optional[float]:
+        """Atomically take `count` tokens; returns seconds to wait, or None if over max_wait"""
+        with self._lock:
+            if self.state_path:
+                try:
+                    return self._reserve_shared(max_wait, count)
+                except sqlite3.Error as e:
+                    self._stats['state_errors'] += 1
+                    print(f"⚠️  Shared rate limit state unavailable ({e}), using process-local bucket")
+            return self._reserve_local(max_wait, count)
+
+    def _take(self, tokens: float, max_wait: Optional[float], count: int = 1):
+        """Return (new_tokens, wait) or (tokens, None) if the wait is too long"""
+        remaining = tokens - count
+        wait = -remaining / self.rate if remaining < 0 else 0.0
+        if max_wait is not None and wait > max_wait:
+            return tokens, None
+        return remaining, wait
+
+    def _reserve_local(self, max_wait: Optional[float], count: int = 1) -> Optional[float]:
+        now = time.time()
+        state = self._local_state
+        tokens = self._refill(state['tokens'], state['updated_at'], now)
+        tokens, wait = self._take(tokens, max_wait, count)
+        state['tokens'], state['updated_at'] = tokens, now
+        return wait
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.state_path, timeout=5, isolation_level=None)
+
+    def _init_state(self):
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS buckets '
+                    '(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+                )
+                conn.execute(
+                    'INSERT OR IGNORE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)',
+                    (self.name, self.capacity, time.time())
+                )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self._stats['state_errors'] += 1
+            print(f"⚠️  Could not open rate limit state at {self.state_path}: {e}")
+
+    def _read_tokens(self, commit: bool):
+        """Current (refilled) token count; falls back to local state on errors"""
+        now = time.time()
+        if self.state_path:
+            try:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        'SELECT tokens, updated_at FROM buckets WHERE name = ?', (self.name,)
+                    ).fetchone()
+                finally:
+                    conn.close()
+                if row:
+                    return self._refill(row[0], row[1], now), now
+            except sqlite3.Error:
+                pass
+        state = self._local_state
+        return self._refill(state['tokens'], state['updated_at'], now), now
+
+    def _reserve_shared(self, max_wait: Optional[float], count: int = 1) -> Optional[float]:
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock, serializing all worker processes
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT tokens, updated_at FROM buckets WHERE name = ?', (self.name,)
+            ).fetchone()
+            now = time.time()
+            tokens = self._refill(row[0], row[1], now) if row else self.capacity
+            tokens, wait = self._take(tokens, max_wait, count)
+            if wait is not None:
+                conn.execute(
+                    'INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)',
+                    (self.name, tokens, now)
+                )
+            conn.execute('COMMIT')
+            return wait
+        except sqlite3.Error:
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            raise
+        finally:
+            conn.close()
+
+
+# Shared Gemini budget for every thread and worker process on this host
+gemini_rate_limiter = TokenBucket('gemini', limit=GEMINI_RPM - GEMINI_POOL_RPM, window=60, burst=GEMINI_BURST)
+# Background pool refills draw only from their own share
+pool_rate_limiter = TokenBucket('gemini-pool', limit=GEMINI_POOL_RPM, window=60) if GEMINI_POOL_RPM else None
@@ -0,0 +1,112 @@
+"""
+Response compression and conditional GET for the JSON API
+
+An after_request hook that
+- compresses responses above a size threshold with brotli (if installed) or
+  gzip, depending on the client's Accept-Encoding
+- adds ETags to selected GET endpoints and answers If-None-Match with 304
+- counts bytes sent and saved per endpoint for /api/metrics
+"""
+import os
+import gzip
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript')
+
+
+class ResponseLayer:
+    """Registers the compression / ETag hook on a Flask app"""
+
+    def __init__(self, app, conditional_endpoints: Iterable[str] = ()):
+        self.conditional_endpoints = set(conditional_endpoints)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        app.after_request(self.process)
+
+    def process(self, response):
+        if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+            return response
+
+        endpoint = request.endpoint or 'unknown'
+        body = response.get_data()
+        encoding = self._choose_encoding(response, body)
+        if len(body) >= COMPRESS_MIN_SIZE:
+            response.vary.add('Accept-Encoding')
+
+        if request.method == 'GET' and endpoint in self.conditional_endpoints:
+            etag, _ = response.get_etag()
+            if not etag:
+                etag = hashlib.sha256(body).hexdigest()[:32]
+                if 'Cache-Control' not in response.headers:
+                    # Per-user documents: browsers may keep them but must revalidate
+                    response.headers['Cache-Control'] = 'private, no-cache'
+            # Each encoding is a different representation, so it gets its own validator
+            response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                self._record(endpoint, len(body), 0, not_modified=True)
+                return response
+
+        if encoding:
+            response.set_data(self._compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+
+        self._record(endpoint, len(body), response.content_length or len(body))
+        return response
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-endpoint bytes before/after compression and 304s"""
+        with self._lock:
+            stats = {endpoint: dict(counters) for endpoint, counters in self._stats.items()}
+        for counters in stats.values():
+            counters['bytes_saved'] = counters['bytes_in'] - counters['bytes_out']
+            counters['saved_ratio'] = (round(counters['bytes_saved'] / counters['bytes_in'], 4)
+                                       if counters['bytes_in'] else 0)
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    @staticmethod
+    def _choose_encoding(response, body: bytes) -> Optional[str]:
+        if len(body) < COMPRESS_MIN_SIZE or 'Content-Encoding' in response.headers:
+            return None
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return None
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def _compress(body: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(body, quality=min(COMPRESS_LEVEL, 11))
+        # mtime=0 keeps output (and so the representation) identical across requests
+        return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+    def _record(self, endpoint: str, bytes_in: int, bytes_out: int, not_modified: bool = False):
+        with self._lock:
+            counters = self._stats.setdefault(endpoint, {
+                'responses': 0, 'compressed': 0, 'not_modified': 0, 'bytes_in': 0, 'bytes_out': 0
+            })
+            counters['responses'] += 1
+            counters['bytes_in'] += bytes_in
+            counters['bytes_out'] += bytes_out
+            if not_modified:
+                counters['not_modified'] += 1
+            elif bytes_out < bytes_in:
+                counters['compressed'] += 1
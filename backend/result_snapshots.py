@@ -0,0 +1,168 @@
+"""
+Immutable snapshots of shared results
+
+/api/results/<result_id> is public and a result only changes when
+`manage.py rescore` re-scores it, so the response document is built once,
+serialized together with its ETag and served from memory. Snapshots are also
+stored in the result_snapshots table so other workers and restarts skip the
+rebuild. A rescore deletes the stored snapshots; copies in worker memory and
+in browser or CDN caches expire within RESULT_SNAPSHOT_TTL and
+RESULT_SNAPSHOT_MAX_AGE, which bounds how long old scores are served.
+"""
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from cache import TTLCache
+
+
+RESULT_SNAPSHOT_CACHE_SIZE = int(os.getenv('RESULT_SNAPSHOT_CACHE_SIZE', 5000))
+# In-process lifetime; also bounds how long a re-scored result can be served stale
+RESULT_SNAPSHOT_TTL = int(os.getenv('RESULT_SNAPSHOT_TTL', 300))
+# Cache-Control max-age for browsers and CDNs; a rescore shows up after at most this long
+RESULT_SNAPSHOT_MAX_AGE = int(os.getenv('RESULT_SNAPSHOT_MAX_AGE', 300))
+
+
+class Snapshot(NamedTuple):
+    body: bytes
+    etag: str
+    # False while insights are pending: the document will still change
+    final: bool
+
+
+def shared_result_document(result: Dict, user_name: Optional[str], total_questions: int) -> Dict:
+    """Public document for a results row"""
+    ai_insights = result.get('ai_insights')
+    if isinstance(ai_insights, str):
+        ai_insights = json.loads(ai_insights) if ai_insights else None
+
+    return {
+        'result_id': result['id'],
+        'user_name': user_name or 'Anonymous',
+        'quiz_id': result['quiz_id'],
+        'total_score': result['total_score'],
+        'total_questions': total_questions,
+        'percentage': round((result['total_score'] / total_questions) * 100, 2) if total_questions else 0,
+        'domain_scores': {
+            'programming': result['programming_score'],
+            'analytics': result['analytics_score'],
+            'testing': result['testing_score'],
+            'technical': result.get('technical_score', 0)
+        },
+        'recommended_domain': result['recommended_domain'],
+        'ai_insights': ai_insights,
+        'insights_status': result.get('insights_status') or 'ready',
+        'created_at': result.get('completed_at')
+    }
+
+
+def serialize(document: Dict, etag: Optional[str] = None) -> Snapshot:
+    body = json.dumps(document, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return Snapshot(
+        body=body,
+        etag=etag or hashlib.sha256(body).hexdigest()[:32],
+        final=document.get('insights_status') != 'pending'
+    )
+
+
+class ResultSnapshotStore:
+    """
+    result_id -> serialized snapshot, backed by a shared store.
+
+    `build(result_id)` assembles the document from the database (None if the
+    result doesn't exist), `load(result_id)` returns a stored (document, etag)
+    and `save(result_id, document, etag)` stores one.
+    """
+
+    def __init__(self, build: Callable[[str], Optional[Dict]],
+                 load: Callable[[str], Optional[Tuple[Dict, str]]],
+                 save: Callable[[str, Dict, str], bool],
+                 maxsize: int = RESULT_SNAPSHOT_CACHE_SIZE, ttl: int = RESULT_SNAPSHOT_TTL):
+        self.build = build
+        self.load = load
+        self.save = save
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot-writer')
+        self._lock = threading.Lock()
+        self._building: Dict[str, list] = {}
+        self._stats = {'stored_hits': 0, 'builds': 0, 'pending': 0, 'writes': 0, 'write_errors': 0}
+
+    def get(self, result_id: str) -> Optional[Snapshot]:
+        """Snapshot from memory, the shared store, or built from the database"""
+        snapshot = self._cache.get(result_id)
+        if snapshot is not None:
+            return snapshot
+
+        # Single flight: concurrent first reads of a freshly shared link rebuild once
+        with self._key_lock(result_id):
+            snapshot = self._cache.get(result_id)
+            if snapshot is not None:
+                return snapshot
+            return self._load_or_build(result_id)
+
+    def put(self, result_id: str, document: Dict) -> Snapshot:
+        """Snapshot a document known at submit time (ignored while insights are pending)"""
+        snapshot = serialize(document)
+        if snapshot.final:
+            self._remember(result_id, document, snapshot)
+        return snapshot
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['memory'] = self._cache.stats()
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    @contextmanager
+    def _key_lock(self, result_id: str):
+        with self._lock:
+            entry = self._building.setdefault(result_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._building[result_id]
+
+    def _load_or_build(self, result_id: str) -> Optional[Snapshot]:
+        stored = self.load(result_id)
+        if stored:
+            document, etag = stored
+            snapshot = serialize(document, etag)
+            self._cache.set(result_id, snapshot)
+            self._count('stored_hits')
+            return snapshot
+
+        document = self.build(result_id)
+        if document is None:
+            return None
+        self._count('builds')
+        snapshot = serialize(document)
+        if not snapshot.final:
+            # Insights still on their way; don't freeze this version
+            self._count('pending')
+            return snapshot
+        self._remember(result_id, document, snapshot)
+        return snapshot
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _remember(self, result_id: str, document: Dict, snapshot: Snapshot):
+        self._cache.set(result_id, snapshot)
+        # Persist off the request thread; a lost write only means another rebuild
+        self._writer.submit(self._write, result_id, document, snapshot.etag)
+
+    def _write(self, result_id: str, document: Dict, etag: str):
+        ok = self.save(result_id, document, etag)
+        self._count('writes' if ok else 'write_errors')
@@ -0,0 +1,105 @@
+"""
+Table-driven domain scoring
+
+Each correctly answered question adds its category's row of the
+category x domain weight matrix to the domain scores. The matrix is loaded
+from a JSON config (SCORING_WEIGHTS_PATH) so weights can be tuned and old
+results re-scored (see `python manage.py rescore`).
+"""
+import os
+import json
+import hashlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from categories import canonical_category
+
+
+SCORING_WEIGHTS_PATH = os.getenv(
+    'SCORING_WEIGHTS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scoring_weights.json')
+)
+
+# (question id, correct answer, category, ...) - answer_keys entries fit this shape
+KeyEntry = Tuple
+Submission = Tuple[Sequence[KeyEntry], Dict[str, int]]
+
+
+class ScoringEngine:
+    """Scores submissions against a category x domain weight matrix"""
+
+    def __init__(self, config: Dict):
+        self.domains: List[str] = list(config['domains'])
+        self.categories: List[str] = list(config['weights'])
+        self.default_domain = config.get('default_domain', self.domains[0])
+        self.weights = np.array(
+            [[float(config['weights'][cat].get(domain, 0)) for domain in self.domains]
+             for cat in self.categories],
+            dtype=np.float64
+        )
+        self._index: Dict[str, int] = {cat: i for i, cat in enumerate(self.categories)}
+        for alias, cat in config.get('aliases', {}).items():
+            self._index[alias] = self._index[cat]
+        self.version = hashlib.sha256(
+            json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, path: str = SCORING_WEIGHTS_PATH) -> 'ScoringEngine':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    # ==================== SINGLE SUBMISSION ====================
+
+    def category_index(self, category: str) -> Optional[int]:
+        """Row of the weight matrix for a category; None for categories that don't score"""
+        index = self._index.get(category)
+        if index is None:
+            # Raw labels from rows stored before ingest-time canonicalization
+            canonical = canonical_category(category)
+            index = self._index.get(canonical) if canonical else None
+        return index
+
+    def score(self, category_correct: Dict[str, int]) -> Dict[str, float]:
+        """Domain scores from correct answers per category"""
+        counts = np.zeros(len(self.categories), dtype=np.float64)
+        for category, correct in category_correct.items():
+            index = self.category_index(category)
+            if index is not None:
+                counts[index] += correct
+        return dict(zip(self.domains, (counts @ self.weights).tolist()))
+
+    def recommend(self, scores: Dict[str, float]) -> str:
+        """Highest scoring domain (first in matrix order on ties)"""
+        best = max(self.domains, key=lambda d: scores.get(d, 0))
+        return best if scores.get(best, 0) > 0 else self.default_domain
+
+    # ==================== BATCH SCORING ====================
+
+    def correct_counts(self, submissions: Iterable[Submission]) -> np.ndarray:
+        """(n, categories) matrix of correct answers from (answer key, answers) pairs"""
+        rows, cols = [], []
+        n = 0
+        for n, (key, answers) in enumerate(submissions, start=1):
+            for entry in key:
+                index = self.category_index(entry[2])
+                if index is not None and answers.get(entry[0]) == entry[1]:
+                    rows.append(n - 1)
+                    cols.append(index)
+        counts = np.zeros((n, len(self.categories)), dtype=np.int32)
+        np.add.at(counts, (rows, cols), 1)
+        return counts
+
+    def score_batch(self, counts: np.ndarray) -> np.ndarray:
+        """(n, domains) score matrix for an (n, categories) matrix of correct counts"""
+        return counts @ self.weights
+
+    def recommend_batch(self, scores: np.ndarray) -> np.ndarray:
+        """Recommended domain per row of a score matrix"""
+        domains = np.array(self.domains, dtype=object)[scores.argmax(axis=1)]
+        domains[scores.max(axis=1, initial=0) <= 0] = self.default_domain
+        return domains
+
+
+# Create a global instance
+scoring = ScoringEngine.from_file()
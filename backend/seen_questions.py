@@ -0,0 +1,261 @@
+"""
+Per-user seen-question filters
+
+Stored questions (the pool, the bank) can be served to the same user more
+than once. Each user gets a scalable Bloom filter over the ids of the
+questions they were served: membership is a handful of bit probes per
+candidate, with no history scan, and a few hundred bytes per user. The
+filter is updated on every quiz and persisted in user_seen_questions.
+
+Workers keep their own cached copy, so filters are merged rather than
+overwritten: a save ORs the stored bits into this worker's filter first,
+and a quiz starts by merging in the stored filter, so questions served by
+another worker are seen within one quiz. False positives only mean an
+unseen question is skipped; there are no false negatives, except for an
+update lost when two workers save the same user's filter at the same
+moment (a possible repeat, never an error).
+"""
+import os
+import math
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from cache import TTLCache
+from question_bank import content_hash
+
+
+# First layer fits about this many questions (10 quizzes) at the target rate
+SEEN_FILTER_CAPACITY = int(os.getenv('SEEN_FILTER_CAPACITY', 300))
+SEEN_FILTER_FP_RATE = float(os.getenv('SEEN_FILTER_FP_RATE', 0.01))
+# Filters kept in memory; short so a user's next quiz on another worker reloads it
+SEEN_FILTER_CACHE_SIZE = int(os.getenv('SEEN_FILTER_CACHE_SIZE', 10000))
+SEEN_FILTER_CACHE_TTL = int(os.getenv('SEEN_FILTER_CACHE_TTL', 300))
+# Each new layer holds twice as many items at half the error rate, so the total stays bounded
+LAYER_GROWTH = 2
+LAYER_TIGHTENING = 0.5
+
+
+def seen_key(q: Dict) -> str:
+    """Identity of a served question: its bank entry (rewordings share it) or its content hash"""
+    return str(q.get('bank_id') or q.get('content_hash') or content_hash(q['question'], q['options']))
+
+
+def _probes(key: str):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+
+
+class BloomLayer:
+    """Fixed-size Bloom filter sized for `capacity` items at `fp_rate`"""
+
+    def __init__(self, capacity: int, fp_rate: float, bits: Optional[bytearray] = None, count: int = 0):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def add(self, h1: int, h2: int):
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % self.size
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+    def contains(self, h1: int, h2: int) -> bool:
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % self.size
+            if not self.bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def estimated_fp_rate(self) -> float:
+        """From the share of bits set: (set / size) ** hashes"""
+        return (self._ones() / self.size) ** self.hashes
+
+    def compatible(self, other: 'BloomLayer') -> bool:
+        return self.size == other.size and self.hashes == other.hashes
+
+    def merge(self, other: 'BloomLayer'):
+        """OR in another layer of the same shape; the count is re-estimated from the bits set"""
+        self.bits = bytearray(a | b for a, b in zip(self.bits, other.bits))
+        ones = min(self._ones(), self.size - 1)
+        estimate = int(round(-self.size / self.hashes * math.log(1 - ones / self.size)))
+        self.count = max(self.count, other.count, estimate)
+
+    def copy(self) -> 'BloomLayer':
+        return BloomLayer(self.capacity, self.fp_rate, bytearray(self.bits), self.count)
+
+    def _ones(self) -> int:
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+
+class SeenFilter:
+    """Scalable Bloom filter: a new, larger layer is started whenever the last one fills up"""
+
+    def __init__(self, layers: Optional[List[BloomLayer]] = None,
+                 capacity: int = SEEN_FILTER_CAPACITY, fp_rate: float = SEEN_FILTER_FP_RATE):
+        self.layers = layers or [BloomLayer(capacity, fp_rate)]
+
+    def add(self, key: str) -> bool:
+        """Add a key; returns False if it was (probably) already there"""
+        h1, h2 = _probes(key)
+        if any(layer.contains(h1, h2) for layer in self.layers):
+            return False
+        if self.layers[-1].full:
+            last = self.layers[-1]
+            self.layers.append(BloomLayer(last.capacity * LAYER_GROWTH, last.fp_rate * LAYER_TIGHTENING))
+        self.layers[-1].add(h1, h2)
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = _probes(key)
+        return any(layer.contains(h1, h2) for layer in self.layers)
+
+    @property
+    def items(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(layer.bits) for layer in self.layers)
+
+    def merge(self, other: 'SeenFilter'):
+        """
+        Union with another filter of the same user. Layers are sized the same
+        way in every worker, so they are ORed pairwise; a layer with another
+        shape (settings changed) is kept alongside, which is still correct.
+        """
+        for i, layer in enumerate(other.layers):
+            if i < len(self.layers) and self.layers[i].compatible(layer):
+                self.layers[i].merge(layer)
+            else:
+                self.layers.append(layer.copy())
+
+    def estimated_fp_rate(self) -> float:
+        """Chance an unseen question is reported as seen by any layer"""
+        miss = 1.0
+        for layer in self.layers:
+            miss *= 1 - layer.estimated_fp_rate()
+        return 1 - miss
+
+    def to_document(self) -> Dict:
+        return {'layers': [
+            {'capacity': layer.capacity, 'fp_rate': layer.fp_rate, 'count': layer.count,
+             'bits': base64.b64encode(bytes(layer.bits)).decode('ascii')}
+            for layer in self.layers
+        ]}
+
+    @classmethod
+    def from_document(cls, document: Dict) -> 'SeenFilter':
+        return cls([
+            BloomLayer(layer['capacity'], layer['fp_rate'],
+                       bytearray(base64.b64decode(layer['bits'])), layer['count'])
+            for layer in document['layers']
+        ])
+
+
+class SeenQuestions:
+    """
+    user_id -> SeenFilter, cached in memory and persisted in the background.
+
+    `load(user_id)` returns a stored filter document (None for a new user)
+    and `save(user_id, document, items)` stores one.
+    """
+
+    def __init__(self, load: Callable[[str], Optional[Dict]],
+                 save: Callable[[str, Dict, int], bool],
+                 maxsize: int = SEEN_FILTER_CACHE_SIZE, ttl: int = SEEN_FILTER_CACHE_TTL):
+        self.load = load
+        self.save = save
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='seen-writer')
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'skipped': 0, 'marked': 0, 'repeats': 0, 'writes': 0, 'write_errors': 0,
+                       'merges': 0}
+
+    def get(self, user_id: str) -> SeenFilter:
+        seen = self._cache.get(user_id)
+        if seen is None:
+            document = self.load(user_id)
+            seen = SeenFilter.from_document(document) if document else SeenFilter()
+            self._cache.set(user_id, seen)
+        return seen
+
+    def refresh(self, user_id: str) -> SeenFilter:
+        """The user's filter, with anything other workers stored since it was cached merged in"""
+        seen = self._cache.get(user_id)
+        if seen is None:
+            return self.get(user_id)
+        self._merge_stored(user_id, seen, self.load(user_id))
+        return seen
+
+    def skipper(self, user_id: str) -> Callable[[Dict], bool]:
+        """Predicate for candidate selection: True for questions the user has already been served"""
+        seen = self.refresh(user_id)
+
+        def already_seen(q: Dict) -> bool:
+            hit = seen_key(q) in seen
+            self._count('checked')
+            if hit:
+                self._count('skipped')
+            return hit
+
+        return already_seen
+
+    def mark(self, user_id: str, questions: Iterable[Dict]):
+        """Record questions served to a user; persisted off the request thread"""
+        seen = self.get(user_id)
+        with self._lock:
+            added = [seen.add(seen_key(q)) for q in questions]
+            document = seen.to_document()
+            items = seen.items
+        self._count('marked', len(added))
+        self._count('repeats', added.count(False))
+        self._writer.submit(self._write, user_id, document, items)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            filters = [seen for _, seen, _ in self._cache.items()]
+        stats['cached_users'] = len(filters)
+        if filters:
+            stats['avg_bytes_per_user'] = round(sum(f.memory_bytes for f in filters) / len(filters), 1)
+            stats['max_bytes_per_user'] = max(f.memory_bytes for f in filters)
+            rates = [f.estimated_fp_rate() for f in filters]
+            stats['avg_fp_rate'] = round(sum(rates) / len(rates), 6)
+            stats['max_fp_rate'] = round(max(rates), 6)
+        return stats
+
+    # ==================== INTERNALS ====================
+
+    def _write(self, user_id: str, document: Dict, items: int):
+        # Another worker may have saved since this one loaded the filter: keep both
+        stored = self.load(user_id)
+        if stored:
+            merged = SeenFilter.from_document(document)
+            merged.merge(SeenFilter.from_document(stored))
+            document, items = merged.to_document(), merged.items
+            seen = self._cache.get(user_id)
+            if seen is not None:
+                self._merge_stored(user_id, seen, stored)
+        ok = self.save(user_id, document, items)
+        self._count('writes' if ok else 'write_errors')
+
+    def _merge_stored(self, user_id: str, seen: SeenFilter, stored: Optional[Dict]):
+        if not stored:
+            return
+        with self._lock:
+            seen.merge(SeenFilter.from_document(stored))
+        self._count('merges')
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
@@ -0,0 +1,8 @@
+"""
+Shared test setup: make the backend modules importable when pytest runs from
+the backend directory (the modules are flat files, not a package).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,63 @@
+"""TTLCache: per-entry expiry and LRU eviction"""
+import time
+
+import pytest
+
+from cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time for the cache module"""
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set('a', 1)
+    clock[0] += 4.9
+    assert cache.get('a') == 1
+    clock[0] += 0.1
+    assert cache.get('a') is None
+    assert 'a' not in cache
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set('short', 1, ttl=1)
+    cache.set('long', 2, ttl=60)
+    clock[0] += 10
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+
+
+def test_expired_entries_are_left_out_of_items(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set('old', 1)
+    clock[0] += 3
+    cache.set('new', 2)
+    clock[0] += 3
+    assert [key for key, _, _ in cache.items()] == ['new']
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_stats_count_expired_reads_as_misses(clock):
+    cache = TTLCache(maxsize=10, ttl=1)
+    cache.set('a', 1)
+    cache.get('a')
+    clock[0] += 2
+    cache.get('a')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 0)
@@ -0,0 +1,71 @@
+"""Attempt-history cursors: round trip, rejection of anything else, and the 400 route"""
+import os
+import json
+import uuid
+import base64
+
+import pytest
+
+from cursors import encode_cursor, decode_cursor, CursorError
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('completed_at', [
+    '2026-01-31T10:30:00.123456+00:00',
+    '2026-01-31T10:30:00.123456',
+    '2026-01-31T10:30:00Z',
+])
+def test_round_trip(completed_at):
+    row_id = str(uuid.uuid4())
+    decoded_at, decoded_id = decode_cursor(encode_cursor({'completed_at': completed_at, 'id': row_id}))
+    assert decoded_id == row_id
+    assert decoded_at.startswith('2026-01-31T10:30:00')
+
+
+def test_decoded_values_are_reserialized():
+    row_id = uuid.uuid4()
+    _, decoded_id = decode_cursor(raw_cursor(['2026-01-31T10:30:00', str(row_id).upper()]))
+    assert decoded_id == str(row_id)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64 at all!!',
+    raw_cursor(['2026-01-31T10:30:00', 'a),or(user_id.neq.0']),
+    raw_cursor(['x",id.gt.0', str(uuid.uuid4())]),
+    raw_cursor(['2026-01-31T10:30:00']),
+    raw_cursor([1, 2]),
+    raw_cursor({}),
+    raw_cursor(None),
+    '',
+])
+def test_malformed_cursor_raises(cursor):
+    with pytest.raises(CursorError):
+        decode_cursor(cursor)
+
+
+def test_cursor_error_is_a_value_error():
+    assert issubclass(CursorError, ValueError)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Flask test client with authentication stubbed out (needs the full dependency set)"""
+    pytest.importorskip('supabase')
+    pytest.importorskip('google.generativeai')
+    for name, value in (('SUPABASE_URL', 'http://localhost:54321'), ('SUPABASE_ANON_KEY', 'test'),
+                        ('GEMINI_API_KEY', 'test')):
+        monkeypatch.setenv(name, os.environ.get(name, value))
+    import main
+
+    monkeypatch.setattr(main, 'verify_clerk_token', lambda: 'clerk_test')
+    monkeypatch.setattr(main.User, 'get_by_clerk_id', staticmethod(lambda clerk_id: {'id': str(uuid.uuid4())}))
+    return main.app.test_client()
+
+
+def test_attempts_route_rejects_a_malformed_cursor(client):
+    response = client.get('/api/profile/attempts?cursor=garbage')
+    assert response.status_code == 400
+    assert 'cursor' in response.get_json()['error']
@@ -0,0 +1,78 @@
+"""Tolerant parsing of model output: fences, truncation and malformed objects"""
+import json
+
+import pytest
+
+from json_stream import IncrementalObjectParser, parse_json_objects
+
+
+def question(n):
+    return {'question': f'Q{n}?', 'options': ['a', 'b', 'c', 'd'], 'correct_answer': n % 4, 'category': 'os'}
+
+
+def dumps(objects):
+    return json.dumps(objects, indent=2)
+
+
+def test_well_formed_array_inside_fences():
+    objects, skipped = parse_json_objects('```json\n' + dumps([question(1), question(2)]) + '\n```')
+    assert objects == [question(1), question(2)]
+    assert skipped == 0
+
+
+def test_truncated_output_keeps_complete_objects():
+    text = dumps([question(1), question(2), question(3)])
+    cut = text[:text.rfind('"category"')]
+    objects, _ = parse_json_objects(cut)
+    assert objects == [question(1), question(2)]
+
+
+def test_object_missing_closing_brace_does_not_swallow_its_neighbours():
+    broken = json.dumps(question(2))[:-1]
+    text = '[' + ', '.join([json.dumps(question(1)), broken, json.dumps(question(3)), json.dumps(question(4))]) + ']'
+    objects, skipped = parse_json_objects(text)
+    assert question(1) in objects and question(3) in objects and question(4) in objects
+    assert question(2) not in objects
+    assert skipped >= 1
+
+
+def test_unterminated_string_is_skipped():
+    broken = '{"question": "What is\n a deadlock?", "options": ["a", "b", "c", "d"], "correct_answer": 0, "category": "os"}'
+    text = '[' + ', '.join([json.dumps(question(1)), broken, json.dumps(question(3))]) + ']'
+    objects, skipped = parse_json_objects(text)
+    assert objects == [question(1), question(3)]
+    assert skipped == 1
+
+
+def test_prose_around_the_array_is_ignored():
+    objects, _ = parse_json_objects('Here are your questions:\n' + dumps([question(1)]) + '\nGood luck!')
+    assert objects == [question(1)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 64])
+def test_incremental_parser_matches_whole_text_parse(size):
+    text = dumps([question(n) for n in range(10)]) + '\n```'
+    parser = IncrementalObjectParser()
+    objects = []
+    for start in range(0, len(text), size):
+        objects.extend(parser.feed(text[start:start + size]))
+    objects.extend(parser.finish())
+    assert objects == [question(n) for n in range(10)]
+    assert parser.skipped == 0
+
+
+def test_incremental_parser_handles_escapes_split_across_chunks():
+    q = dict(question(1), question='Is "\\\\n" a newline?')
+    text = json.dumps([q])
+    split = text.index('\\\\') + 1
+    parser = IncrementalObjectParser()
+    objects = parser.feed(text[:split]) + parser.feed(text[split:]) + parser.finish()
+    assert objects == [q]
+
+
+def test_finish_salvages_objects_nested_in_a_truncated_trailer():
+    parser = IncrementalObjectParser()
+    objects = parser.feed('[{"broken": ' + json.dumps(question(1)) + ', ' + json.dumps(question(2)))
+    objects.extend(parser.finish())
+    assert objects == [question(1), question(2)]
+    assert parser.skipped == 1
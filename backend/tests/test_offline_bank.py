@@ -0,0 +1,191 @@
+"""OfflineBank: seed compilation and the constraints every draw must honour"""
+import json
+import os
+
+import pytest
+
+from categories import QUIZ_CATEGORIES
+from offline_bank import OFFLINE_BANK_SOURCE, OfflineBank, OfflineBankError, build, compile_bank
+
+
+def make_question(category, n, difficulty=None, language=None):
+    """Question whose text records its tags; the right option always reads 'right'"""
+    tags = f"{category}/{difficulty or 'any'}/{language or 'any'}/{n}"
+    correct = n % 4
+    q = {
+        'category': category,
+        'question': f"Q {tags}",
+        'options': ['right' if i == correct else f"wrong {i}" for i in range(4)],
+        'correct_answer': correct,
+        'explanation': f"E {tags}"
+    }
+    if difficulty:
+        q['difficulty'] = difficulty
+    if language:
+        q['language'] = language
+    return q
+
+
+def seed_questions():
+    questions = []
+    for category in QUIZ_CATEGORIES:
+        questions += [make_question(category, n) for n in range(6)]
+        questions += [make_question(category, n, difficulty='easy') for n in range(3)]
+        questions += [make_question(category, n, difficulty='hard') for n in range(3)]
+    questions += [make_question('programming', n, language='python') for n in range(3)]
+    questions += [make_question('programming', n, language='java') for n in range(3)]
+    return questions
+
+
+def write_seed(path, questions):
+    path.write_text(json.dumps({'version': 1, 'questions': questions}))
+    return str(path)
+
+
+def tags(q):
+    """(difficulty, language) recorded in a drawn question's text"""
+    _, difficulty, language, _ = q['question'][2:].split('/')
+    return difficulty, language
+
+
+@pytest.fixture
+def seed(tmp_path):
+    return write_seed(tmp_path / 'seed.json', seed_questions())
+
+
+@pytest.fixture
+def bank(tmp_path, seed):
+    bank = OfflineBank(str(tmp_path / 'bank.qbk'), seed)
+    assert bank.open(required=True)
+    assert bank.mode == 'mmap'
+    return bank
+
+
+@pytest.mark.parametrize('difficulty', ['easy', 'moderate', 'hard'])
+def test_full_quiz_in_category_order(bank, difficulty):
+    questions = bank.draw(difficulty, 'python')
+    assert len(questions) == 5 * len(QUIZ_CATEGORIES)
+    assert [q['category'] for q in questions] == [c for c in QUIZ_CATEGORIES for _ in range(5)]
+    assert [q['id'] for q in questions] == [f"{c}_{n}" for c in QUIZ_CATEGORIES for n in range(1, 6)]
+    assert all(q['offline'] for q in questions)
+
+
+def test_no_question_repeats_within_a_draw(bank):
+    for _ in range(50):
+        texts = [q['question'] for q in bank.draw('hard', 'java')]
+        assert len(texts) == len(set(texts))
+
+
+@pytest.mark.parametrize('difficulty', ['easy', 'moderate', 'hard'])
+def test_other_difficulties_never_drawn(bank, difficulty):
+    for _ in range(50):
+        for q in bank.draw(difficulty, 'python'):
+            assert tags(q)[0] in ('any', difficulty)
+
+
+@pytest.mark.parametrize('language', ['python', 'Java', 'rust'])
+def test_other_languages_never_drawn(bank, language):
+    allowed = ('any', language.lower())
+    drawn = set()
+    for _ in range(50):
+        for q in bank.draw('moderate', language):
+            assert tags(q)[1] in allowed
+            drawn.add(tags(q)[1])
+    # Language-tagged questions are in the running, not just tolerated
+    if language.lower() != 'rust':
+        assert language.lower() in drawn
+
+
+def test_correct_answer_follows_shuffled_options(bank):
+    orders = set()
+    for _ in range(20):
+        for q in bank.draw('easy', 'python'):
+            assert q['options'][q['correct_answer']] == 'right'
+            assert q['options'].count('right') == 1 and len(set(q['options'])) == 4
+            orders.add(q['correct_answer'])
+    assert orders == {0, 1, 2, 3}
+
+
+def test_seen_questions_only_fill_a_short_category(tmp_path):
+    # One category with exactly 5 questions: a seen one must come back as a repeat
+    questions = [make_question(c, n) for c in QUIZ_CATEGORIES for n in range(5 if c == 'os' else 8)]
+    bank = OfflineBank(str(tmp_path / 'bank.qbk'), write_seed(tmp_path / 'seed.json', questions))
+    seen = {'Q os/any/any/0', 'Q dbms/any/any/0', 'Q dbms/any/any/1'}
+
+    for _ in range(30):
+        drawn = [q['question'] for q in bank.draw('easy', 'python', skip=lambda q: q['question'] in seen)]
+        assert len(drawn) == 5 * len(QUIZ_CATEGORIES)
+        # dbms has 6 unseen questions left, so its seen ones never appear
+        assert 'Q dbms/any/any/0' not in drawn and 'Q dbms/any/any/1' not in drawn
+        assert 'Q os/any/any/0' in drawn
+    assert bank.stats()['repeats'] == 30
+    assert bank.stats()['short_draws'] == 0
+
+
+def test_short_category_is_reported(tmp_path):
+    questions = [make_question(c, n) for c in QUIZ_CATEGORIES for n in range(2 if c == 'verbal' else 5)]
+    bank = OfflineBank(str(tmp_path / 'bank.qbk'), write_seed(tmp_path / 'seed.json', questions))
+    drawn = bank.draw('moderate', 'python')
+    assert len(drawn) == 5 * len(QUIZ_CATEGORIES) - 3
+    assert sum(q['category'] == 'verbal' for q in drawn) == 2
+    assert bank.stats()['short_draws'] == 1
+
+
+def test_falls_back_to_memory_when_file_unusable(tmp_path, seed):
+    # A directory where the bank file should be can't be built or mapped
+    path = tmp_path / 'bank.qbk'
+    path.mkdir()
+    bank = OfflineBank(str(path), seed)
+    assert bank.open()
+    assert bank.mode == 'memory'
+    assert len(bank.draw('easy', 'java')) == 5 * len(QUIZ_CATEGORIES)
+
+
+def test_required_open_raises_without_seed_or_file(tmp_path):
+    bank = OfflineBank(str(tmp_path / 'bank.qbk'), str(tmp_path / 'missing.json'))
+    assert not bank.open()
+    with pytest.raises(OfflineBankError):
+        bank.open(required=True)
+    assert bank.draw('easy', 'python') == []
+
+
+def test_rebuilds_when_seed_changes(tmp_path, seed):
+    path = str(tmp_path / 'bank.qbk')
+    first = OfflineBank(path, seed)
+    first.open()
+    assert first.stats()['builds'] == 1
+
+    assert os.path.getsize(path) == first.stats()['bytes']
+    unchanged = OfflineBank(path, seed)
+    unchanged.open()
+    assert unchanged.stats()['builds'] == 0
+
+    write_seed(tmp_path / 'seed.json', seed_questions() + [make_question('os', 99)])
+    changed = OfflineBank(path, seed)
+    changed.open()
+    assert changed.stats()['builds'] == 1
+    assert changed.stats()['questions'] == first.stats()['questions'] + 1
+
+
+@pytest.mark.parametrize('change, message', [
+    ({'category': 'history'}, 'unknown category'),
+    ({'difficulty': 'expert'}, 'unknown difficulty'),
+    ({'options': ['a', 'b', 'c']}, '4 options'),
+    ({'correct_answer': 4}, 'correct_answer'),
+    ({'question': 'a\x1fb'}, 'separator'),
+])
+def test_invalid_seed_rejected(change, message):
+    questions = seed_questions()
+    questions[3] = dict(questions[3], **change)
+    with pytest.raises(OfflineBankError, match=message):
+        compile_bank(json.dumps({'questions': questions}).encode('utf-8'))
+
+
+@pytest.mark.parametrize('difficulty', ['easy', 'moderate', 'hard'])
+@pytest.mark.parametrize('language', ['python', 'java', 'cpp', 'javascript', 'go'])
+def test_shipped_seed_fills_every_quiz(tmp_path, difficulty, language):
+    summary = build(OFFLINE_BANK_SOURCE, str(tmp_path / 'bank.qbk'))
+    bank = OfflineBank(summary['path'], OFFLINE_BANK_SOURCE)
+    questions = bank.draw(difficulty, language)
+    assert len(questions) == 5 * len(QUIZ_CATEGORIES)
+    assert all(q['options'][q['correct_answer']] for q in questions)
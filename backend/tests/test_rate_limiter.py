@@ -0,0 +1,87 @@
+"""TokenBucket: burst, bounded waits, multi-slot units and the sliding-window limit"""
+import os
+import time
+
+import pytest
+
+from rate_limiter import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time: sleeping advances the clock instead of blocking"""
+    now = [1000.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    monkeypatch.setattr(time, 'sleep', sleep)
+    return now
+
+
+def local_bucket(limit=30, burst=6, window=60):
+    return TokenBucket('test', limit=limit, window=window, burst=burst, state_path=None)
+
+
+def test_burst_is_granted_back_to_back_then_rejected(clock):
+    bucket = local_bucket(burst=6)
+    assert all(bucket.acquire(max_wait=0) for _ in range(6))
+    assert not bucket.acquire(max_wait=0)
+    assert bucket.stats()['rejected'] == 1
+
+
+def test_rejection_does_not_reserve(clock):
+    bucket = local_bucket(limit=30, burst=6)
+    for _ in range(6):
+        bucket.acquire(max_wait=0)
+    wait = bucket.next_slot_in()
+    for _ in range(5):
+        assert not bucket.acquire(max_wait=wait / 2)
+    assert bucket.next_slot_in() == pytest.approx(wait)
+
+
+def test_caller_within_max_wait_sleeps_until_its_slot(clock):
+    bucket = local_bucket(limit=30, burst=6)
+    for _ in range(6):
+        bucket.acquire(max_wait=0)
+    started = clock[0]
+    assert bucket.acquire(max_wait=10)
+    # Refill rate is (30 - 6) / 60 tokens per second
+    assert clock[0] - started == pytest.approx(60 / 24)
+
+
+def test_unit_is_all_or_nothing(clock):
+    bucket = local_bucket(burst=6)
+    assert bucket.acquire(max_wait=0)
+    assert not bucket.acquire(max_wait=0, tokens=6)
+    assert bucket.acquire(max_wait=0, tokens=5)
+    assert not bucket.try_acquire()
+
+
+def test_unit_larger_than_burst_is_never_granted(clock):
+    bucket = local_bucket(burst=3)
+    assert not bucket.acquire(max_wait=None, tokens=4)
+    assert bucket.acquire(max_wait=0, tokens=3)
+
+
+@pytest.mark.parametrize('limit, burst', [(30, 6), (10, 1), (26, 6)])
+def test_no_window_exceeds_the_limit(clock, limit, burst):
+    bucket = local_bucket(limit=limit, burst=burst, window=60)
+    grants = []
+    for _ in range(limit * 4):
+        assert bucket.acquire(max_wait=None)
+        grants.append(clock[0])
+    for start, granted_at in enumerate(grants):
+        in_window = sum(1 for t in grants[start:] if t < granted_at + 60)
+        assert in_window <= limit
+
+
+def test_buckets_sharing_a_state_file_share_the_budget(clock, tmp_path):
+    state_path = os.path.join(tmp_path, 'rate_limit.sqlite3')
+    first = TokenBucket('shared', limit=30, window=60, burst=6, state_path=state_path)
+    second = TokenBucket('shared', limit=30, window=60, burst=6, state_path=state_path)
+    assert first.acquire(max_wait=0, tokens=4)
+    assert not second.acquire(max_wait=0, tokens=3)
+    assert second.acquire(max_wait=0, tokens=2)
+    assert not first.try_acquire()
@@ -0,0 +1,95 @@
+"""Weight-matrix scoring must reproduce the original hard-coded scoring"""
+import random
+
+import pytest
+
+from scoring import ScoringEngine
+
+
+CATEGORIES = ['os', 'dbms', 'networks', 'aptitude', 'verbal', 'programming']
+# Raw labels the original scorer recognised, stored on rows from before canonicalization
+RAW_LABELS = ['python programming', 'python', 'python_programming', 'network', 'computer networks',
+              'computer_networks']
+
+
+def baseline_scores(key, answers):
+    """The scoring loop from evaluate_quiz_with_gemini before the weight matrix"""
+    scores = {'programming': 0, 'analytics': 0, 'testing': 0, 'technical': 0}
+    for q_id, correct_answer, category in key:
+        if answers.get(q_id) != correct_answer:
+            continue
+        if category in ['programming', 'python programming', 'python', 'python_programming']:
+            scores['programming'] += 3.5
+            scores['technical'] += 1
+        elif category in ['aptitude', 'verbal']:
+            scores['analytics'] += 3
+            scores['testing'] += 1.5
+        elif category in ['os', 'dbms', 'networks', 'network', 'computer networks', 'computer_networks']:
+            scores['technical'] += 2.5
+            scores['testing'] += 2
+            scores['programming'] += 1
+    max_score = max(scores.values())
+    recommended = [k for k, v in scores.items() if v == max_score][0] if max_score > 0 else 'programming'
+    return scores, recommended
+
+
+def random_submission(rng, labels):
+    key, answers = [], {}
+    for n in range(30):
+        q_id = f'q{n}'
+        correct = rng.randrange(4)
+        key.append((q_id, correct, rng.choice(labels)))
+        if rng.random() < 0.6:
+            answers[q_id] = correct if rng.random() < 0.7 else (correct + 1) % 4
+    return key, answers
+
+
+def category_correct(key, answers):
+    counts = {}
+    for q_id, correct, category in key:
+        if answers.get(q_id) == correct:
+            counts[category] = counts.get(category, 0) + 1
+    return counts
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return ScoringEngine.from_file()
+
+
+@pytest.fixture(scope='module')
+def submissions():
+    rng = random.Random(42)
+    subs = [random_submission(rng, CATEGORIES) for _ in range(300)]
+    subs += [random_submission(rng, CATEGORIES + RAW_LABELS) for _ in range(100)]
+    # Edge cases: nothing right, a single category, ties
+    subs.append(([(f'q{n}', 0, CATEGORIES[n % 6]) for n in range(30)], {}))
+    subs.append(([(f'q{n}', 1, 'verbal') for n in range(30)], {f'q{n}': 1 for n in range(30)}))
+    return subs
+
+
+def test_single_submission_matches_baseline(engine, submissions):
+    for key, answers in submissions:
+        expected, recommended = baseline_scores(key, answers)
+        scores = engine.score(category_correct(key, answers))
+        assert scores == pytest.approx(expected)
+        assert engine.recommend(scores) == recommended
+
+
+def test_batch_matches_baseline(engine, submissions):
+    scores = engine.score_batch(engine.correct_counts(submissions))
+    domains = engine.recommend_batch(scores)
+    column = {d: i for i, d in enumerate(engine.domains)}
+    for row, (key, answers) in enumerate(submissions):
+        expected, recommended = baseline_scores(key, answers)
+        assert {d: scores[row, column[d]] for d in expected} == pytest.approx(expected)
+        assert domains[row] == recommended
+
+
+def test_unknown_categories_score_nothing(engine):
+    assert engine.score({'computer_graphics': 5}) == {d: 0.0 for d in engine.domains}
+    assert engine.recommend(engine.score({})) == 'programming'
+
+
+def test_empty_batch(engine):
+    assert engine.score_batch(engine.correct_counts([])).shape == (0, len(engine.domains))
@@ -0,0 +1,116 @@
+"""Seen-question Bloom filters: no false negatives, bounded false positives, merges across workers"""
+import pytest
+
+from seen_questions import BloomLayer, SeenFilter, SeenQuestions, _probes
+
+
+def keys(prefix, n):
+    return [f'{prefix}-{i}' for i in range(n)]
+
+
+def measured_fp_rate(seen, n=20000):
+    return sum(1 for key in keys('unseen', n) if key in seen) / n
+
+
+def test_no_false_negatives_across_layers():
+    seen = SeenFilter(capacity=100, fp_rate=0.01)
+    added = keys('seen', 1500)
+    for key in added:
+        seen.add(key)
+    assert len(seen.layers) > 1
+    assert all(key in seen for key in added)
+
+
+def test_single_layer_at_capacity_stays_near_its_target():
+    layer = BloomLayer(capacity=300, fp_rate=0.01)
+    for key in keys('seen', 300):
+        layer.add(*_probes(key))
+    misses = sum(1 for key in keys('unseen', 20000) if layer.contains(*_probes(key)))
+    assert misses / 20000 <= 0.015
+    assert layer.estimated_fp_rate() <= 0.015
+
+
+def test_scalable_filter_stays_within_its_bound():
+    # Layers at fp, fp/2, fp/4, ... sum to less than 2 * fp however many there are
+    seen = SeenFilter(capacity=300, fp_rate=0.01)
+    for key in keys('seen', 4000):
+        seen.add(key)
+    assert len(seen.layers) >= 4
+    assert measured_fp_rate(seen) <= 0.02
+    assert seen.estimated_fp_rate() <= 0.02
+
+
+def test_add_reports_repeats():
+    seen = SeenFilter()
+    assert seen.add('q1')
+    assert not seen.add('q1')
+    assert seen.items == 1
+
+
+def test_document_round_trip_keeps_membership():
+    seen = SeenFilter(capacity=50)
+    for key in keys('seen', 200):
+        seen.add(key)
+    restored = SeenFilter.from_document(seen.to_document())
+    assert all(key in restored for key in keys('seen', 200))
+    assert restored.items == seen.items
+
+
+def test_merge_is_a_union_with_a_sane_count():
+    a, b = SeenFilter(capacity=300), SeenFilter(capacity=300)
+    for key in keys('a', 100):
+        a.add(key)
+    for key in keys('b', 100):
+        b.add(key)
+    a.merge(b)
+    assert all(key in a for key in keys('a', 100) + keys('b', 100))
+    assert 190 <= a.items <= 210
+
+
+class FakeStore:
+    """user_seen_questions stand-in shared by several SeenQuestions instances"""
+
+    def __init__(self):
+        self.documents = {}
+
+    def load(self, user_id):
+        return self.documents.get(user_id)
+
+    def save(self, user_id, document, items):
+        self.documents[user_id] = document
+        return True
+
+
+def drain(seen_questions):
+    seen_questions._writer.submit(lambda: None).result()
+
+
+def test_workers_do_not_overwrite_each_others_marks():
+    store = FakeStore()
+    worker_a = SeenQuestions(store.load, store.save)
+    worker_b = SeenQuestions(store.load, store.save)
+    first = [{'bank_id': key} for key in keys('first', 30)]
+    second = [{'bank_id': key} for key in keys('second', 30)]
+
+    worker_a.get('user')
+    worker_b.get('user')
+    worker_a.mark('user', first)
+    drain(worker_a)
+    worker_b.mark('user', second)
+    drain(worker_b)
+
+    stored = SeenFilter.from_document(store.documents['user'])
+    assert all(q['bank_id'] in stored for q in first + second)
+    skip = worker_a.skipper('user')
+    assert all(skip(q) for q in second)
+    assert not skip({'bank_id': 'never-served'})
+
+
+@pytest.mark.parametrize('capacity', [10, 300])
+def test_layers_grow_and_tighten(capacity):
+    seen = SeenFilter(capacity=capacity, fp_rate=0.01)
+    for key in keys('seen', capacity * 7):
+        seen.add(key)
+    for previous, layer in zip(seen.layers, seen.layers[1:]):
+        assert layer.capacity == previous.capacity * 2
+        assert layer.fp_rate == pytest.approx(previous.fp_rate / 2)
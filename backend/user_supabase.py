@@ -3,7 +3,39 @@ User management module for Supabase
 """
 from datetime import datetime
 import json
-from db import db
+from db import db, CursorError
+from fieldsets import pick
+
+
+# Attempt fields -> results columns they are built from (difficulty/language come from the quiz session)
+ATTEMPT_FIELD_COLUMNS = {
+    'id': ('id',),
+    'quiz_id': ('quiz_id',),
+    'total_score': ('total_score',),
+    'percentage': ('total_score',),
+    'domain_scores': ('programming_score', 'analytics_score', 'testing_score'),
+    'recommended_domain': ('recommended_domain',),
+    'completed_at': ('completed_at',),
+    'ai_insights': ('ai_insights',),
+    'difficulty': (),
+    'language': ()
+}
+# Left out of list views unless requested
+HEAVY_FIELDS = ('ai_insights',)
+ATTEMPT_LIGHT_FIELDS = frozenset(ATTEMPT_FIELD_COLUMNS) - frozenset(HEAVY_FIELDS)
+# Profile sections, plus ai_insights on the recent results
+PROFILE_FIELDS = ('user', 'stats', 'recent_results', 'ai_insights')
+PROFILE_LIGHT_FIELDS = frozenset(PROFILE_FIELDS) - frozenset(HEAVY_FIELDS)
+
+
+def parse_insights(raw):
+    """ai_insights column value -> dict (None if missing or unreadable)"""
+    if not raw:
+        return None
+    try:
+        return json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        return None
 
 
 class User:
@@ -16,8 +48,8 @@ class User:
         Creates new user if doesn't exist, returns existing if does
         """
         try:
-            # Try to get existing user
-            existing_user = db.get_user_by_clerk_id(clerk_id)
+            # Try to get existing user (bypass the cache, sync is the source of truth)
+            existing_user = db.get_user_by_clerk_id(clerk_id, use_cache=False)
             
             if existing_user:
                 # Update user info in case name or email changed
@@ -44,6 +76,7 @@ class User:
             return None
             
         except Exception as e:
+            db.invalidate_user(clerk_id)
             print(f"❌ Error syncing user: {e}")
             return None
     
@@ -78,62 +111,72 @@ class User:
             return None
     
     @staticmethod
-    def get_profile(user_id):
-        """Get complete user profile with statistics"""
+    def get_profile(user_id, fields=None):
+        """
+        Get complete user profile with statistics. Cached per process: writes in this
+        process invalidate it, other workers' writes show up within PROFILE_CACHE_TTL.
+        `fields` picks sections (user, stats, recent_results); recent results carry
+        their ai_insights only when 'ai_insights' is in fields.
+        """
+        fields = fields or PROFILE_LIGHT_FIELDS
+        variant = tuple(sorted(fields))
         try:
-            user = db.get_user_by_id(user_id)
-            if not user:
-                return None
+            cached = db.get_cached_profile(user_id, variant)
+            if cached:
+                return cached
             
-            # Get user statistics
-            stats = db.get_user_statistics(user_id)
+            include_insights = 'ai_insights' in fields
             
-            # Get domain recommendations
-            domain_recommendations = db.get_domain_recommendations(user_id)
+            # User, stats row and recent results in one query
+            bundle = db.get_profile_bundle(user_id, recent=5, include_insights=include_insights)
+            if not bundle:
+                return None
             
-            # Get recent results
-            recent_results = db.get_user_results(user_id, limit=5)
+            recent_results = bundle['results']
+            if bundle['user_stats']:
+                stats = db.format_user_stats(bundle['user_stats'])
+            else:
+                # Not backfilled yet
+                stats = db.get_user_statistics(user_id)
             
             # Format recent results
             formatted_results = []
             for result in recent_results:
-                ai_insights = None
-                if result.get('ai_insights'):
-                    try:
-                        ai_insights = json.loads(result['ai_insights']) if isinstance(result['ai_insights'], str) else result['ai_insights']
-                    except:
-                        pass
-                
-                formatted_results.append({
+                formatted = {
                     'id': result['id'],
                     'total_score': result['total_score'],
                     'percentage': round((result['total_score'] / 30) * 100, 2),
                     'recommended_domain': result['recommended_domain'],
-                    'completed_at': result['completed_at'],
-                    'ai_insights': ai_insights
-                })
+                    'completed_at': result['completed_at']
+                }
+                if include_insights:
+                    formatted['ai_insights'] = parse_insights(result.get('ai_insights'))
+                formatted_results.append(formatted)
             
             profile = {
                 'user': {
-                    'id': user['id'],
-                    'clerk_id': user['clerk_id'],
-                    'name': user['name'],
-                    'email': user['email'],
-                    'degree': user.get('degree', 'B.Tech'),
-                    'member_since': user['created_at']
+                    'id': bundle['id'],
+                    'clerk_id': bundle['clerk_id'],
+                    'name': bundle['name'],
+                    'email': bundle['email'],
+                    'degree': bundle.get('degree', 'B.Tech'),
+                    'member_since': bundle['created_at']
                 },
                 'stats': {
                     'total_attempts': stats.get('total_quizzes', 0) if stats else 0,
                     'completed_quizzes': stats.get('completed_quizzes', 0) if stats else 0,
                     'average_score': stats.get('average_score', 0) if stats else 0,
-                    'best_score': max([r['total_score'] for r in recent_results]) if recent_results else 0,
+                    'best_score': stats.get('best_score', 0) if stats else 0,
                     'latest_domain': recent_results[0]['recommended_domain'] if recent_results else None,
                     'last_attempt': stats.get('last_quiz_date') if stats else None,
-                    'domain_distribution': domain_recommendations
+                    'domain_distribution': stats.get('domain_counts', {}) if stats else {}
                 },
                 'recent_results': formatted_results
             }
+            profile = pick(profile, fields)
             
+            if stats is not None:
+                db.cache_profile(user_id, profile, variant)
             return profile
             
         except Exception as e:
@@ -171,48 +214,62 @@ class User:
             return False
     
     @staticmethod
-    def get_attempts(user_id, limit=10):
-        """Get quiz attempts for a user"""
+    def get_attempts(user_id, limit=10, cursor=None, fields=None):
+        """
+        Get one page of quiz attempts for a user (newest first) and the cursor for the next page.
+        `fields` limits each attempt to those keys; only the columns they need are selected.
+        Raises CursorError if `cursor` is malformed.
+        """
+        fields = fields or ATTEMPT_LIGHT_FIELDS
         try:
-            # Get results with quiz session details
-            results = db.get_user_results(user_id, limit=limit)
+            columns = [col for field in fields for col in ATTEMPT_FIELD_COLUMNS[field]]
+            with_session = 'difficulty' in fields or 'language' in fields
+            
+            # Results with their quiz session details in a single query
+            results, next_cursor = db.get_user_attempts(user_id, limit=limit, cursor=cursor,
+                                                        columns=columns, with_session=with_session)
             
             attempts = []
             for result in results:
-                # Get quiz session details
-                quiz_session = db.get_quiz_session(result['quiz_id'])
-                
-                # Parse AI insights
-                ai_insights = None
-                if result.get('ai_insights'):
-                    try:
-                        ai_insights = json.loads(result['ai_insights']) if isinstance(result['ai_insights'], str) else result['ai_insights']
-                    except:
-                        pass
-                
-                attempts.append({
-                    'id': result['id'],
-                    'total_score': result['total_score'],
-                    'percentage': round((result['total_score'] / 30) * 100, 2),
-                    'domain_scores': {
+                quiz_session = result.get('quiz_sessions')
+                attempt = {}
+                if 'id' in fields:
+                    attempt['id'] = result['id']
+                if 'quiz_id' in fields:
+                    attempt['quiz_id'] = result['quiz_id']
+                if 'total_score' in fields:
+                    attempt['total_score'] = result['total_score']
+                if 'percentage' in fields:
+                    attempt['percentage'] = round((result['total_score'] / 30) * 100, 2)
+                if 'domain_scores' in fields:
+                    attempt['domain_scores'] = {
                         'programming': result.get('programming_score', 0),
                         'analytics': result.get('analytics_score', 0),
                         'testing': result.get('testing_score', 0)
-                    },
-                    'recommended_domain': result['recommended_domain'],
-                    'completed_at': result['completed_at'],
-                    'ai_insights': ai_insights,
-                    'difficulty': quiz_session['difficulty'] if quiz_session else 'moderate',
-                    'language': quiz_session['language'] if quiz_session else 'python'
-                })
+                    }
+                if 'recommended_domain' in fields:
+                    attempt['recommended_domain'] = result['recommended_domain']
+                if 'completed_at' in fields:
+                    attempt['completed_at'] = result['completed_at']
+                if 'ai_insights' in fields:
+                    # Only parsed when asked for
+                    attempt['ai_insights'] = parse_insights(result.get('ai_insights'))
+                if 'difficulty' in fields:
+                    attempt['difficulty'] = quiz_session['difficulty'] if quiz_session else 'moderate'
+                if 'language' in fields:
+                    attempt['language'] = quiz_session['language'] if quiz_session else 'python'
+                attempts.append(attempt)
             
-            return attempts
+            return {'attempts': attempts, 'next_cursor': next_cursor}
             
+        except CursorError:
+            # A bad cursor is the client's mistake, not an empty history
+            raise
         except Exception as e:
             print(f"❌ Error getting attempts: {e}")
             import traceback
             traceback.print_exc()
-            return []
+            return {'attempts': [], 'next_cursor': None}
     
     @staticmethod
     def get_improvement_data(user_id):